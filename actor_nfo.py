@@ -6,6 +6,7 @@ import requests
 import time
 import re
 import random
+from library_catalog import get_catalog
 
 # 已处理文件列表文件路径
 PROCESSED_FILES_FILE = '/config/processed_nfo_files.txt'
@@ -35,13 +36,9 @@ def load_config(db_path='/config/data.db'):
         logging.error(f"数据库加载配置错误: {e}")
         exit(0)
 
-# 从配置文件中读取值
-config = load_config()
-key = config.get('douban_api_key', '')
-cookie = config.get('douban_cookie', '')
-directory = config.get('media_dir', '')
-excluded_filenames = config.get('nfo_excluded_filenames', '').split(',')
-excluded_subdir_keywords = config.get('nfo_excluded_subdir_keywords', '').split(',')
+# 排除规则，在 main() 中根据配置填充
+excluded_filenames = []
+excluded_subdir_keywords = []
 
 class DoubanAPI:
     def __init__(self, key: str, cookie: str) -> None:
@@ -196,64 +193,44 @@ class DoubanAPI:
             time.sleep(sleep_time)
 
 def read_nfo_file(file_path):
-    # 尝试打开并解析nfo文件
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # 判断是电影、电视剧还是季
-        media_type = None
-        if root.tag == 'movie':
-            logging.debug(f"这是电影 nfo 文件: {file_path}")
-            media_type = 'movie'
-        elif root.tag == 'tvshow':
-            logging.debug(f"这是电视剧 nfo 文件: {file_path}")
-            media_type = 'tv'
-        elif root.tag == 'season':
-            logging.debug(f"这是季 nfo 文件: {file_path}")
-            media_type = 'season'
-        else:
-            logging.warning(f"未知文件类型: {file_path}")
-            return None, None, None, None
-        
-        # 查找并获取标题
-        title = None
-        for element in root.findall('.//title'):
-            title = element.text
-            break  # 只需要第一个匹配到的标题
-        
-        # 查找并获取年份
-        year = None
-        for element in root.findall('.//year'):
-            year = element.text
-            break  # 只需要第一个匹配到的年份
-        
-        # 如果 <year> 标签中没有找到年份，则尝试从 <premiered> 和 <releasedate> 标签中提取年份
-        if not year:
-            for tag in ['premiered', 'releasedate']:
-                for element in root.findall(f'.//{tag}'):
-                    date_str = element.text
-                    if date_str:
-                        try:
-                            year = date_str.split('-')[0]  # 提取年份部分
-                            break
-                        except IndexError:
-                            logging.warning(f"日期格式不正确: {date_str}")
-        
-        # 查找并获取 IMDb ID
-        imdb_id = None
-        for element in root.findall('.//uniqueid[@type="imdb"]'):
-            imdb_id = element.text
-            break  # 只需要第一个匹配到的 IMDb ID
-        
-        if title:
-            logging.debug(f"标题: {title}, 年份: {year}, IMDb ID: {imdb_id}")
-            return media_type, title, year, imdb_id
-        else:
-            logging.warning(f"未找到文件 {file_path} 中的标题")
-            return None, None, None, None
-    except Exception as e:
-        logging.error(f"读取 nfo 文件 {file_path} 时出错: {e}")
+    # 从 NFO 缓存读取解析结果
+    nfo = get_catalog().nfo(file_path)
+    if nfo is None or nfo['error']:
+        logging.error(f"读取 nfo 文件 {file_path} 时出错: {nfo['error'] if nfo else '文件无法读取'}")
+        return None, None, None, None
+
+    # 判断是电影、电视剧还是季
+    media_type = None
+    if nfo['tag'] == 'movie':
+        logging.debug(f"这是电影 nfo 文件: {file_path}")
+        media_type = 'movie'
+    elif nfo['tag'] == 'tvshow':
+        logging.debug(f"这是电视剧 nfo 文件: {file_path}")
+        media_type = 'tv'
+    elif nfo['tag'] == 'season':
+        logging.debug(f"这是季 nfo 文件: {file_path}")
+        media_type = 'season'
+    else:
+        logging.warning(f"未知文件类型: {file_path}")
+        return None, None, None, None
+
+    title = nfo['title']
+    year = nfo['year']
+
+    # 如果 <year> 标签中没有找到年份，则尝试从 <premiered> 和 <releasedate> 标签中提取年份（后者优先）
+    if not year:
+        for tag in ['premiered', 'releasedate']:
+            date_str = nfo[tag]
+            if date_str:
+                year = date_str.split('-')[0]  # 提取年份部分
+
+    imdb_id = nfo['uniqueids'].get('imdb')
+
+    if title:
+        logging.debug(f"标题: {title}, 年份: {year}, IMDb ID: {imdb_id}")
+        return media_type, title, year, imdb_id
+    else:
+        logging.warning(f"未找到文件 {file_path} 中的标题")
         return None, None, None, None
 
 def update_nfo_file(file_path, directors, actors):
@@ -334,7 +311,7 @@ def process_nfo_files(directory, douban_api):
     processed_files = load_processed_files()
     
     # 遍历指定目录及其所有子目录下的所有.nfo文件
-    for root, dirs, files in os.walk(directory):
+    for root, dirs, files in get_catalog().walk(directory):
         # 检查当前目录是否应被排除
         if should_exclude_directory(root):
             continue
@@ -436,14 +413,27 @@ def process_nfo_files(directory, douban_api):
                 logging.info(f"处理完成，随机休眠 {sleep_time:.2f} 秒")
                 time.sleep(sleep_time)
 
-if __name__ == "__main__":
-    config = load_config()
+def main(config=None):
+    global excluded_filenames, excluded_subdir_keywords
+    if config is None:
+        config = load_config()
 
     # 新增：判断actor_nfo配置项
     actor_nfo = config.get('actor_nfo', '').strip().lower()
     if actor_nfo != 'true':
         logging.info('NFO演职人员汉化未启用，程序无需运行。')
-        exit(0)
-        
+        return
+
+    # 从配置文件中读取值
+    key = config.get('douban_api_key', '')
+    cookie = config.get('douban_cookie', '')
+    directory = config.get('media_dir', '')
+    excluded_filenames = config.get('nfo_excluded_filenames', '').split(',')
+    excluded_subdir_keywords = config.get('nfo_excluded_subdir_keywords', '').split(',')
+
     douban_api = DoubanAPI(key, cookie)
-    process_nfo_files(directory, douban_api)
\ No newline at end of file
+    process_nfo_files(directory, douban_api)
+    get_catalog().flush()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -26,10 +26,11 @@ import glob
 import threading
 import uuid
 from collections import deque
+import trigger_bus
+import result_store
 
 # Ensure runtime directories exist (Windows maps '/tmp' to 'C:\\tmp')
 os.makedirs("/tmp/log", exist_ok=True)
-os.makedirs("/tmp/index", exist_ok=True)
 
 # 使用线程安全的字典存储下载进度
 download_progress_messages = {}
@@ -855,6 +856,7 @@ def add_subscription():
                 (new_douban_id, title, year, season, missing_episodes)
             )
             db.commit()
+            trigger_bus.publish(trigger_bus.EVENT_SUBSCRIPTION_ADDED, [title], db_path=DATABASE)
             logger.info(f"用户添加电视剧订阅: {title} ({year}) 季{season} 集{start_episode}-{end_episode} DOUBAN_ID: {new_douban_id}")
             return jsonify({"success": True, "message": "电视剧订阅添加成功"})
 
@@ -883,6 +885,7 @@ def add_subscription():
                 (new_douban_id, title, year)
             )
             db.commit()
+            trigger_bus.publish(trigger_bus.EVENT_SUBSCRIPTION_ADDED, [title], db_path=DATABASE)
             logger.info(f"用户添加电影订阅: {title} ({year}) DOUBAN_ID: {new_douban_id}")
             return jsonify({"success": True, "message": "电影订阅添加成功"})
 
@@ -993,6 +996,7 @@ def tmdb_subscriptions():
                 (title, year, season, missing_episodes)
             )
             db.commit()
+            trigger_bus.publish(trigger_bus.EVENT_SUBSCRIPTION_ADDED, [title], db_path=DATABASE)
             return jsonify({"success": True, "message": "电视剧订阅成功"})
 
         else:  # 否则为电影订阅
@@ -1011,6 +1015,7 @@ def tmdb_subscriptions():
                 (title, year)
             )
             db.commit()
+            trigger_bus.publish(trigger_bus.EVENT_SUBSCRIPTION_ADDED, [title], db_path=DATABASE)
             return jsonify({"success": True, "message": "电影订阅成功"})
 
     except Exception as e:
@@ -1095,6 +1100,7 @@ def edit_subscription(type, id):
                 db.execute('UPDATE MISS_TVS SET title = ?, season = ?, missing_episodes = ? WHERE id = ?', 
                           (title, season, missing_episodes, id))
             db.commit()
+            trigger_bus.publish(trigger_bus.EVENT_SUBSCRIPTION_ADDED, [title], db_path=DATABASE)
             logger.info(f"用户更新订阅: {type} ID={id}")
             return jsonify(success=True, message="订阅更新成功")
         except Exception as e:
@@ -1343,6 +1349,24 @@ def manual_search():
     logger.info(f"用户 {nickname} 访问手动搜索页面")
     return render_template('manual_search.html', nickname=nickname, avatar_url=avatar_url, version=APP_VERSION, tmdb_api_key=tmdb_api_key)
 
+def format_search_result(item):
+    """提取手动搜索页面需要的资源字段"""
+    result_item = {
+        "title": item.get("title"),
+        "size": item.get("size"),
+        "link": item.get("link"),
+        "resolution": item.get("resolution")
+    }
+    # 透传 referer/subject_url（用于部分站点下载页反爬/会话校验）
+    if "subject_url" in item:
+        result_item["subject_url"] = item.get("subject_url")
+    if "referer" in item:
+        result_item["referer"] = item.get("referer")
+    # 添加热度数据（如果存在）
+    if "popularity" in item:
+        result_item["popularity"] = item.get("popularity")
+    return result_item
+
 @app.route('/api/search_media', methods=['POST'])
 @login_required
 def api_search_media():
@@ -1368,137 +1392,31 @@ def api_search_media():
             # 开始搜索
             yield f"data: {json.dumps({'status': 'start', 'message': '开始搜索资源'})}\n\n"
             
-            # 检查缓存结果（除非强制刷新）
-            results_dir = "/tmp/index/"
-            current_time = time.time()
+            # 检查缓存结果（除非强制刷新），仅使用30分钟内的索引结果
             time_threshold = 30 * 60  # 30分钟 = 1800秒
-            
+            search_season = season if media_type == "tv" else None
+
             if not force_refresh:
-                # 根据媒体类型使用不同的文件匹配模式
-                if media_type == "tv":
-                    # 电视剧文件命名格式
-                    if season:
-                        result_pattern = os.path.join(results_dir, f"{title}-S{season}*{year}*.json")
-                    else:
-                        result_pattern = os.path.join(results_dir, f"{title}-S*{year}*.json")
-                else:
-                    # 电影文件命名格式
-                    result_pattern = os.path.join(results_dir, f"{title}-*{year}*.json")
-                
-                existing_result_files = glob.glob(result_pattern)
-                
-                # 过滤文件
-                filtered_files = []
-                for file in existing_result_files:
-                    filename = os.path.basename(file)
-                    if media_type == "movie":
-                        # 排除电视剧格式（包含-S数字的文件）
-                        if not re.search(rf"{re.escape(title)}-S\d+.*{year}", filename):
-                            filtered_files.append(file)
-                    elif media_type == "tv" and season:
-                        # 只保留指定season的文件
-                        if re.search(rf"{re.escape(title)}-S{season}.*{year}", filename):
-                            filtered_files.append(file)
-                    else:
-                        filtered_files.append(file)
-                
-                valid_results = []
-                for result_file in filtered_files:
-                    try:
-                        # 检查文件修改时间
-                        file_mtime = os.path.getmtime(result_file)
-                        if current_time - file_mtime <= time_threshold:
-                            valid_results.append(result_file)
-                    except OSError:
-                        # 如果无法获取文件信息，跳过该文件
-                        continue
-                
-                # 如果存在有效结果文件，直接读取并返回
-                if valid_results:
-                    yield f"data: {json.dumps({'status': 'cache_found', 'message': f'发现 {len(valid_results)} 个缓存结果'})}\n\n"
-                    
-                    all_results = {}
-                    for i, result_file in enumerate(valid_results):
+                cached_sites = result_store.searched_sites(
+                    media_type, title, year, season=search_season, max_age=time_threshold, db_path=DATABASE
+                )
+
+                # 如果存在有效结果，直接读取并返回
+                if cached_sites:
+                    yield f"data: {json.dumps({'status': 'cache_found', 'message': f'发现 {len(cached_sites)} 个缓存结果'})}\n\n"
+
+                    for site in sorted(cached_sites):
                         try:
-                            filename = os.path.basename(result_file)
-                            site = None
-                            
-                            # 基础搜索脚本配置（用于提取站点信息）
-                            search_scripts = [
-                                {"site": "BTHD"},
-                                {"site": "HDTV"},
-                                {"site": "BTYS"},
-                                {"site": "BT0"},
-                                {"site": "GY"},
-                                {"site": "BTSJ6"},
-                                {"site": "1LOU"},
-                                {"site": "SEEDHUB"},
-                                {"site": "JACKETT"}
-                            ]
-                            
-                            for script_info in search_scripts:
-                                if script_info["site"] in filename:
-                                    site = script_info["site"]
-                                    break
-                            
-                            if not site:
-                                continue
-                            
-                            with open(result_file, "r", encoding="utf-8") as f:
-                                data = json.load(f)
-                                
-                                # 按站点分类结果
-                                if site not in all_results:
-                                    all_results[site] = []
-
-                                # 提取需要的字段
-                                for resolution_key in ["首选分辨率", "备选分辨率", "其他分辨率"]:
-                                    if resolution_key in data:
-                                        if media_type == "tv":
-                                            # 针对 电视节目 数据
-                                            for category_key in ["单集", "集数范围", "全集"]:
-                                                if category_key in data[resolution_key]:
-                                                    for item in data[resolution_key][category_key]:
-                                                        result_item = {
-                                                            "title": item.get("title"),
-                                                            "size": item.get("size"),
-                                                            "link": item.get("link"),
-                                                            "resolution": item.get("resolution")
-                                                        }
-                                                        # 透传 referer/subject_url（用于部分站点下载页反爬/会话校验）
-                                                        if "subject_url" in item:
-                                                            result_item["subject_url"] = item.get("subject_url")
-                                                        if "referer" in item:
-                                                            result_item["referer"] = item.get("referer")
-                                                        # 添加热度数据（如果存在）
-                                                        if "popularity" in item:
-                                                            result_item["popularity"] = item.get("popularity")
-                                                        all_results[site].append(result_item)
-                                        else:
-                                            # 针对 电影 数据
-                                            for item in data[resolution_key]:
-                                                result_item = {
-                                                    "title": item.get("title"),
-                                                    "size": item.get("size"),
-                                                    "link": item.get("link"),
-                                                    "resolution": item.get("resolution")
-                                                }
-                                                # 透传 referer/subject_url（用于部分站点下载页反爬/会话校验）
-                                                if "subject_url" in item:
-                                                    result_item["subject_url"] = item.get("subject_url")
-                                                if "referer" in item:
-                                                    result_item["referer"] = item.get("referer")
-                                                # 添加热度数据（如果存在）
-                                                if "popularity" in item:
-                                                    result_item["popularity"] = item.get("popularity")
-                                                all_results[site].append(result_item)
-                            
+                            site_results = result_store.query_results(
+                                media_type, title, year, season=search_season, sites=[site],
+                                max_age=time_threshold, by_popularity=False, db_path=DATABASE
+                            )
+                            data = [format_search_result(item) for _, item in site_results]
                             # 发送单个站点的结果
-                            yield f"data: {json.dumps({'status': 'result', 'site': site, 'data': all_results[site]})}\n\n"
-                            
+                            yield f"data: {json.dumps({'status': 'result', 'site': site, 'data': data})}\n\n"
                         except Exception as e:
-                            logger.error(f"读取缓存搜索结果失败: {result_file}, 错误: {e}")
-                    
+                            logger.error(f"读取缓存搜索结果失败: {site}, 错误: {e}")
+
                     yield f"data: {json.dumps({'status': 'complete', 'message': '缓存结果加载完成'})}\n\n"
                     return
             
@@ -1617,98 +1535,23 @@ def api_search_media():
                         yield f"data: {json.dumps({'status': 'progress', 'message': message})}\n\n"
                         continue
                     
-                    # 使用通配符匹配结果文件
-                    if media_type == "tv":
-                        # 电视剧结果文件命名格式
-                        if season:
-                            result_pattern = os.path.join(results_dir, f"{title}-S{season}*{year}*{script_info['site']}*.json")
-                        else:
-                            result_pattern = os.path.join(results_dir, f"{title}-S*{year}*{script_info['site']}*.json")
-                    else:
-                        # 电影结果文件命名格式
-                        result_pattern = os.path.join(results_dir, f"{title}-*{year}*{script_info['site']}*.json")
-                    
-                    result_files = glob.glob(result_pattern)
-
-                    # 过滤文件
-                    filtered_files = []
-                    for file in result_files:
-                        filename = os.path.basename(file)
-                        if media_type == "movie":
-                            # 排除电视剧格式（包含-S数字的文件）
-                            if not re.search(rf"{re.escape(title)}-S\d+.*{year}.*{script_info['site']}", filename):
-                                filtered_files.append(file)
-                        elif media_type == "tv" and season:
-                            # 只保留指定season的文件
-                            if re.search(rf"{re.escape(title)}-S{season}.*{year}.*{script_info['site']}", filename):
-                                filtered_files.append(file)
-                        else:
-                            filtered_files.append(file)
-                    
-                    result_files = filtered_files
-
-                    if not result_files:
-                        message = f'站点 {script_info["site"]} 未找到结果 ({completed_count}/{total_scripts})'
-                        yield f"data: {json.dumps({'status': 'progress', 'message': message})}\n\n"
-                        continue
+                    site = script_info["site"]
+                    try:
+                        if site not in result_store.searched_sites(media_type, title, year, season=search_season,
+                                                                   db_path=DATABASE):
+                            message = f'站点 {site} 未找到结果 ({completed_count}/{total_scripts})'
+                            yield f"data: {json.dumps({'status': 'progress', 'message': message})}\n\n"
+                            continue
 
-                    for result_file in result_files:
-                        try:
-                            with open(result_file, "r", encoding="utf-8") as f:
-                                data = json.load(f)
-                                
-                                # 按站点分类结果
-                                site = script_info["site"]
-                                if site not in all_results:
-                                    all_results[site] = []
-
-                                # 提取需要的字段
-                                for resolution_key in ["首选分辨率", "备选分辨率", "其他分辨率"]:
-                                    if resolution_key in data:
-                                        if media_type == "tv":
-                                            # 针对 电视节目 数据
-                                            for category_key in ["单集", "集数范围", "全集"]:
-                                                if category_key in data[resolution_key]:
-                                                    for item in data[resolution_key][category_key]:
-                                                        result_item = {
-                                                            "title": item.get("title"),
-                                                            "size": item.get("size"),
-                                                            "link": item.get("link"),
-                                                            "resolution": item.get("resolution")
-                                                        }
-                                                        # 透传 referer/subject_url（用于部分站点下载页反爬/会话校验）
-                                                        if "subject_url" in item:
-                                                            result_item["subject_url"] = item.get("subject_url")
-                                                        if "referer" in item:
-                                                            result_item["referer"] = item.get("referer")
-                                                        # 添加热度数据（如果存在）
-                                                        if "popularity" in item:
-                                                            result_item["popularity"] = item.get("popularity")
-                                                        all_results[site].append(result_item)
-                                        else:
-                                            # 针对 电影 数据
-                                            for item in data[resolution_key]:
-                                                result_item = {
-                                                    "title": item.get("title"),
-                                                    "size": item.get("size"),
-                                                    "link": item.get("link"),
-                                                    "resolution": item.get("resolution")
-                                                }
-                                                # 透传 referer/subject_url（用于部分站点下载页反爬/会话校验）
-                                                if "subject_url" in item:
-                                                    result_item["subject_url"] = item.get("subject_url")
-                                                if "referer" in item:
-                                                    result_item["referer"] = item.get("referer")
-                                                # 添加热度数据（如果存在）
-                                                if "popularity" in item:
-                                                    result_item["popularity"] = item.get("popularity")
-                                                all_results[site].append(result_item)
-                                
-                                # 发送单个站点的结果
-                                yield f"data: {json.dumps({'status': 'result', 'site': site, 'data': all_results[site]})}\n\n"
-                                
-                        except Exception as e:
-                            logger.error(f"读取搜索结果失败: {result_file}, 错误: {e}")
+                        site_results = result_store.query_results(
+                            media_type, title, year, season=search_season, sites=[site],
+                            by_popularity=False, db_path=DATABASE
+                        )
+                        all_results[site] = [format_search_result(item) for _, item in site_results]
+                        # 发送单个站点的结果
+                        yield f"data: {json.dumps({'status': 'result', 'site': site, 'data': all_results[site]})}\n\n"
+                    except Exception as e:
+                        logger.error(f"读取搜索结果失败: {site}, 错误: {e}")
                     
                     message = f'完成站点 {script_info["site"]} 搜索 ({completed_count}/{total_scripts})'
                     yield f"data: {json.dumps({'status': 'progress', 'message': message})}\n\n"
@@ -1843,7 +1686,12 @@ GROUP_MAPPING = {
         "chromedriver_path": {"type": "text", "label": "ChromeDriver 路径（Windows 可填 chromedriver.exe）"}
     },
     "定时任务": {
-        "run_interval_hours": {"type": "text", "label": "自动化流程间隔"}
+        "run_interval_hours": {"type": "text", "label": "自动化流程间隔"},
+        "pipeline_max_workers": {"type": "text", "label": "自动化流程并行任务数"},
+        "douban_poll_minutes": {"type": "text", "label": "豆瓣想看检查间隔"},
+        "index_ttl_hours": {"type": "text", "label": "资源索引有效期"},
+        "index_negative_ttl_hours": {"type": "text", "label": "无结果索引有效期"},
+        "download_max_workers": {"type": "text", "label": "同时下载的订阅数"}
     },
     "消息通知": {
         "notification": {"type": "switch", "label": "消息通知"},
@@ -1893,6 +1741,7 @@ GROUP_MAPPING = {
         "file_overwrite_option": {"type": "select", "label": "文件覆盖选项", "options": ["skip", "size", "always"]},
         "enable_multithread_transfer": {"type": "switch", "label": "启用多线程文件转移"},
         "transfer_thread_count": {"type": "text", "label": "批量文件转移线程数"},
+        "file_stable_seconds": {"type": "text", "label": "文件稳定判定时间（秒）"},
         "movie_folder_naming_format": {"type": "text", "label": "电影目录命名规则"},
         "tv_folder_naming_format": {"type": "text", "label": "电视剧目录命名规则"},
         "anime_folder_naming_format": {"type": "text", "label": "动漫目录命名规则"},
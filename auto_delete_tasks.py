@@ -30,23 +30,25 @@ def load_config(db_path='/config/data.db'):
         logging.error(f"数据库加载配置错误: {e}")
         exit(0)
 
-# 加载配置
-config = load_config()
+def apply_config(config):
+    """根据配置刷新模块级设置（每次运行时调用，保证使用最新配置）"""
+    global download_mgmt, auto_delete_completed_tasks, download_type, download_host
+    global download_port, download_username, download_password, transfer_type, delete_with_files
 
-# 获取下载管理相关配置
-download_mgmt = config.get('download_mgmt', 'False').lower() == 'true'
-auto_delete_completed_tasks = config.get('auto_delete_completed_tasks', 'False').lower() == 'true'  # 新增配置项
-download_type = config.get('download_type', 'transmission').lower()
-download_host = config.get('download_host', '127.0.0.1')
-download_port = int(config.get('download_port', 9091))
-download_username = config.get('download_username', '')
-download_password = config.get('download_password', '')
+    # 获取下载管理相关配置
+    download_mgmt = config.get('download_mgmt', 'False').lower() == 'true'
+    auto_delete_completed_tasks = config.get('auto_delete_completed_tasks', 'False').lower() == 'true'  # 新增配置项
+    download_type = config.get('download_type', 'transmission').lower()
+    download_host = config.get('download_host', '127.0.0.1')
+    download_port = int(config.get('download_port', 9091))
+    download_username = config.get('download_username', '')
+    download_password = config.get('download_password', '')
 
-# 获取文件转移方式配置
-transfer_type = config.get('download_action', '')
+    # 获取文件转移方式配置
+    transfer_type = config.get('download_action', '')
 
-# 获取是否删除文件配置
-delete_with_files = config.get('delete_with_files', 'False').lower() == 'true'
+    # 获取是否删除文件配置
+    delete_with_files = config.get('delete_with_files', 'False').lower() == 'true'
 
 # Torrent目录路径
 TORRENT_DIR = '/Torrent'
@@ -184,27 +186,35 @@ def check_and_delete_torrent_files():
         logging.info(f"{TORRENT_DIR} 目录不存在或不是一个目录")
 
 # 主流程
-if download_mgmt and auto_delete_completed_tasks:  # 修改条件，同时检查两个配置项
-    logging.info("下载管理功能和自动删除已完成任务功能已启用，开始执行主流程")
-    
-    # 检查转移方式，如果是软链接或硬链接，则不执行自动删除
-    if transfer_type in ['softlink', 'hardlink']:
-        logging.info(f"当前文件转移方式为 {transfer_type}，保留源文件，跳过自动删除任务")
-        exit(0)
-    
-    if download_type == 'xunlei':
-        logging.info("当前下载器为：迅雷。无需执行自动删除已完成任务，程序退出。")
-        exit(0)
+def main(config=None):
+    if config is None:
+        config = load_config()
+    apply_config(config)
+
+    if download_mgmt and auto_delete_completed_tasks:  # 修改条件，同时检查两个配置项
+        logging.info("下载管理功能和自动删除已完成任务功能已启用，开始执行主流程")
 
-    manager = DownloadManager()
-    if manager.client:
-        torrents = manager.get_torrents()
-        manager.delete_stopped_torrents(torrents, delete_with_files)  # 传递删除文件配置
+        # 检查转移方式，如果是软链接或硬链接，则不执行自动删除
+        if transfer_type in ['softlink', 'hardlink']:
+            logging.info(f"当前文件转移方式为 {transfer_type}，保留源文件，跳过自动删除任务")
+            return
+
+        if download_type == 'xunlei':
+            logging.info("当前下载器为：迅雷。无需执行自动删除已完成任务，程序退出。")
+            return
+
+        manager = DownloadManager()
+        if manager.client:
+            torrents = manager.get_torrents()
+            manager.delete_stopped_torrents(torrents, delete_with_files)  # 传递删除文件配置
+        else:
+            logging.error("未能连接到下载器，跳过后续操作")
+        # 可选：如需清理Torrent目录
+        check_and_delete_torrent_files()
+    elif download_mgmt and not auto_delete_completed_tasks:
+        logging.info("下载管理功能已启用，但自动删除已完成任务功能未启用，程序退出")
     else:
-        logging.error("未能连接到下载器，跳过后续操作")
-    # 可选：如需清理Torrent目录
-    check_and_delete_torrent_files()
-elif download_mgmt and not auto_delete_completed_tasks:
-    logging.info("下载管理功能已启用，但自动删除已完成任务功能未启用，程序退出")
-else:
-    logging.info("下载管理功能未启用，程序退出")
\ No newline at end of file
+        logging.info("下载管理功能未启用，程序退出")
+
+if __name__ == "__main__":
+    main()
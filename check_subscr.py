@@ -2,6 +2,7 @@ import sqlite3
 import logging
 import json
 import requests
+from tmdb_cache import tmdb_get
 import random
 import time
 
@@ -15,6 +16,8 @@ logging.basicConfig(
     ]
 )
 
+db_path = '/config/data.db'
+
 def load_config(db_path):
     """从数据库中加载配置"""
     try:
@@ -401,6 +404,7 @@ def update_tmdb_items(cursor):
     movies_without_douban = cursor.fetchall()
     
     for movie_id, local_title, year in movies_without_douban:
+        from_cache = False
         try:
             # 使用TMDB搜索电影
             search_url = f"{TMDB_BASE_URL}/3/search/movie"
@@ -411,7 +415,8 @@ def update_tmdb_items(cursor):
                 'language': 'zh-CN'
             }
             
-            response = requests.get(search_url, params=params, timeout=10)
+            response = tmdb_get(search_url, params=params, timeout=10)
+            from_cache = response.from_cache
             if response.status_code == 200:
                 search_data = response.json()
                 if search_data.get('results'):
@@ -438,15 +443,17 @@ def update_tmdb_items(cursor):
         except Exception as e:
             logging.error(f"处理电影 '{local_title}' 时发生未知错误: {e}")
         
-        # 随机休眠避免频繁请求
-        sleep_time = random.uniform(1, 3)
-        time.sleep(sleep_time)
+        # 随机休眠避免频繁请求（命中缓存时未请求 TMDB，无需等待）
+        if not from_cache:
+            sleep_time = random.uniform(1, 3)
+            time.sleep(sleep_time)
     
     # 检查没有douban_id的电视剧
     cursor.execute('SELECT id, title, year, season, missing_episodes FROM MISS_TVS WHERE douban_id IS NULL OR douban_id = ""')
     tvs_without_douban = cursor.fetchall()
     
     for tv_id, local_title, year, season, missing_episodes in tvs_without_douban:
+        from_cache = False
         try:
             # 使用TMDB搜索电视剧
             search_url = f"{TMDB_BASE_URL}/3/search/tv"
@@ -457,7 +464,8 @@ def update_tmdb_items(cursor):
                 'language': 'zh-CN'
             }
             
-            response = requests.get(search_url, params=params, timeout=10)
+            response = tmdb_get(search_url, params=params, timeout=10)
+            from_cache = response.from_cache
             if response.status_code == 200:
                 search_data = response.json()
                 if search_data.get('results'):
@@ -469,7 +477,8 @@ def update_tmdb_items(cursor):
                     # 获取详细季数信息
                     season_url = f"{TMDB_BASE_URL}/3/tv/{tmdb_id}/season/{season}"
                     season_params = {'api_key': TMDB_API_KEY}
-                    season_response = requests.get(season_url, params=season_params, timeout=10)
+                    season_response = tmdb_get(season_url, params=season_params, timeout=10)
+                    from_cache = from_cache and season_response.from_cache
                     
                     if season_response.status_code == 200:
                         season_data = season_response.json()
@@ -532,9 +541,10 @@ def update_tmdb_items(cursor):
         except Exception as e:
             logging.error(f"处理电视剧 '{local_title}' 时发生未知错误: {e}")
         
-        # 随机休眠避免频繁请求
-        sleep_time = random.uniform(1, 3)
-        time.sleep(sleep_time)
+        # 随机休眠避免频繁请求（命中缓存时未请求 TMDB，无需等待）
+        if not from_cache:
+            sleep_time = random.uniform(1, 3)
+            time.sleep(sleep_time)
     
     if not movies_without_douban and not tvs_without_douban:
         logging.info("没有需要检查的TMDB项目")
@@ -568,10 +578,10 @@ def send_notification(title_text):
     except requests.RequestException as e:
         logging.error(f"网络请求出现错误: {e}")
 
-def main():
-    # 读取配置文件
+def main(shared_config=None):
+    # 读取配置文件（由流水线调用时直接使用共享配置）
     global config
-    config = load_config(db_path)
+    config = shared_config if shared_config is not None else load_config(db_path)
     # 连接到数据库
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -605,5 +615,4 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
-    db_path='/config/data.db'
     main()
\ No newline at end of file
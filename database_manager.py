@@ -110,6 +110,10 @@ def create_tables():
             FOREIGN KEY (TV_ID) REFERENCES LIB_TVS(ID)
         )
     ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS IDX_LIB_TV_SEASONS_TV
+        ON LIB_TV_SEASONS (TV_ID, SEASON)
+    ''')
 
     # 创建RSS_MOVIES表
     cursor.execute('''
@@ -176,6 +180,129 @@ def create_tables():
         )
     ''')
 
+    # 创建PIPELINE_EVENTS表（自动化流程触发事件队列）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PIPELINE_EVENTS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            EVENT TEXT NOT NULL,
+            TITLE TEXT,
+            CREATED_AT REAL
+        )
+    ''')
+
+    # 创建INDEX_SEARCHES表（各站点资源搜索记录，含无结果的搜索）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS INDEX_SEARCHES (
+            MEDIA_TYPE TEXT NOT NULL,
+            TITLE TEXT NOT NULL,
+            YEAR TEXT NOT NULL,
+            SEASON INTEGER NOT NULL DEFAULT 0,
+            SITE TEXT NOT NULL,
+            RESULT_COUNT INTEGER DEFAULT 0,
+            FETCHED_AT REAL,
+            MISSING_SIGNATURE TEXT,
+            PRIMARY KEY (MEDIA_TYPE, TITLE, YEAR, SEASON, SITE)
+        )
+    ''')
+
+    # 创建INDEX_RESULTS表（各站点资源索引结果）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS INDEX_RESULTS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            MEDIA_TYPE TEXT NOT NULL,
+            TITLE TEXT NOT NULL,
+            YEAR TEXT NOT NULL,
+            SEASON INTEGER NOT NULL DEFAULT 0,
+            SITE TEXT NOT NULL,
+            RESOLUTION_BUCKET TEXT NOT NULL,
+            ITEM_TYPE TEXT NOT NULL DEFAULT '',
+            RESOLUTION TEXT,
+            RESOURCE_TITLE TEXT,
+            SIZE TEXT,
+            POPULARITY INTEGER DEFAULT 0,
+            LINK TEXT,
+            START_EPISODE INTEGER,
+            END_EPISODE INTEGER,
+            INFO_HASH TEXT,
+            DATA TEXT NOT NULL,
+            FETCHED_AT REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS IDX_INDEX_RESULTS_KEY
+        ON INDEX_RESULTS (MEDIA_TYPE, TITLE, YEAR, SEASON, SITE)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS IDX_INDEX_RESULTS_BEST
+        ON INDEX_RESULTS (MEDIA_TYPE, TITLE, YEAR, SEASON, RESOLUTION_BUCKET, ITEM_TYPE, POPULARITY DESC)
+    ''')
+
+    # 创建TMDB_CACHE表（TMDB 接口响应缓存）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TMDB_CACHE (
+            CACHE_KEY TEXT PRIMARY KEY,
+            ENDPOINT TEXT NOT NULL,
+            BODY BLOB NOT NULL,
+            HEADERS TEXT,
+            ETAG TEXT,
+            LAST_MODIFIED TEXT,
+            FETCHED_AT REAL NOT NULL,
+            ACCESSED_AT REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS IDX_TMDB_CACHE_ACCESSED
+        ON TMDB_CACHE (ACCESSED_AT)
+    ''')
+
+    # 创建PROCESSED_FILES表（已处理文件台账）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PROCESSED_FILES (
+            PATH TEXT PRIMARY KEY,
+            FILENAME TEXT NOT NULL,
+            SIZE INTEGER,
+            MTIME_NS INTEGER,
+            INODE INTEGER,
+            PROCESSED_AT REAL NOT NULL
+        )
+    ''')
+
+    # 创建PROCESSED_DIRECTORIES表（已全部处理的下载目录指纹）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PROCESSED_DIRECTORIES (
+            PATH TEXT PRIMARY KEY,
+            FINGERPRINT TEXT NOT NULL,
+            CHECKED_AT REAL NOT NULL
+        )
+    ''')
+
+    # 创建SCAN_SNAPSHOT表（媒体库扫描的目录快照）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SCAN_SNAPSHOT (
+            KIND TEXT NOT NULL,
+            PATH TEXT NOT NULL,
+            MTIME_NS INTEGER NOT NULL,
+            LISTED_AT_NS INTEGER,
+            LISTING_HASH TEXT NOT NULL,
+            CHILDREN TEXT NOT NULL,
+            DEPENDENCIES TEXT NOT NULL,
+            RESULT TEXT NOT NULL,
+            SCANNED_AT REAL NOT NULL,
+            PRIMARY KEY (KIND, PATH)
+        )
+    ''')
+
+    # 创建NFO_CACHE表（NFO 文件解析结果缓存）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS NFO_CACHE (
+            PATH TEXT PRIMARY KEY,
+            SIZE INTEGER NOT NULL,
+            MTIME_NS INTEGER NOT NULL,
+            DATA TEXT NOT NULL,
+            PARSED_AT REAL NOT NULL
+        )
+    ''')
+
     # 插入默认用户数据
     cursor.execute("SELECT COUNT(*) FROM USERS WHERE USERNAME = 'admin'")
     if cursor.fetchone()[0] == 0:
@@ -232,6 +359,7 @@ def create_tables():
         ("file_overwrite_option", "skip"),
         ("enable_multithread_transfer", "False"),
         ("transfer_thread_count", "4"),
+        ("file_stable_seconds", "10"),
         ("douban_api_key", "0ac44ae016490db2204ce0a042db2916"),
         ("douban_cookie", "your_douban_cookie_here"),
         ("douban_user_ids", "your_douban_id"),
@@ -284,7 +412,12 @@ def create_tables():
         ("seedhub_enabled", "True"),
         ("jackett_enabled", "False"),
         ("1lou_max_hits", "8"),
-        ("run_interval_hours", "6")
+        ("run_interval_hours", "6"),
+        ("pipeline_max_workers", "3"),
+        ("douban_poll_minutes", "30"),
+        ("index_ttl_hours", "12"),
+        ("index_negative_ttl_hours", "3"),
+        ("download_max_workers", "4")
     ]
 
     for option, value in default_configs:
@@ -332,6 +465,70 @@ def migrate_rss_tables_with_status():
     conn.commit()
     conn.close()
 
+def migrate_index_results_info_hash():
+    """
+    迁移 INDEX_RESULTS 表，添加 INFO_HASH 字段及跨站点去重使用的索引
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(INDEX_RESULTS)")
+    columns = cursor.fetchall()
+    if columns and not any(column[1] == 'INFO_HASH' for column in columns):
+        try:
+            cursor.execute("ALTER TABLE INDEX_RESULTS ADD COLUMN INFO_HASH TEXT")
+            logging.info("已向 INDEX_RESULTS 表添加 INFO_HASH 字段")
+        except sqlite3.OperationalError as e:
+            logging.warning(f"添加 INFO_HASH 字段到 INDEX_RESULTS 表时出错: {e}")
+
+    try:
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS IDX_INDEX_RESULTS_HASH
+            ON INDEX_RESULTS (MEDIA_TYPE, TITLE, YEAR, SEASON, INFO_HASH)
+        ''')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"创建 INDEX_RESULTS 表 INFO_HASH 索引时出错: {e}")
+
+    conn.commit()
+    conn.close()
+
+def migrate_lib_tv_seasons_index():
+    """
+    为 LIB_TV_SEASONS 表添加按电视剧和季查询使用的索引
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS IDX_LIB_TV_SEASONS_TV
+            ON LIB_TV_SEASONS (TV_ID, SEASON)
+        ''')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"创建 LIB_TV_SEASONS 表索引时出错: {e}")
+
+    conn.commit()
+    conn.close()
+
+def migrate_scan_snapshot_listed_at():
+    """
+    迁移 SCAN_SNAPSHOT 表，添加记录列目录时间的 LISTED_AT_NS 字段（旧记录为空，下次扫描时重新列目录）
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(SCAN_SNAPSHOT)")
+    columns = cursor.fetchall()
+    if columns and not any(column[1] == 'LISTED_AT_NS' for column in columns):
+        try:
+            cursor.execute("ALTER TABLE SCAN_SNAPSHOT ADD COLUMN LISTED_AT_NS INTEGER")
+            logging.info("已向 SCAN_SNAPSHOT 表添加 LISTED_AT_NS 字段")
+        except sqlite3.OperationalError as e:
+            logging.warning(f"添加 LISTED_AT_NS 字段到 SCAN_SNAPSHOT 表时出错: {e}")
+
+    conn.commit()
+    conn.close()
+
 def migrate_miss_tvs_table():
     """
     迁移 MISS_TVS 表以兼容新的唯一性约束（包含 SEASON 字段）
@@ -482,7 +679,9 @@ def check_and_update_tables():
     # 定义所有表名
     tables = [
         "USERS", "CONFIG", "LIB_MOVIES", "LIB_TVS", "LIB_TV_SEASONS",
-        "RSS_MOVIES", "RSS_TVS", "MISS_MOVIES", "MISS_TVS", "LIB_TV_ALIAS"
+        "RSS_MOVIES", "RSS_TVS", "MISS_MOVIES", "MISS_TVS", "LIB_TV_ALIAS",
+        "PIPELINE_EVENTS", "INDEX_SEARCHES", "INDEX_RESULTS", "TMDB_CACHE", "PROCESSED_FILES", "PROCESSED_DIRECTORIES",
+        "SCAN_SNAPSHOT", "NFO_CACHE"
     ]
 
     for table in tables:
@@ -501,6 +700,15 @@ def check_and_update_tables():
     # 添加 STATUS 字段到 RSS 表
     migrate_rss_tables_with_status()
 
+    # 添加 INFO_HASH 字段到索引结果表
+    migrate_index_results_info_hash()
+
+    # 添加 LIB_TV_SEASONS 表索引
+    migrate_lib_tv_seasons_index()
+
+    # 添加 LISTED_AT_NS 字段到目录快照表
+    migrate_scan_snapshot_listed_at()
+
     conn.close()
 
 def ensure_all_configs_exist():
@@ -552,6 +760,7 @@ def ensure_all_configs_exist():
         ("file_overwrite_option", "skip"),
         ("enable_multithread_transfer", "False"),
         ("transfer_thread_count", "4"),
+        ("file_stable_seconds", "10"),
         ("douban_api_key", "0ac44ae016490db2204ce0a042db2916"),
         ("douban_cookie", "your_douban_cookie_here"),
         ("douban_user_ids", "your_douban_id"),
@@ -604,7 +813,12 @@ def ensure_all_configs_exist():
         ("seedhub_enabled", "True"),
         ("jackett_enabled", "False"),
         ("1lou_max_hits", "8"),
-        ("run_interval_hours", "6")
+        ("run_interval_hours", "6"),
+        ("pipeline_max_workers", "3"),
+        ("douban_poll_minutes", "30"),
+        ("index_ttl_hours", "12"),
+        ("index_negative_ttl_hours", "3"),
+        ("download_max_workers", "4")
     ]
 
     # 检查并插入缺失的配置项
@@ -1,7 +1,7 @@
 import os
-import re
 import sqlite3
 import logging
+from library_catalog import get_catalog
 
 # 配置日志
 logging.basicConfig(
@@ -27,10 +27,27 @@ def read_file_with_encoding(file_path):
     logging.error(f"无法解码文件: {file_path}，所有尝试的编码均失败")
     return None
 
+def _nfo_date(nfo):
+    """
+    NFO 文件中的发行日期或播出日期（有 releasedate 标签时不再查看 aired），
+    年份为 0001 或文件不存在时返回 None
+    """
+    if nfo is None:
+        return None
+    dates = nfo['dates']
+    if dates['releasedate'] is not None:
+        date_content = dates['releasedate'].strip()
+    elif dates['aired'] is not None:
+        date_content = dates['aired'].strip()
+    else:
+        return None
+    return None if date_content.startswith('0001') else date_content
+
 def get_parent_nfo_date(file_path):
     """
     从 tvshow.nfo 或 season.nfo 获取日期信息
     """
+    catalog = get_catalog()
     directory = os.path.dirname(file_path)
     season_nfo_path = os.path.join(directory, 'season.nfo')
     tvshow_nfo_path = None
@@ -41,76 +58,49 @@ def get_parent_nfo_date(file_path):
         tvshow_nfo_path = os.path.join(parent_dir, 'tvshow.nfo')
     
     # 首先尝试从 season.nfo 获取日期
-    if os.path.exists(season_nfo_path):
-        content = read_file_with_encoding(season_nfo_path)
-        if content:
-            releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-            aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-            
-            if releasedate_match:
-                date_content = releasedate_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
-            elif aired_match:
-                date_content = aired_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
+    date_content = _nfo_date(catalog.nfo(season_nfo_path))
+    if date_content:
+        return date_content
     
     # 如果 season.nfo 没有有效日期，则尝试 tvshow.nfo
-    if tvshow_nfo_path and os.path.exists(tvshow_nfo_path):
-        content = read_file_with_encoding(tvshow_nfo_path)
-        if content:
-            releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-            aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-            
-            if releasedate_match:
-                date_content = releasedate_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
-            elif aired_match:
-                date_content = aired_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
+    if tvshow_nfo_path:
+        return _nfo_date(catalog.nfo(tvshow_nfo_path))
     
     return None
 
 def update_dateadded(directory):
     """
     更新指定目录下所有 .nfo 文件中的 <dateadded> 标签值。
+    日期标签从 NFO 缓存中读取，只有需要更新时才读取和改写文件。
     """
     logging.debug(f"开始遍历目录及其子目录: {directory}")
-    for root, dirs, files in os.walk(directory):
-        # 排除 music 目录（不区分大小写）
-        dirs[:] = [d for d in dirs if d.lower() != 'music']
-
+    catalog = get_catalog()
+    # 排除 music 目录（不区分大小写）
+    for root, dirs, files in catalog.walk(directory, skip_dir=lambda name: name.lower() == 'music'):
         for filename in files:
             # 排除 artist.nfo 文件（不区分大小写）
             if filename.lower().endswith('.nfo') and not filename.lower() == 'artist.nfo':
                 file_path = os.path.join(root, filename)
                 logging.debug(f"处理文件: {file_path}")
 
-                content = read_file_with_encoding(file_path)
-                if content is None:
+                nfo = catalog.nfo(file_path)
+                if nfo is None:
                     continue
+                dates = nfo['dates']
 
-                # 使用正则表达式查找<dateadded>, <releasedate>和<aired>标签
-                dateadded_match = re.search(r'<dateadded>(.*?)</dateadded>', content, re.DOTALL)
-                releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-                aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-
-                if dateadded_match:
-                    dateadded_content = dateadded_match.group(1)
+                if dates['dateadded'] is not None:
+                    dateadded_content = dates['dateadded']
                     logging.debug(f"添加日期: {dateadded_content}")
 
                     # 提取 dateadded 的年月日部分
                     dateadded_date = dateadded_content.split()[0]
 
                     replacement_content = None
-                    if releasedate_match:
-                        replacement_content = releasedate_match.group(1).strip()
+                    if dates['releasedate'] is not None:
+                        replacement_content = dates['releasedate'].strip()
                         logging.debug(f"发行日期: {replacement_content}")
-                    elif aired_match:
-                        replacement_content = aired_match.group(1).strip()
+                    elif dates['aired'] is not None:
+                        replacement_content = dates['aired'].strip()
                         logging.debug(f"播出日期: {replacement_content}")
 
                     # 检查是否有有效的本地日期
@@ -140,6 +130,10 @@ def update_dateadded(directory):
                         logging.debug(f"[添加日期] 与 [发行日期] 或 [播出日期] 相同，跳过处理: {file_path}")
                         continue
 
+                    content = read_file_with_encoding(file_path)
+                    if content is None:
+                        continue
+
                     # 替换<dateadded>标签中的内容
                     updated_content = content.replace(
                         f'<dateadded>{dateadded_content}</dateadded>',
@@ -154,6 +148,7 @@ def update_dateadded(directory):
                     logging.info(f'更新完成: {file_path}')
                 else:
                     logging.warning(f"未找到 [添加日期] 标签在文件: {file_path}")
+    catalog.flush()
 
 def get_config_value(db_path, option):
     """
@@ -166,12 +161,19 @@ def get_config_value(db_path, option):
     conn.close()
     return result[0] if result else None
 
-if __name__ == '__main__':
+def main(config=None):
     db_path = '/config/data.db'
-    media_dir = get_config_value(db_path, 'media_dir')
-    dateadded_enabled = get_config_value(db_path, 'dateadded')
+    if config is not None:
+        media_dir = config.get('media_dir')
+        dateadded_enabled = config.get('dateadded')
+    else:
+        media_dir = get_config_value(db_path, 'media_dir')
+        dateadded_enabled = get_config_value(db_path, 'dateadded')
     logging.debug(f"从数据库获取配置: media_dir={media_dir}, dateadded={dateadded_enabled}")
     if dateadded_enabled and dateadded_enabled.lower() == "true":  # 显式检查是否为 "true"
         update_dateadded(media_dir)
     else:
-        logging.info('添加日期功能已禁用.')
\ No newline at end of file
+        logging.info('添加日期功能已禁用.')
+
+if __name__ == '__main__':
+    main()
@@ -14,10 +14,16 @@ import os
 import time
 import tempfile
 import sqlite3
+import threading
 import requests
 import argparse 
 import glob
 from captcha_handler import CaptchaHandler
+from trigger_bus import filter_scoped_rows
+from result_store import load_results, info_hash, btih_from_magnet
+from webdriver_pool import lease_driver
+from http_engine import run_concurrently
+from contextlib import contextmanager
 from pathlib import Path
 import shutil
 from urllib.parse import urljoin
@@ -40,6 +46,22 @@ logging.basicConfig(
 )
 
 
+# 依赖浏览器的下载来源：共用同一个浏览器，并按下载目录中最新的种子文件重命名，同一时间只能进行一个下载
+BROWSER_SOURCES = {"BTHD", "HDTV", "BTYS", "BT0", "GY", "SEEDHUB"}
+# 纯 HTTP 下载来源每个站点同时进行的下载数
+HTTP_SOURCE_CONCURRENCY = 2
+# 同时处理的订阅标题数（可通过 CONFIG 中的 download_max_workers 配置）
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+# 通过 HTTP 直接保存的种子文件，浏览器下载完成后查找最新种子文件时需要排除，避免并发下载时误认
+_direct_saved_torrents = set()
+_direct_saved_torrents_lock = threading.Lock()
+
+def remember_direct_torrent(path):
+    """记录通过 HTTP 直接保存的种子文件"""
+    with _direct_saved_torrents_lock:
+        _direct_saved_torrents.add(os.path.abspath(path))
+
 def get_default_torrent_dir() -> str:
     """获取默认种子目录。
 
@@ -59,6 +81,8 @@ def get_latest_torrent_file(download_dir=None):
     if not download_dir:
         download_dir = get_default_torrent_dir()
     torrent_files = glob.glob(os.path.join(download_dir, "*.torrent"))
+    with _direct_saved_torrents_lock:
+        torrent_files = [f for f in torrent_files if os.path.abspath(f) not in _direct_saved_torrents]
     if not torrent_files:
         return None
     return max(torrent_files, key=os.path.getctime)
@@ -103,10 +127,16 @@ def run_task_adder(torrent_path):
         logging.error(f"添加下载任务时发生未知错误: {e}")
 
 class MediaDownloader:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, titles=None):
         self.db_path = db_path
         self.driver = None
         self.config = {}
+        # 按触发事件只处理指定标题的订阅，为空时处理全部订阅
+        self.titles = set(titles) if titles else None
+        # 浏览器来源共用 self.driver，HTTP 来源按站点限制并发
+        self._browser_lock = threading.RLock()
+        self._source_slots = {}
+        self._source_slots_lock = threading.Lock()
         if not self.db_path:
             self.db_path = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or '/config/data.db'
 
@@ -114,6 +144,12 @@ class MediaDownloader:
         if hasattr(self, 'driver') and self.driver is not None:
             logging.info("WebDriver已经初始化，无需重复初始化")
             return
+        # 默认的无头实例优先租用常驻浏览器，复用已登录的会话；有界面模式仍独立启动
+        if headless and instance_id == 10:
+            self.driver = lease_driver("downloader", self.config, download_dir=get_default_torrent_dir())
+            if self.driver is not None:
+                logging.info("WebDriver初始化完成（常驻浏览器）")
+                return
         options = Options()
         if headless:
             options.add_argument('--headless=new')  # 使用新版无头模式
@@ -221,6 +257,32 @@ class MediaDownloader:
             logging.error(f"WebDriver初始化失败: {e}")
             raise
 
+    @contextmanager
+    def _source_slot(self, source):
+        """按来源限制并发：浏览器来源独占浏览器（按需初始化），HTTP 来源按站点限制同时下载数"""
+        if source in BROWSER_SOURCES:
+            with self._browser_lock:
+                # SeedHub 的磁力链接无需浏览器，需要时由其自行初始化（支持有界面模式）
+                if self.driver is None and source != "SEEDHUB":
+                    self.setup_webdriver()
+                yield
+            return
+        with self._source_slots_lock:
+            slot = self._source_slots.get(source)
+            if slot is None:
+                slot = threading.BoundedSemaphore(HTTP_SOURCE_CONCURRENCY)
+                self._source_slots[source] = slot
+        with slot:
+            yield
+
+    def _download_workers(self):
+        """同时处理的订阅标题数"""
+        try:
+            return max(1, int(self.config.get("download_max_workers", DEFAULT_DOWNLOAD_WORKERS)))
+        except (TypeError, ValueError):
+            logging.warning(f"download_max_workers 配置无效，使用默认值 {DEFAULT_DOWNLOAD_WORKERS}")
+            return DEFAULT_DOWNLOAD_WORKERS
+
     def load_config(self):
         """从数据库中加载配置"""
         try:
@@ -388,32 +450,7 @@ class MediaDownloader:
     def _extract_btih_from_magnet(self, magnet_link: str) -> str | None:
         """从 magnet 链接提取 BTIH（返回 40 位 hex 字符串）。"""
         try:
-            if not magnet_link or not str(magnet_link).startswith("magnet:"):
-                return None
-
-            import re
-            from urllib.parse import parse_qs, urlparse
-
-            qs = parse_qs(urlparse(magnet_link).query)
-            xt_list = qs.get("xt") or []
-            xt = next((x for x in xt_list if x.startswith("urn:btih:")), "")
-            if not xt:
-                return None
-            btih = xt.split("urn:btih:")[-1].strip()
-            if not btih:
-                return None
-
-            # hex 40
-            if re.fullmatch(r"[0-9a-fA-F]{40}", btih):
-                return btih.lower()
-
-            # base32 32 -> hex 40
-            if re.fullmatch(r"[A-Z2-7]{32}", btih.upper()):
-                import base64
-                raw = base64.b32decode(btih.upper())
-                return raw.hex()
-
-            return None
+            return btih_from_magnet(magnet_link)
         except Exception:
             return None
 
@@ -476,6 +513,7 @@ class MediaDownloader:
             if not torrent_bytes:
                 return None
 
+            remember_direct_torrent(out_path)
             with open(out_path, "wb") as f:
                 f.write(torrent_bytes)
 
@@ -532,6 +570,7 @@ class MediaDownloader:
                 logging.warning(f"下载到的内容不像种子文件，可能需要登录/防盗链: url={url} final={getattr(r,'url',url)} snippet={snippet}")
                 return None
 
+            remember_direct_torrent(out_path)
             with open(out_path, "wb") as f:
                 f.write(content)
 
@@ -1323,7 +1362,7 @@ class MediaDownloader:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT title, year FROM MISS_MOVIES')
-                movies = cursor.fetchall()
+                movies = filter_scoped_rows(cursor.fetchall(), self.titles)
                 for title, year in movies:
                     all_movie_info.append({
                         "标题": title,
@@ -1344,7 +1383,7 @@ class MediaDownloader:
             
             # 读取缺失的电视节目信息和缺失的集数信息
             cursor.execute('SELECT title, year, season, missing_episodes FROM MISS_TVS')
-            tvs = cursor.fetchall()
+            tvs = filter_scoped_rows(cursor.fetchall(), self.titles)
             
             for title, year, season, missing_episodes in tvs:
                 # 确保 year 和 season 是字符串类型
@@ -1839,75 +1878,87 @@ class MediaDownloader:
         prefer_keywords = self.config.get("resources_prefer_keywords", "")
         prefer_keywords_list = [kw.strip() for kw in prefer_keywords.split(",") if kw.strip()]
 
-        # 遍历每部电影信息
-        for movie in all_movie_info:
-            title = movie["标题"]
-            year = movie["年份"]
-            
-            # 遍历来源优先级
-            download_success = False
-            for source in sources_priority:
-                index_file_name = f"{title}-{year}-{source}.json"
-                index_file_path = os.path.join("/tmp/index", index_file_name)
+        # 多部电影并发处理，各来源的并发数由 _source_slot 限制
+        run_concurrently(
+            lambda movie: self._download_movie(movie, sources_priority, prefer_keywords_list),
+            all_movie_info, max_workers=self._download_workers(), thread_name_prefix="movie"
+        )
 
-                # 检查索引文件是否存在
-                if not os.path.exists(index_file_path):
-                    logging.warning(f"索引文件不存在: {index_file_path}，尝试下一个来源")
-                    continue
+    def _download_movie(self, movie, sources_priority, prefer_keywords_list):
+        """按来源优先级下载单部电影，成功后移除该电影的订阅"""
+        title = movie["标题"]
+        year = movie["年份"]
+            
+        # 记录已尝试过的种子 BTIH，其他来源的同一种子不再重复尝试
+        attempted_hashes = set()
 
-                # 读取索引文件内容
-                try:
-                    with open(index_file_path, 'r', encoding='utf-8') as f:
-                        index_data = json.load(f)
-                except Exception as e:
-                    logging.error(f"读取索引文件时出错: {index_file_path}, 错误: {e}")
-                    continue
+        # 遍历来源优先级
+        download_success = False
+        for source in sources_priority:
+            # 读取该来源的索引结果
+            try:
+                index_data = load_results(title, year, source, db_path=self.db_path)
+            except Exception as e:
+                logging.error(f"读取索引结果时出错: {title} ({year}) 来源: {source}, 错误: {e}")
+                continue
+            if index_data is None:
+                logging.warning(f"索引结果不存在: {title} ({year}) 来源: {source}，尝试下一个来源")
+                continue
 
-                # 根据优先关键词和热度对下载结果进行排序的函数
-                def sort_key(result):
-                    # 关键词匹配优先级
-                    keyword_score = 0
-                    if prefer_keywords_list:
-                        title_text = result.get("title", "").lower()
-                        keyword_score = sum(1 for kw in prefer_keywords_list if kw.lower() in title_text)
+            # 根据优先关键词和热度对下载结果进行排序的函数
+            def sort_key(result):
+                # 关键词匹配优先级
+                keyword_score = 0
+                if prefer_keywords_list:
+                    title_text = result.get("title", "").lower()
+                    keyword_score = sum(1 for kw in prefer_keywords_list if kw.lower() in title_text)
                     
-                    # 热度值优先级（如果存在）
-                    popularity = result.get("popularity", 0)
+                # 热度值优先级（如果存在）
+                popularity = result.get("popularity", 0)
                     
-                    # 排序规则：首先按关键词匹配数降序，然后按热度降序
-                    return (-keyword_score, -popularity)
-
-                # 按分辨率优先级选择资源
-                selected_result = None
-                selected_resolution_type = None
-                resolution_priorities = ["首选分辨率", "备选分辨率", "其他分辨率"]
-
-                # 按优先级顺序检查各分辨率类型
-                for resolution_type in resolution_priorities:
-                    if index_data.get(resolution_type):
-                        # 对当前分辨率类型中的资源按热度和关键词排序
-                        sorted_results = sorted(index_data[resolution_type], key=sort_key)
-                        if sorted_results:
-                            selected_result = sorted_results[0]
-                            selected_resolution_type = resolution_type
-                            break
+                # 排序规则：首先按关键词匹配数降序，然后按热度降序
+                return (-keyword_score, -popularity)
+
+            # 按分辨率优先级选择资源
+            selected_result = None
+            selected_resolution_type = None
+            resolution_priorities = ["首选分辨率", "备选分辨率", "其他分辨率"]
+
+            # 按优先级顺序检查各分辨率类型
+            for resolution_type in resolution_priorities:
+                if index_data.get(resolution_type):
+                    # 对当前分辨率类型中的资源按热度和关键词排序，跳过已在其他来源尝试过的同一种子
+                    sorted_results = sorted(
+                        (r for r in index_data[resolution_type] if info_hash(r) not in attempted_hashes),
+                        key=sort_key
+                    )
+                    if sorted_results:
+                        selected_result = sorted_results[0]
+                        selected_resolution_type = resolution_type
+                        break
 
-                # 如果找到了合适的资源，则进行下载
-                if selected_result:
-                    download_title = selected_result.get("title")
-                    logging.info(f"在来源 {source} 中找到匹配结果: {download_title} (分辨率类型: {selected_resolution_type})")
+            # 如果找到了合适的资源，则进行下载
+            if selected_result:
+                download_title = selected_result.get("title")
+                logging.info(f"在来源 {source} 中找到匹配结果: {download_title} (分辨率类型: {selected_resolution_type})")
                     
-                    # 获取下载链接和标题
-                    link = selected_result.get("link")
-                    resolution = selected_result.get("resolution")
+                # 获取下载链接和标题
+                link = selected_result.get("link")
+                resolution = selected_result.get("resolution")
 
-                    if not link:
-                        logging.warning(f"未找到种子下载链接: {title} ({year})，尝试下一个结果")
-                        continue
+                if not link:
+                    logging.warning(f"未找到种子下载链接: {title} ({year})，尝试下一个结果")
+                    continue
 
-                    # 根据来源调用相应的下载方法，重命名时传递title参数
-                    logging.info(f"开始下载: {download_title} ({resolution}) 来源: {source}")
-                    try:
+                btih = info_hash(selected_result)
+                if btih:
+                    attempted_hashes.add(btih)
+
+                # 根据来源调用相应的下载方法，重命名时传递title参数
+                logging.info(f"开始下载: {download_title} ({resolution}) 来源: {source}")
+                try:
+                    # 在来源并发限制内下载（浏览器来源独占浏览器）
+                    with self._source_slot(source):
                         if source == "BTHD":
                             self.bthd_download_torrent(selected_result, download_title, year=year, resolution=resolution, title=title)
                         elif source == "BTYS":
@@ -1925,39 +1976,39 @@ class MediaDownloader:
                         elif source == "1LOU":
                             self.onelou_download_torrent(selected_result, download_title, year=year, resolution=resolution, title=title)
                         
-                        # 下载成功
-                        download_success = True
-                        logging.info(f"电影下载成功: {title} ({year})")
+                    # 下载成功
+                    download_success = True
+                    logging.info(f"电影下载成功: {title} ({year})")
                         
-                        # 下载成功后，更新数据库，标记该电影已完成订阅
-                        try:
-                            with sqlite3.connect(self.db_path) as conn:
-                                cursor = conn.cursor()
-                                cursor.execute(
-                                    "DELETE FROM MISS_MOVIES WHERE title=? AND year=?",
-                                    (title, year)
-                                )
-                                conn.commit()
-                            logging.info(f"已更新订阅数据库，移除已完成的电影订阅: {title} ({year})")
-                        except Exception as e:
-                            logging.error(f"更新订阅数据库时出错: {e}")
+                    # 下载成功后，更新数据库，标记该电影已完成订阅
+                    try:
+                        with sqlite3.connect(self.db_path) as conn:
+                            cursor = conn.cursor()
+                            cursor.execute(
+                                "DELETE FROM MISS_MOVIES WHERE title=? AND year=?",
+                                (title, year)
+                            )
+                            conn.commit()
+                        logging.info(f"已更新订阅数据库，移除已完成的电影订阅: {title} ({year})")
+                    except Exception as e:
+                        logging.error(f"更新订阅数据库时出错: {e}")
                         
-                        # 只有下载成功时才发送通知
-                        self.send_notification(movie, download_title, resolution)
-                        break  # 不再尝试当前来源的其他结果
+                    # 只有下载成功时才发送通知
+                    self.send_notification(movie, download_title, resolution)
+                    break  # 不再尝试当前来源的其他结果
                         
-                    except Exception as e:
-                        logging.error(f"下载过程中发生错误: {e}，尝试当前来源的下一个结果")
-                        continue  # 继续尝试当前来源的其他结果
-                else:
-                    logging.warning(f"在来源 {source} 中未找到任何匹配结果")
+                except Exception as e:
+                    logging.error(f"下载过程中发生错误: {e}，尝试当前来源的下一个结果")
+                    continue  # 继续尝试当前来源的其他结果
+            else:
+                logging.warning(f"在来源 {source} 中未找到任何匹配结果")
                 
-                # 如果当前来源中有成功下载的，就不再尝试其他来源
-                if download_success:
-                    break
+            # 如果当前来源中有成功下载的，就不再尝试其他来源
+            if download_success:
+                break
             
-            if not download_success:
-                logging.error(f"所有来源都尝试失败，未能下载电影: {title} ({year})")
+        if not download_success:
+            logging.error(f"所有来源都尝试失败，未能下载电影: {title} ({year})")
 
     def process_tvshow_downloads(self):
         """处理电视节目下载任务"""
@@ -1974,167 +2025,180 @@ class MediaDownloader:
         prefer_keywords = self.config.get("resources_prefer_keywords", "")
         prefer_keywords_list = [kw.strip() for kw in prefer_keywords.split(",") if kw.strip()]
 
-        # 遍历每个电视节目信息
-        for tvshow in all_tv_info:
-            title = tvshow["剧集"]
-            year = tvshow["年份"]
-            season = tvshow["季"]
-            missing_episodes = sorted(map(int, tvshow["缺失集数"]))  # 转换为整数集合并排序
-            logging.debug(f"缺失集数: {missing_episodes}")
+        # 多个电视节目并发处理，各来源的并发数由 _source_slot 限制
+        run_concurrently(
+            lambda tvshow: self._download_tvshow(tvshow, sources_priority, prefer_keywords_list),
+            all_tv_info, max_workers=self._download_workers(), thread_name_prefix="tv"
+        )
+
+    def _download_tvshow(self, tvshow, sources_priority, prefer_keywords_list):
+        """按集数和来源优先级下载单个电视节目的缺失集，并一次性更新该季的缺失集数"""
+        title = tvshow["剧集"]
+        year = tvshow["年份"]
+        season = tvshow["季"]
+        missing_episodes = sorted(map(int, tvshow["缺失集数"]))  # 转换为整数集合并排序
+        logging.debug(f"缺失集数: {missing_episodes}")
             
-            original_missing_episodes = missing_episodes[:]  # 保存原始缺失集数列表
-            successfully_downloaded_episodes = []  # 记录成功下载的集数
+        original_missing_episodes = missing_episodes[:]  # 保存原始缺失集数列表
+        successfully_downloaded_episodes = []  # 记录成功下载的集数
 
-            # 创建一个集合来跟踪已经处理过的资源，避免重复下载
-            processed_resources = set()
+        # 创建一个集合来跟踪已经处理过的资源，避免重复下载
+        processed_resources = set()
             
-            # 添加标志位，用于标识是否已经下载了全集
-            full_season_downloaded = False
+        # 添加标志位，用于标识是否已经下载了全集
+        full_season_downloaded = False
 
-            # 按集数分组处理，确保每集都能尝试不同来源
-            for episode in missing_episodes[:]:  # 使用副本以避免在迭代时修改列表
-                # 如果这一集已经被下载过了（在多集资源中），则跳过
-                if episode in successfully_downloaded_episodes or full_season_downloaded:
-                    continue
+        # 按集数分组处理，确保每集都能尝试不同来源
+        for episode in missing_episodes[:]:  # 使用副本以避免在迭代时修改列表
+            # 如果这一集已经被下载过了（在多集资源中），则跳过
+            if episode in successfully_downloaded_episodes or full_season_downloaded:
+                continue
                     
-                episode_downloaded = False
+            episode_downloaded = False
                 
-                # 遍历来源优先级
-                for source in sources_priority:
-                    index_file_name = f"{title}-S{season}-{year}-{source}.json"
-                    index_file_path = os.path.join("/tmp/index", index_file_name)
-
-                    # 检查索引文件是否存在
-                    if not os.path.exists(index_file_path):
-                        logging.warning(f"索引文件不存在: {index_file_path}，尝试下一个来源")
-                        continue
-
-                    # 读取索引文件内容
-                    try:
-                        with open(index_file_path, 'r', encoding='utf-8') as f:
-                            index_data = json.load(f)
-                    except Exception as e:
-                        logging.error(f"读取索引文件时出错: {index_file_path}, 错误: {e}")
-                        continue
+            # 遍历来源优先级
+            for source in sources_priority:
+                # 读取该来源的索引结果
+                try:
+                    index_data = load_results(title, year, source, season=season, db_path=self.db_path)
+                except Exception as e:
+                    logging.error(f"读取索引结果时出错: {title} ({year}) 第{season}季 来源: {source}, 错误: {e}")
+                    continue
+                if index_data is None:
+                    logging.warning(f"索引结果不存在: {title} ({year}) 第{season}季 来源: {source}，尝试下一个来源")
+                    continue
 
-                    # 定义分辨率优先级
-                    resolution_priorities = ["首选分辨率", "备选分辨率", "其他分辨率"]
+                # 定义分辨率优先级
+                resolution_priorities = ["首选分辨率", "备选分辨率", "其他分辨率"]
                     
-                    # 定义资源类型的优先级映射
-                    item_type_priority = {
-                        "全集": 0,
-                        "集数范围": 1,
-                        "单集": 2
-                    }
+                # 定义资源类型的优先级映射
+                item_type_priority = {
+                    "全集": 0,
+                    "集数范围": 1,
+                    "单集": 2
+                }
                     
-                    # 根据优先关键词和热度对下载结果进行排序的函数
-                    def sort_key(result):
-                        # 关键词匹配优先级
-                        keyword_score = 0
-                        if prefer_keywords_list:
-                            title_text = result.get("title", "").lower()
-                            keyword_score = sum(1 for kw in prefer_keywords_list if kw.lower() in title_text)
+                # 根据优先关键词和热度对下载结果进行排序的函数
+                def sort_key(result):
+                    # 关键词匹配优先级
+                    keyword_score = 0
+                    if prefer_keywords_list:
+                        title_text = result.get("title", "").lower()
+                        keyword_score = sum(1 for kw in prefer_keywords_list if kw.lower() in title_text)
                         
-                        # 热度值优先级（如果存在）
-                        popularity = result.get("popularity", 0)
+                    # 热度值优先级（如果存在）
+                    popularity = result.get("popularity", 0)
                         
-                        # 排序规则：首先按关键词匹配数降序，然后按热度降序
-                        return (-keyword_score, -popularity)
+                    # 排序规则：首先按关键词匹配数降序，然后按热度降序
+                    return (-keyword_score, -popularity)
 
-                    # 按资源类型和分辨率优先级选择资源
-                    selected_result = None
-                    selected_resolution_type = None
-                    selected_item_type = None
+                # 按资源类型和分辨率优先级选择资源
+                selected_result = None
+                selected_resolution_type = None
+                selected_item_type = None
 
-                    # 按资源类型优先级遍历
-                    for item_type in ["全集", "集数范围", "单集"]:
+                # 按资源类型优先级遍历
+                for item_type in ["全集", "集数范围", "单集"]:
+                    if selected_result:
+                        break
+                        
+                    # 在同一资源类型内按分辨率优先级遍历
+                    for resolution_type in resolution_priorities:
                         if selected_result:
                             break
-                        
-                        # 在同一资源类型内按分辨率优先级遍历
-                        for resolution_type in resolution_priorities:
-                            if selected_result:
-                                break
                                 
-                            # 收集当前类型和分辨率下的资源
-                            current_options = []
+                        # 收集当前类型和分辨率下的资源
+                        current_options = []
                             
-                            # 根据类型收集相应资源
-                            if item_type == "全集":
-                                for item in index_data.get(resolution_type, {}).get("全集", []):
-                                    if (item.get("start_episode") is not None and item.get("end_episode") is not None and
-                                        int(item["start_episode"]) <= episode <= int(item["end_episode"])):
-                                        current_options.append(item)
-                            elif item_type == "集数范围":
-                                for item in index_data.get(resolution_type, {}).get("集数范围", []):
-                                    if (item.get("start_episode") is not None and item.get("end_episode") is not None and
-                                        int(item["start_episode"]) <= episode <= int(item["end_episode"])):
-                                        current_options.append(item)
-                            elif item_type == "单集":
-                                for item in index_data.get(resolution_type, {}).get("单集", []):
-                                    if item.get("start_episode") is not None and int(item["start_episode"]) == episode:
-                                        current_options.append(item)
+                        # 根据类型收集相应资源
+                        if item_type == "全集":
+                            for item in index_data.get(resolution_type, {}).get("全集", []):
+                                if (item.get("start_episode") is not None and item.get("end_episode") is not None and
+                                    int(item["start_episode"]) <= episode <= int(item["end_episode"])):
+                                    current_options.append(item)
+                        elif item_type == "集数范围":
+                            for item in index_data.get(resolution_type, {}).get("集数范围", []):
+                                if (item.get("start_episode") is not None and item.get("end_episode") is not None and
+                                    int(item["start_episode"]) <= episode <= int(item["end_episode"])):
+                                    current_options.append(item)
+                        elif item_type == "单集":
+                            for item in index_data.get(resolution_type, {}).get("单集", []):
+                                if item.get("start_episode") is not None and int(item["start_episode"]) == episode:
+                                    current_options.append(item)
                             
-                            # 如果当前类型和分辨率下有资源，则按关键词和热度排序，选择最佳资源
-                            if current_options:
-                                # 对当前选项排序并选择最佳资源
-                                sorted_options = sorted(current_options, key=sort_key)
-                                selected_result = sorted_options[0]
-                                selected_resolution_type = resolution_type
-                                selected_item_type = item_type
-                                break
+                        # 跳过已在其他来源尝试过的同一种子
+                        current_options = [
+                            item for item in current_options
+                            if ("BTIH", info_hash(item)) not in processed_resources
+                        ]
+
+                        # 如果当前类型和分辨率下有资源，则按关键词和热度排序，选择最佳资源
+                        if current_options:
+                            # 对当前选项排序并选择最佳资源
+                            sorted_options = sorted(current_options, key=sort_key)
+                            selected_result = sorted_options[0]
+                            selected_resolution_type = resolution_type
+                            selected_item_type = item_type
+                            break
 
-                    # 如果找到了合适的资源，则进行下载
-                    if selected_result:
-                        # 创建资源唯一标识符
+                # 如果找到了合适的资源，则进行下载
+                if selected_result:
+                    # 创建资源唯一标识符：有 BTIH 时按种子去重，其他来源的同一种子视为同一资源
+                    btih = info_hash(selected_result)
+                    if btih:
+                        resource_identifier = ("BTIH", btih)
+                    else:
                         resource_identifier = (source, selected_result.get("title"), 
                                             selected_result.get("link"), 
                                             selected_result.get("start_episode"), 
                                             selected_result.get("end_episode"))
                         
-                        # 如果这个资源已经被处理过，跳过
-                        if resource_identifier in processed_resources:
-                            continue
+                    # 如果这个资源已经被处理过，跳过
+                    if resource_identifier in processed_resources:
+                        logging.info(f"来源 {source} 的资源已尝试过（同一种子），跳过: {selected_result.get('title')}")
+                        continue
                         
-                        # 找到匹配结果，尝试下载
-                        logging.info(f"在来源 {source} 中找到匹配结果: {selected_result['title']} (类型: {selected_item_type}, 分辨率优先级: {selected_resolution_type})")
+                    # 找到匹配结果，尝试下载
+                    logging.info(f"在来源 {source} 中找到匹配结果: {selected_result['title']} (类型: {selected_item_type}, 分辨率优先级: {selected_resolution_type})")
                         
-                        # 处理集数范围命名
-                        start_ep = selected_result.get("start_episode")
-                        end_ep = selected_result.get("end_episode")
+                    # 处理集数范围命名
+                    start_ep = selected_result.get("start_episode")
+                    end_ep = selected_result.get("end_episode")
                         
-                        # 计算本次下载包含的集数
-                        if start_ep and end_ep:
-                            episode_nums = list(range(int(start_ep), int(end_ep) + 1))
-                        elif start_ep:
-                            episode_nums = [int(start_ep)]
-                        else:
-                            episode_nums = []
+                    # 计算本次下载包含的集数
+                    if start_ep and end_ep:
+                        episode_nums = list(range(int(start_ep), int(end_ep) + 1))
+                    elif start_ep:
+                        episode_nums = [int(start_ep)]
+                    else:
+                        episode_nums = []
                         
-                        # 检查这些集数是否都已经下载过了
-                        already_downloaded = any(ep in successfully_downloaded_episodes for ep in episode_nums)
-                        if already_downloaded:
-                            # 标记这个资源已处理，避免重复尝试
-                            processed_resources.add(resource_identifier)
-                            continue
+                    # 检查这些集数是否都已经下载过了
+                    already_downloaded = any(ep in successfully_downloaded_episodes for ep in episode_nums)
+                    if already_downloaded:
+                        # 标记这个资源已处理，避免重复尝试
+                        processed_resources.add(resource_identifier)
+                        continue
                         
-                        # 处理集数范围
-                        if start_ep and end_ep:
-                            if int(start_ep) == int(end_ep):
-                                episode_range = f"{start_ep}集"
-                            elif int(start_ep) == 1 and int(end_ep) > 1 and selected_result.get("is_full_season", False):
-                                episode_range = f"全{end_ep}集"
-                            else:
-                                episode_range = f"{start_ep}-{end_ep}集"
-                        elif start_ep:
+                    # 处理集数范围
+                    if start_ep and end_ep:
+                        if int(start_ep) == int(end_ep):
                             episode_range = f"{start_ep}集"
+                        elif int(start_ep) == 1 and int(end_ep) > 1 and selected_result.get("is_full_season", False):
+                            episode_range = f"全{end_ep}集"
                         else:
-                            episode_range = "未知集数"
+                            episode_range = f"{start_ep}-{end_ep}集"
+                    elif start_ep:
+                        episode_range = f"{start_ep}集"
+                    else:
+                        episode_range = "未知集数"
                             
-                        resolution = selected_result.get("resolution")
+                    resolution = selected_result.get("resolution")
                         
-                        # 尝试下载
-                        try:
+                    # 尝试下载
+                    try:
+                        # 在来源并发限制内下载（浏览器来源独占浏览器）
+                        with self._source_slot(source):
                             if source == "HDTV":
                                 self.hdtv_download_torrent(selected_result, selected_result["title"], year=year, season=season, episode_range=episode_range, resolution=resolution, title=title)
                             elif source == "BTYS":
@@ -2152,84 +2216,86 @@ class MediaDownloader:
                             elif source == "1LOU":
                                 self.onelou_download_torrent(selected_result, selected_result["title"], year=year, season=season, episode_range=episode_range, resolution=resolution, title=title)
                             
-                            # 下载成功
-                            successfully_downloaded_episodes.extend(episode_nums)
-                            logging.info(f"成功下载集数: {episode_nums}")
-                            self.send_notification(tvshow, selected_result["title"], resolution)
+                        # 下载成功
+                        successfully_downloaded_episodes.extend(episode_nums)
+                        logging.info(f"成功下载集数: {episode_nums}")
+                        self.send_notification(tvshow, selected_result["title"], resolution)
                             
-                            # 标记这个资源已处理
-                            processed_resources.add(resource_identifier)
+                        # 标记这个资源已处理
+                        processed_resources.add(resource_identifier)
                             
-                            # 如果下载的是全集，则标记全集已下载
-                            if selected_item_type == "全集":
-                                full_season_downloaded = True
-                                logging.info(f"全集已下载，跳过该季其余集数的处理")
-                                # 标记该全集包含的所有集数为已下载
-                                if start_ep and end_ep:
-                                    all_episodes_in_full = list(range(int(start_ep), int(end_ep) + 1))
-                                    for ep in all_episodes_in_full:
-                                        if ep not in successfully_downloaded_episodes:
-                                            successfully_downloaded_episodes.append(ep)
+                        # 如果下载的是全集，则标记全集已下载
+                        if selected_item_type == "全集":
+                            full_season_downloaded = True
+                            logging.info(f"全集已下载，跳过该季其余集数的处理")
+                            # 标记该全集包含的所有集数为已下载
+                            if start_ep and end_ep:
+                                all_episodes_in_full = list(range(int(start_ep), int(end_ep) + 1))
+                                for ep in all_episodes_in_full:
+                                    if ep not in successfully_downloaded_episodes:
+                                        successfully_downloaded_episodes.append(ep)
                             
-                            episode_downloaded = True
-                            break  # 不再尝试当前来源的其他结果
+                        episode_downloaded = True
+                        break  # 不再尝试当前来源的其他结果
                             
-                        except Exception as e:
-                            logging.error(f"下载失败: {selected_result['title']}, 错误: {e}，尝试当前来源的下一个结果")
-                            # 标记这个资源已处理，避免重复尝试
-                            processed_resources.add(resource_identifier)
-                            # 继续尝试当前来源的其他结果
-                    else:
-                        logging.warning(f"在来源 {source} 中未找到任何匹配结果")
+                    except Exception as e:
+                        logging.error(f"下载失败: {selected_result['title']}, 错误: {e}，尝试当前来源的下一个结果")
+                        # 标记这个资源已处理，避免重复尝试
+                        processed_resources.add(resource_identifier)
+                        # 继续尝试当前来源的其他结果
+                else:
+                    logging.warning(f"在来源 {source} 中未找到任何匹配结果")
                     
-                    # 如果当前来源中有成功下载的，就不再尝试其他来源
-                    if episode_downloaded:
-                        break
+                # 如果当前来源中有成功下载的，就不再尝试其他来源
+                if episode_downloaded:
+                    break
                 
-                if not episode_downloaded:
-                    logging.warning(f"集数 {episode} 下载失败，所有来源均已尝试")
+            if not episode_downloaded:
+                logging.warning(f"集数 {episode} 下载失败，所有来源均已尝试")
                 
-                # 如果已经下载了全集，则跳出集数循环
-                if full_season_downloaded:
-                    break
+            # 如果已经下载了全集，则跳出集数循环
+            if full_season_downloaded:
+                break
 
-            # 只对实际下载成功的集数更新数据库
-            if successfully_downloaded_episodes:
-                try:
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        # 查询当前缺失集数
-                        cursor.execute(
-                            "SELECT missing_episodes FROM MISS_TVS WHERE title=? AND year=? AND season=?",
-                            (title, year, season)
-                        )
-                        row = cursor.fetchone()
-                        if row:
-                            current_missing = [ep.strip() for ep in row[0].split(',') if ep.strip()]
-                            # 计算剩余缺失集（从原始缺失集中移除成功下载的集数）
-                            updated_missing = [ep for ep in current_missing if ep and int(ep) not in successfully_downloaded_episodes]
-                            if updated_missing:
-                                # 还有未下载的缺失集，更新数据库
-                                cursor.execute(
-                                    "UPDATE MISS_TVS SET missing_episodes=? WHERE title=? AND year=? AND season=?",
-                                    (",".join(updated_missing), title, year, season)
-                                )
-                                logging.info(f"部分集数已下载，剩余缺失集数已更新: {title} S{season} ({year})，剩余缺失集: {updated_missing}")
-                            else:
-                                # 所有缺失集已下载，删除订阅
-                                cursor.execute(
-                                    "DELETE FROM MISS_TVS WHERE title=? AND year=? AND season=?",
-                                    (title, year, season)
-                                )
-                                logging.info(f"所有缺失集已下载，已完成订阅并移除: {title} S{season} ({year})")
-                            conn.commit()
-                except Exception as e:
-                    logging.error(f"更新订阅数据库时出错: {e}")
+        # 只对实际下载成功的集数更新数据库
+        if successfully_downloaded_episodes:
+            try:
+                with sqlite3.connect(self.db_path, timeout=30) as conn:
+                    cursor = conn.cursor()
+                    # 读取和更新缺失集数在同一个写事务中完成，避免与其他进程的更新交错
+                    cursor.execute("BEGIN IMMEDIATE")
+                    # 查询当前缺失集数
+                    cursor.execute(
+                        "SELECT missing_episodes FROM MISS_TVS WHERE title=? AND year=? AND season=?",
+                        (title, year, season)
+                    )
+                    row = cursor.fetchone()
+                    if row:
+                        current_missing = [ep.strip() for ep in row[0].split(',') if ep.strip()]
+                        # 计算剩余缺失集（从原始缺失集中移除成功下载的集数）
+                        updated_missing = [ep for ep in current_missing if ep and int(ep) not in successfully_downloaded_episodes]
+                        if updated_missing:
+                            # 还有未下载的缺失集，更新数据库
+                            cursor.execute(
+                                "UPDATE MISS_TVS SET missing_episodes=? WHERE title=? AND year=? AND season=?",
+                                (",".join(updated_missing), title, year, season)
+                            )
+                            logging.info(f"部分集数已下载，剩余缺失集数已更新: {title} S{season} ({year})，剩余缺失集: {updated_missing}")
+                        else:
+                            # 所有缺失集已下载，删除订阅
+                            cursor.execute(
+                                "DELETE FROM MISS_TVS WHERE title=? AND year=? AND season=?",
+                                (title, year, season)
+                            )
+                            logging.info(f"所有缺失集已下载，已完成订阅并移除: {title} S{season} ({year})")
+                        conn.commit()
+            except Exception as e:
+                logging.error(f"更新订阅数据库时出错: {e}")
 
-            # 计算仍然未找到匹配的集数
-            still_missing = [ep for ep in original_missing_episodes if ep not in successfully_downloaded_episodes]
-            if still_missing:
-                logging.warning(f"未找到匹配的下载结果或下载失败: {title} S{season} ({year}) 缺失集数: {still_missing}")
+        # 计算仍然未找到匹配的集数
+        still_missing = [ep for ep in original_missing_episodes if ep not in successfully_downloaded_episodes]
+        if still_missing:
+            logging.warning(f"未找到匹配的下载结果或下载失败: {title} S{season} ({year}) 缺失集数: {still_missing}")
 
     def close_driver(self):
         if self.driver:
@@ -2237,13 +2303,15 @@ class MediaDownloader:
             logging.info("WebDriver关闭完成")
             self.driver = None  # 重置 driver 变量
 
-    def run(self):
+    def run(self, config=None):
         """运行程序的主逻辑"""
         try:
-            # 加载配置文件
-            self.load_config()
-            # 初始化WebDriver
-            self.setup_webdriver()
+            # 加载配置文件（由流水线调用时直接使用共享配置）
+            if config is not None:
+                self.config = dict(config)
+            else:
+                self.load_config()
+            # WebDriver 在首次使用浏览器来源下载时初始化，只涉及 HTTP 来源时不启动浏览器
             # 获取基础 URL
             bt_movie_base_url = self.config.get("bt_movie_base_url", "")
             self.movie_login_url = f"{bt_movie_base_url}/member.php?mod=logging&action=login"
@@ -2282,6 +2350,10 @@ class MediaDownloader:
             # 确保程序结束时关闭 WebDriver
             self.close_driver()
 
+def main(config=None, titles=None):
+    """流水线入口：按订阅下载缺失的媒体资源，titles 不为空时只处理这些标题"""
+    MediaDownloader(titles=titles).run(config)
+
 if __name__ == "__main__":
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description="Media Downloader")
@@ -2299,8 +2371,7 @@ if __name__ == "__main__":
             downloader.load_config()
 
             site_upper = args.site.upper()
-            selenium_sites = {"BTHD", "BTYS", "BT0", "GY", "HDTV", "SEEDHUB"}
-            if site_upper in selenium_sites:
+            if site_upper in BROWSER_SOURCES:
                 if site_upper == "SEEDHUB":
                     seedhub_headful = (os.environ.get("SEEDHUB_HEADFUL") or "").strip().lower() in {"1", "true", "yes", "on"}
                     downloader.setup_webdriver(headless=not seedhub_headful)
@@ -2,6 +2,7 @@ import os
 from xml.etree import ElementTree as ET
 import logging
 import sqlite3
+from library_catalog import get_catalog
 
 # 配置日志
 logging.basicConfig(
@@ -29,64 +30,57 @@ def load_config(db_path='/config/data.db'):
         exit(0)
 def parse_nfo(file_path):
     """解析NFO文件，返回演员字典，键为tmdbid或imdbid，值为(name, role)元组"""
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        actors = {}
-        for actor in root.findall('actor'):
-            tmdbid_elem = actor.find('tmdbid')
-            imdbid_elem = actor.find('imdbid')
-            name_elem = actor.find('name')
-            role_elem = actor.find('role')
-            type_elem = actor.find('type')
-            
-            if name_elem is None:
-                logging.warning(f"文件 {file_path} 中的演员缺少 name 标签")
-                continue
-            
-            name = name_elem.text
-            role = role_elem.text if role_elem is not None else "演员"
-            
-            if role_elem is None:
-                # 创建新的 <role> 标签并插入到 <name> 和 <type> 之间
-                role_elem = ET.SubElement(actor, 'role')
-                role_elem.text = "演员"
-                name_elem.tail = '\n  '  # 确保 <role> 标签在 <name> 标签之后换行插入
-                role_elem.tail = '\n  '  # 确保 <role> 标签之后换行插入
-                
-                # 如果有 <type> 标签，确保 <role> 标签在 <type> 标签之前
-                if type_elem is not None:
-                    actor.remove(type_elem)
-                    actor.append(type_elem)
-                
-                logging.info(f"为文件 {file_path} 中的演员添加了默认的 <role> 标签")
-            
-            tmdbid = tmdbid_elem.text if tmdbid_elem is not None else None
-            imdbid = imdbid_elem.text if imdbid_elem is not None else None
-            
-            if tmdbid:
-                actors[tmdbid] = (name, role)
-            elif imdbid:
-                actors[imdbid] = (name, role)
-            else:
-                logging.warning(f"文件 {file_path} 中的演员缺少 tmdbid 和 imdbid")
-        
-        # 保存更新后的 tvshow.nfo 文件
-        if any(role_elem is None for role_elem in [actor.find('role') for actor in root.findall('actor')]):
-            tree.write(file_path, encoding='utf-8', xml_declaration=True)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content.replace('><', '>\n<'))
-        
-        logging.info(f"解析了 {len(actors)} 位演员的信息，来源文件：{file_path}")
-        return actors
-    except Exception as e:
-        logging.error(f"解析文件 {file_path} 时出错：{e}")
+    nfo = get_catalog().nfo(file_path)
+    if nfo is None or nfo['error']:
+        logging.error(f"解析文件 {file_path} 时出错：{nfo['error'] if nfo else '文件无法读取'}")
         return {}
+    actors = {}
+    for actor in nfo['actors']:
+        if 'name' not in actor:
+            logging.warning(f"文件 {file_path} 中的演员缺少 name 标签")
+            continue
+
+        name = actor['name']
+        # 缺少 <role> 标签的演员使用默认角色
+        role = actor.get('role', "演员")
+        tmdbid = actor.get('tmdbid')
+        imdbid = actor.get('imdbid')
+
+        if tmdbid:
+            actors[tmdbid] = (name, role)
+        elif imdbid:
+            actors[imdbid] = (name, role)
+        else:
+            logging.warning(f"文件 {file_path} 中的演员缺少 tmdbid 和 imdbid")
+
+    logging.info(f"解析了 {len(actors)} 位演员的信息，来源文件：{file_path}")
+    return actors
+
+def needs_update(file_path, actors):
+    """根据 NFO 缓存判断文件中是否有演员的名字或角色与 actors 不一致"""
+    nfo = get_catalog().nfo(file_path)
+    if nfo is None or nfo['error']:
+        return True
+    for actor in nfo['actors']:
+        if 'name' not in actor:
+            continue
+        tmdbid = actor.get('tmdbid')
+        imdbid = actor.get('imdbid')
+        if tmdbid and tmdbid in actors:
+            name, role = actors[tmdbid]
+        elif imdbid and imdbid in actors:
+            name, role = actors[imdbid]
+        else:
+            continue
+        if actor['name'] != name or 'role' not in actor or actor['role'] != role:
+            return True
+    return False
 
 def update_nfo(file_path, actors):
     """更新NFO文件中的演员角色信息"""
+    if not needs_update(file_path, actors):
+        logging.debug(f"文件无需更新：{file_path}")
+        return
     try:
         tree = ET.parse(file_path)
         root = tree.getroot()
@@ -154,8 +148,8 @@ def update_nfo(file_path, actors):
     except Exception as e:
         logging.error(f"更新文件 {file_path} 时出错：{e}")
 
-def process_directory(base_dir, exclude_dirs):
-    """处理给定目录及其子目录中的NFO文件"""
+def process_directory(base_dir, exclude_dirs, walk_results=None):
+    """处理给定目录及其子目录中的NFO文件，walk_results 为该目录子树的遍历结果"""
     if any(exclude_dir in base_dir for exclude_dir in exclude_dirs):
         logging.debug(f"跳过排除目录：{base_dir}")
         return
@@ -163,7 +157,9 @@ def process_directory(base_dir, exclude_dirs):
     tvshow_nfo_path = os.path.join(base_dir, 'tvshow.nfo')
     if os.path.exists(tvshow_nfo_path):
         main_actors = parse_nfo(tvshow_nfo_path)
-        for root, dirs, files in os.walk(base_dir):
+        if walk_results is None:
+            walk_results = get_catalog().walk(base_dir)
+        for root, dirs, files in walk_results:
             for file in files:
                 if file.endswith('.nfo') and 'Season' in root:  # 只处理季目录中的NFO文件
                     nfo_file_path = os.path.join(root, file)
@@ -172,23 +168,44 @@ def process_directory(base_dir, exclude_dirs):
         logging.warning(f"未找到文件 tvshow.nfo 在目录：{base_dir}")
 
 def process_media_directory(media_dir, exclude_dirs):
-    """递归处理媒体目录及其所有子目录"""
-    for root, dirs, files in os.walk(media_dir):
+    """递归处理媒体目录及其所有子目录（只遍历一次，各剧集目录使用遍历结果中对应的子树）"""
+    walk_results = get_catalog().walk(media_dir)
+
+    # 遍历结果按先序排列，每个目录的子树是从该目录开始的连续一段，记录各段的起止位置
+    subtrees = {}
+    open_dirs = []
+    for index, (root, _, _) in enumerate(walk_results):
+        while open_dirs and not root.startswith(open_dirs[-1][0] + os.sep):
+            path, start = open_dirs.pop()
+            subtrees[path] = (start, index)
+        open_dirs.append((root, index))
+    for path, start in open_dirs:
+        subtrees[path] = (start, len(walk_results))
+
+    for root, dirs, files in walk_results:
         for dir_name in dirs:
             show_path = os.path.join(root, dir_name)
             if os.path.isdir(show_path):
-                process_directory(show_path, exclude_dirs)
+                # 符号链接目录不在遍历结果中，由 process_directory 单独遍历
+                bounds = subtrees.get(show_path)
+                subtree = walk_results[bounds[0]:bounds[1]] if bounds else None
+                process_directory(show_path, exclude_dirs, subtree)
+    get_catalog().flush()
 
-if __name__ == '__main__':
-    config = load_config()
+def main(config=None):
+    if config is None:
+        config = load_config()
 
     # 新增：判断actor_nfo配置项
     actor_nfo = config.get('actor_nfo', '').strip().lower()
     if actor_nfo != 'true':
         logging.info('NFO演职人员汉化未启用，程序无需运行。')
-        exit(0)
+        return
 
     media_dir = config.get('episodes_path', '')
     exclude_dirs = config.get('nfo_exclude_dirs', '').split(',')
 
-    process_media_directory(media_dir, exclude_dirs)
\ No newline at end of file
+    process_media_directory(media_dir, exclude_dirs)
+
+if __name__ == '__main__':
+    main()
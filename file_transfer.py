@@ -0,0 +1,148 @@
+import os
+import time
+import errno
+import shutil
+import logging
+
+try:
+    import fcntl
+except ImportError:  # 非 Linux 平台
+    fcntl = None
+
+from transfer_queue import device_slot
+
+# ioctl FICLONE（btrfs/XFS 等支持写时复制的文件系统上共享数据块）
+FICLONE = 0x40049409
+# 每次 copy_file_range/sendfile 的最大字节数
+CHUNK_SIZE = 64 * 1024 * 1024
+# 校验时抽样比较的块大小和块数
+VERIFY_BLOCK_SIZE = 1024 * 1024
+VERIFY_SAMPLES = 8
+
+
+def _partial_path(dst):
+    """复制过程中使用的临时文件（隐藏文件，不会被监控和媒体服务器识别）"""
+    directory, name = os.path.split(dst)
+    return os.path.join(directory, f".{name}.part")
+
+
+def is_partial_name(name):
+    """是否为复制/下载中的临时文件（隐藏文件或 .part 文件），不应视为已存在的媒体文件"""
+    return name.startswith('.') or name.endswith('.part')
+
+
+def _read_block(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+def _sample_offsets(size):
+    if size <= VERIFY_BLOCK_SIZE * VERIFY_SAMPLES:
+        return range(0, size, VERIFY_BLOCK_SIZE)
+    step = (size - VERIFY_BLOCK_SIZE) // (VERIFY_SAMPLES - 1)
+    return [i * step for i in range(VERIFY_SAMPLES)]
+
+
+def verify_copy(src, dst, length=None):
+    """比较文件大小并抽样比较数据块，length 指定时只校验前 length 字节"""
+    size = os.path.getsize(src) if length is None else length
+    if length is None and os.path.getsize(dst) != size:
+        return False
+    with open(src, 'rb') as fsrc, open(dst, 'rb') as fdst:
+        for offset in _sample_offsets(size):
+            block = min(VERIFY_BLOCK_SIZE, size - offset)
+            if _read_block(fsrc, offset, block) != _read_block(fdst, offset, block):
+                return False
+    return True
+
+
+def _try_reflink(fsrc, fdst):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _copy_range(fsrc, fdst, offset, size):
+    """从 offset 开始复制剩余数据，依次尝试 copy_file_range、sendfile 和普通读写，返回使用的方式"""
+    in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(in_fd, out_fd, min(CHUNK_SIZE, size - offset), offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+            if offset >= size:
+                return "copy_file_range"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            os.lseek(out_fd, offset, os.SEEK_SET)
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, min(CHUNK_SIZE, size - offset))
+                if sent == 0:
+                    break
+                offset += sent
+            if offset >= size:
+                return "sendfile"
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                raise
+    fsrc.seek(offset)
+    fdst.seek(offset)
+    shutil.copyfileobj(fsrc, fdst, length=CHUNK_SIZE // 8)
+    return "read/write"
+
+
+def copy_file(src, dst):
+    """
+    复制文件并保留元数据。
+    优先使用 reflink 共享数据块，否则使用 copy_file_range/sendfile 在内核中复制；
+    数据先写入临时文件，中断后再次复制时校验已复制部分并从断点继续，完成后校验再重命名为目标文件。
+    """
+    partial = _partial_path(dst)
+    size = os.path.getsize(src)
+    start = time.monotonic()
+    with device_slot(src, dst):
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if offset > size or (offset and not verify_copy(src, partial, length=offset)):
+            logging.info(f"已复制部分与源文件不一致，重新复制: {dst}")
+            offset = 0
+        elif offset:
+            logging.info(f"从断点继续复制: {dst}，已完成 {offset / size:.0%}")
+
+        with open(src, 'rb') as fsrc, open(partial, 'r+b' if offset else 'wb') as fdst:
+            fdst.truncate(offset)
+            if offset == 0 and _try_reflink(fsrc, fdst):
+                method = "reflink"
+            else:
+                method = _copy_range(fsrc, fdst, offset, size)
+
+        if not verify_copy(src, partial):
+            os.remove(partial)
+            raise OSError(errno.EIO, f"复制后校验失败: {src}")
+        shutil.copystat(src, partial)
+        os.replace(partial, dst)
+
+    elapsed = max(time.monotonic() - start, 1e-6)
+    copied_mb = (size - offset) / 1024 / 1024
+    logging.info(f"复制完成: {os.path.basename(dst)}，{copied_mb:.0f} MB，用时 {elapsed:.1f} 秒，"
+                 f"{copied_mb / elapsed:.1f} MB/s（{method}）")
+
+
+def move_file(src, dst):
+    """移动文件：同一文件系统内直接重命名，跨文件系统时复制校验后删除源文件"""
+    try:
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(src, dst)
+    os.remove(src)
@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 同一站点同时进行的请求数上限
+DEFAULT_HOST_CONCURRENCY = 4
+# 同一站点的平均请求速率（次/秒）及允许的突发请求数
+DEFAULT_RATE_PER_SECOND = 2.0
+DEFAULT_BURST = 4
+# 同时处理的标题数
+DEFAULT_TITLE_WORKERS = 6
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，每次请求消耗一个令牌，令牌不足时等待"""
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class PoliteSession(requests.Session):
+    """
+    可在多个线程间共享的 requests 会话。
+    按站点（host）限制并发请求数和请求速率，并放大连接池以便并发请求复用 keep-alive 连接。
+    """
+    def __init__(self, host_concurrency=DEFAULT_HOST_CONCURRENCY, rate_per_second=DEFAULT_RATE_PER_SECOND,
+                 burst=DEFAULT_BURST):
+        super().__init__()
+        self.host_concurrency = max(1, int(host_concurrency))
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.host_concurrency * 2)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def _host_limits(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._hosts_lock:
+            limits = self._hosts.get(host)
+            if limits is None:
+                limits = (threading.BoundedSemaphore(self.host_concurrency),
+                          TokenBucket(self.rate_per_second, self.burst))
+                self._hosts[host] = limits
+            return limits
+
+    def request(self, method, url, *args, **kwargs):
+        slots, bucket = self._host_limits(url)
+        with slots:
+            bucket.acquire()
+            return super().request(method, url, *args, **kwargs)
+
+
+def run_concurrently(func, items, max_workers=DEFAULT_TITLE_WORKERS, thread_name_prefix=None):
+    """
+    并发执行 func(item)，按 items 的顺序返回结果。
+    单个任务抛出异常时记录日志并以 None 作为其结果，不影响其他任务。
+    """
+    items = list(items)
+    if not items:
+        return []
+    # 线程名以当前线程名为前缀，流水线按阶段线程名归集日志
+    prefix = f"{threading.current_thread().name}-{thread_name_prefix or 'worker'}"
+
+    def call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            logging.error(f"并发任务执行失败 {item}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))), thread_name_prefix=prefix) as executor:
+        return list(executor.map(call, items))
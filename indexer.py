@@ -1,10 +1,12 @@
 import subprocess
 import logging
-import os
-import glob
+import sqlite3
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import time
+from trigger_bus import title_scope_env
+from pipeline import load_shared_config
+from result_store import DB_PATH, missing_signature, stale_titles, stamp_searches, prune_results
 
 # 配置日志
 logging.basicConfig(
@@ -16,21 +18,26 @@ logging.basicConfig(
     ]
 )
 
-def clear_index_directory():
-    index_dir = "/tmp/index/"
-    if os.path.exists(index_dir):
-        logging.info(f"清理目录: {index_dir}")
-        json_files = glob.glob(os.path.join(index_dir, "*.json"))
-        for file in json_files:
-            try:
-                os.remove(file)
-                logging.info(f"已删除文件: {file}")
-            except Exception as e:
-                logging.error(f"删除文件 {file} 时出错: {e}")
-    else:
-        logging.info(f"目录不存在: {index_dir}")
+# 索引脚本 -> (站点名称, 索引结果中的站点标识, 支持的媒体类型)
+INDEX_SCRIPTS = {
+    "movie_bthd.py": ("高清影视之家", "BTHD", ("movie",)),
+    "tvshow_hdtv.py": ("高清剧集网", "HDTV", ("tv",)),
+    "movie_tvshow_btys.py": ("BT影视", "BTYS", ("movie", "tv")),
+    "movie_tvshow_bt0.py": ("不太灵影视", "BT0", ("movie", "tv")),
+    "movie_tvshow_gy.py": ("观影", "GY", ("movie", "tv")),
+    "movie_tvshow_btsj6.py": ("BT世界网", "BTSJ6", ("movie", "tv")),
+    "movie_tvshow_1lou.py": ("1LOU", "1LOU", ("movie", "tv")),
+    "movie_tvshow_seedhub.py": ("SeedHub", "SEEDHUB", ("movie", "tv")),
+    "movie_tvshow_jackett.py": ("Jackett", "JACKETT", ("movie", "tv"))
+}
+
+# 索引结果有效期（小时），可通过 CONFIG 中的 index_ttl_hours / index_negative_ttl_hours 配置
+DEFAULT_INDEX_TTL_HOURS = 12
+DEFAULT_NEGATIVE_TTL_HOURS = 3
+# 超过该时间未更新的索引结果（已取消的订阅、手动搜索结果）将被清理
+RESULT_RETENTION_SECONDS = 7 * 24 * 60 * 60
 
-def run_script(script_name, friendly_name, instance_id):
+def run_script(script_name, friendly_name, instance_id, titles=None):
     try:
         # 捕获子进程的输出，将标准输出和错误输出合并
         result = subprocess.run(
@@ -38,7 +45,8 @@ def run_script(script_name, friendly_name, instance_id):
             check=True,
             stdout=subprocess.PIPE,  # 捕获标准输出
             stderr=subprocess.STDOUT,  # 将标准错误重定向到标准输出
-            text=True  # 确保输出为字符串
+            text=True,  # 确保输出为字符串
+            env=title_scope_env(titles)  # 按触发事件限定索引的标题范围
         )
         # 记录合并后的输出
         logging.info(f"索引程序日志:\n{result.stdout}")
@@ -53,30 +61,81 @@ def run_script(script_name, friendly_name, instance_id):
         logging.info("-" * 80)
         return False
 
-def main():
-    # 清理 /tmp/index/ 目录
-    clear_index_directory()
+def get_ttl_seconds(config, option, default_hours):
+    try:
+        return float(config.get(option, default_hours)) * 3600
+    except (TypeError, ValueError):
+        logging.warning(f"{option} 配置无效，使用默认值 {default_hours} 小时")
+        return default_hours * 3600
+
+def load_subscriptions(db_path=DB_PATH):
+    """读取当前订阅，返回 [(media_type, title, year, season, 缺失集数签名)]"""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT TITLE, YEAR FROM MISS_MOVIES")
+        subscriptions = [("movie", title, year, None, None) for title, year in cursor.fetchall()]
+        cursor.execute("SELECT TITLE, YEAR, SEASON, MISSING_EPISODES FROM MISS_TVS")
+        subscriptions += [
+            ("tv", title, year, season, missing_signature(missing_episodes))
+            for title, year, season, missing_episodes in cursor.fetchall()
+        ]
+    return subscriptions
+
+def index_site(script_name, friendly_name, site, instance_id, titles, subscriptions):
+    """运行站点索引脚本，并为本次完成的搜索记录缺失集数签名"""
+    started_at = time.time()
+    try:
+        return run_script(script_name, friendly_name, instance_id, titles)
+    finally:
+        try:
+            stamp_searches(site, started_at, subscriptions)
+        except sqlite3.Error as e:
+            logging.error(f"记录 {friendly_name} 索引状态失败: {e}")
+
+def main(config=None, titles=None):
+    if config is None:
+        config = load_shared_config()
+    ttl = get_ttl_seconds(config, "index_ttl_hours", DEFAULT_INDEX_TTL_HOURS)
+    negative_ttl = get_ttl_seconds(config, "index_negative_ttl_hours", DEFAULT_NEGATIVE_TTL_HOURS)
+
+    prune_results(RESULT_RETENTION_SECONDS)
+    subscriptions = load_subscriptions()
+    # 按标题触发时只考虑事件中的标题
+    if titles:
+        logging.info(f"仅为以下标题建立索引: {', '.join(sorted(titles))}")
+        subscriptions = [sub for sub in subscriptions if sub[1] in titles]
+    if not subscriptions:
+        logging.info("没有需要建立索引的订阅")
+        return
+
+    # 每个站点只重新索引从未索引、缺失集数已变化或索引已过期的标题
+    jobs = []
+    for i, (script_name, (friendly_name, site, media_types)) in enumerate(INDEX_SCRIPTS.items()):
+        candidates = [sub for sub in subscriptions if sub[0] in media_types]
+        if not candidates:
+            continue
+        stale = stale_titles(site, candidates, ttl, negative_ttl)
+        if not stale:
+            logging.info(f"{friendly_name}: {len(candidates)} 个订阅的索引均在有效期内，跳过")
+            continue
+        logging.info(f"{friendly_name}: 需要更新 {len(stale)} 个标题的索引: {', '.join(sorted(stale))}")
+        jobs.append((script_name, friendly_name, site, f"{i}", stale,
+                     [sub for sub in candidates if sub[1] in stale]))
 
-    scripts = {
-        "movie_bthd.py": "高清影视之家",
-        "tvshow_hdtv.py": "高清剧集网",
-        "movie_tvshow_btys.py": "BT影视",
-        "movie_tvshow_bt0.py": "不太灵影视",
-        "movie_tvshow_gy.py": "观影",
-        "movie_tvshow_btsj6.py": "BT世界网",
-        "movie_tvshow_1lou.py": "1LOU",
-        "movie_tvshow_seedhub.py": "SeedHub",
-        "movie_tvshow_jackett.py": "Jackett"
-    }
+    if not jobs:
+        logging.info("所有站点的索引均在有效期内，无需重新索引")
+        return
 
     # 使用线程池并行执行脚本
-    max_workers = min(len(scripts), 5)  # 最多同时运行5个脚本
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务，为每个任务生成唯一的instance_id
+    max_workers = min(len(jobs), 5)  # 最多同时运行5个脚本
+    # 工作线程以当前线程名为前缀，流水线据此将其日志写入 indexer.log
+    thread_prefix = f"{threading.current_thread().name}-worker"
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_prefix) as executor:
+        # 提交所有任务，每个站点使用固定的instance_id
         future_to_script = {}
-        for i, (script_name, friendly_name) in enumerate(scripts.items()):
-            instance_id = f"{i}"
-            future = executor.submit(run_script, script_name, friendly_name, instance_id)
+        for script_name, friendly_name, site, instance_id, stale, stale_subscriptions in jobs:
+            future = executor.submit(index_site, script_name, friendly_name, site, instance_id, stale,
+                                     stale_subscriptions)
             future_to_script[future] = (script_name, friendly_name)
             time.sleep(2)
         
@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline import get_db_pool
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 并行列目录的线程数（网络挂载下列目录主要耗时在往返等待）
+DEFAULT_WALK_WORKERS = 8
+# 目录修改时间与列目录时间相差不足该值时不信任缓存的列表（修改时间精度较粗的文件系统上可能漏掉同一时刻的变化）
+RACY_WINDOW_NS = 2 * 10**9
+# 内存中保留的 NFO 解析结果数
+MAX_MEMORY_ENTRIES = 4096
+# 累计多少条新解析结果写入一次数据库
+FLUSH_EVERY = 200
+# 超过该时间未重新解析的缓存条目在清理时删除（文件可能已不存在），下次访问时重新解析
+MAX_ENTRY_AGE = 30 * 24 * 3600
+
+NFO_ENCODINGS = ['utf-8', 'gbk', 'iso-8859-1']
+NFO_FIELDS = ('title', 'year', 'seasonnumber', 'premiered', 'releasedate', 'aired')
+NFO_DATE_PATTERNS = {
+    tag: re.compile(rf'<{tag}>(.*?)</{tag}>', re.DOTALL) for tag in ('dateadded', 'releasedate', 'aired')
+}
+
+DirectoryListing = namedtuple('DirectoryListing', 'mtime listed_at dirs files children')
+
+
+def list_directory(directory):
+    """返回 (文件名列表, 子目录名列表, 需要继续遍历的子目录名列表)，与 os.walk 的划分一致"""
+    files, dirs, children = [], [], []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs.append(entry.name)
+                if not entry.is_symlink():
+                    children.append(entry.name)
+            else:
+                files.append(entry.name)
+    return files, dirs, children
+
+
+def _decode(raw):
+    for encoding in NFO_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('utf-8', errors='replace')
+
+
+def parse_nfo(path):
+    """
+    读取并解析 NFO 文件，返回可 JSON 序列化的字典：
+    tag 根元素名；title/year/seasonnumber/premiered/releasedate/aired 为根元素下对应元素的文本；
+    uniqueids 为 {类型: 值}（同一类型取第一个）；actors 为根元素下各 actor 的 name/role/tmdbid/imdbid（缺少的元素不含对应键）；
+    dates 为原文中第一个 dateadded/releasedate/aired 标签的内容（按文本匹配，XML 无法解析时同样可用）；
+    error 为 XML 解析错误信息。
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    text = _decode(raw)
+    record = {
+        "tag": None,
+        "uniqueids": {},
+        "actors": [],
+        "dates": {tag: (m.group(1) if m else None) for tag, m in
+                  ((tag, pattern.search(text)) for tag, pattern in NFO_DATE_PATTERNS.items())},
+        "error": None,
+    }
+    for field in NFO_FIELDS:
+        record[field] = None
+    try:
+        root = ET.fromstring(raw)
+    except ET.ParseError as e:
+        record["error"] = str(e)
+        return record
+
+    record["tag"] = root.tag
+    for field in NFO_FIELDS:
+        element = root.find(field)
+        record[field] = element.text if element is not None else None
+    for element in root.iter('uniqueid'):
+        id_type = element.get('type')
+        if id_type and id_type not in record["uniqueids"]:
+            record["uniqueids"][id_type] = element.text
+    for actor in root.findall('actor'):
+        entry = {}
+        for field in ('name', 'role', 'tmdbid', 'imdbid'):
+            element = actor.find(field)
+            if element is not None:
+                entry[field] = element.text
+        record["actors"].append(entry)
+    return record
+
+
+class LibraryCatalog:
+    """
+    媒体目录和 NFO 文件的共享目录册，同一进程内的各阶段共用（见 get_catalog）。
+    walk 使用多个线程并行列目录，目录修改时间未变化时复用上次的列表；
+    nfo 返回解析结果，按 (路径, 大小, 修改时间) 缓存在内存和 NFO_CACHE 表中，文件未变化时不再读取和解析。
+    """
+    def __init__(self, db_path=DB_PATH, workers=DEFAULT_WALK_WORKERS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._listings = {}
+        self._records = OrderedDict()  # path -> (大小, 修改时间, 解析结果)
+        self._pending = []
+        self._pruned = False
+
+    # ---- 目录遍历 ----
+
+    def _list(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return directory, None
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is not None and listing.mtime == mtime and listing.listed_at - mtime > RACY_WINDOW_NS:
+            return directory, listing
+        try:
+            files, dirs, children = list_directory(directory)
+        except OSError as e:
+            logging.warning(f"读取目录失败: {directory}, 错误: {e}")
+            return directory, None
+        listing = DirectoryListing(mtime, time.time_ns(), dirs, files, children)
+        with self._lock:
+            self._listings[directory] = listing
+        return directory, listing
+
+    def listing(self, directory):
+        """返回目录的 DirectoryListing（目录修改时间未变化时复用上次的列表），读取失败时返回 None"""
+        return self._list(directory)[1]
+
+    def walk(self, top, skip_dir=None):
+        """
+        并行遍历 top，返回与 os.walk(top) 顺序相同的 [(目录, 子目录名列表, 文件名列表)]。
+        skip_dir(子目录名) 返回 True 的子目录不列出也不进入。
+        """
+        listings = {}
+        prefix = f"{threading.current_thread().name}-walk"
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=prefix) as pool:
+            pending = {pool.submit(self._list, top)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, listing = future.result()
+                    if listing is None:
+                        continue
+                    listings[directory] = listing
+                    for name in listing.children:
+                        if skip_dir is None or not skip_dir(name):
+                            pending.add(pool.submit(self._list, os.path.join(directory, name)))
+
+        results = []
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            listing = listings.get(directory)
+            if listing is None:
+                continue
+            dirs = [name for name in listing.dirs if skip_dir is None or not skip_dir(name)]
+            results.append((directory, dirs, list(listing.files)))
+            stack.extend(os.path.join(directory, name) for name in reversed(listing.children)
+                         if skip_dir is None or not skip_dir(name))
+        logging.debug(f"已遍历 {top}：{len(results)} 个目录")
+        return results
+
+    def iter_files(self, top, suffix=None, skip_dir=None):
+        """按遍历顺序返回 top 下的文件路径，suffix 指定时只返回该后缀的文件"""
+        for root, _, files in self.walk(top, skip_dir=skip_dir):
+            for name in files:
+                if suffix is None or name.endswith(suffix):
+                    yield os.path.join(root, name)
+
+    # ---- NFO 缓存 ----
+
+    def _lookup(self, path, size, mtime_ns):
+        try:
+            with get_db_pool(self.db_path).connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT SIZE, MTIME_NS, DATA FROM NFO_CACHE WHERE PATH = ?", (path,))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            logging.debug(f"读取 NFO 缓存失败: {e}")
+            return None
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        try:
+            return json.loads(row[2])
+        except ValueError:
+            return None
+
+    def _remember(self, path, size, mtime_ns, record):
+        self._records[path] = (size, mtime_ns, record)
+        self._records.move_to_end(path)
+        while len(self._records) > MAX_MEMORY_ENTRIES:
+            self._records.popitem(last=False)
+
+    def nfo(self, path):
+        """返回 NFO 文件的解析结果（见 parse_nfo，调用方不应修改），文件不存在或无法读取时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        signature = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._records.get(path)
+            if cached is not None and cached[:2] == signature:
+                self._records.move_to_end(path)
+                return cached[2]
+
+        record = self._lookup(path, *signature)
+        if record is None:
+            try:
+                record = parse_nfo(path)
+            except OSError as e:
+                logging.warning(f"读取 NFO 文件失败: {path}, 错误: {e}")
+                return None
+            with self._lock:
+                self._pending.append((path, signature[0], signature[1], json.dumps(record, ensure_ascii=False),
+                                      time.time()))
+                flush = len(self._pending) >= FLUSH_EVERY
+            if flush:
+                self.flush()
+        with self._lock:
+            self._remember(path, signature[0], signature[1], record)
+        return record
+
+    def flush(self):
+        """将新解析的结果写入 NFO_CACHE 表"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            prune = not self._pruned
+            self._pruned = True
+        if not rows and not prune:
+            return
+        try:
+            with get_db_pool(self.db_path).connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO NFO_CACHE (PATH, SIZE, MTIME_NS, DATA, PARSED_AT) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                if prune:
+                    conn.execute("DELETE FROM NFO_CACHE WHERE PARSED_AT < ?", (time.time() - MAX_ENTRY_AGE,))
+        except sqlite3.Error as e:
+            logging.error(f"保存 NFO 缓存失败: {e}")
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_path=DB_PATH):
+    """获取进程级共享的目录册（按数据库路径区分）"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(db_path)
+        if catalog is None:
+            catalog = LibraryCatalog(db_path)
+            _catalogs[db_path] = catalog
+        return catalog
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from library_catalog import get_catalog, RACY_WINDOW_NS
+from pipeline import get_db_pool
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _settled(mtime, listed_at):
+    """修改时间早于列目录时间超过 RACY_WINDOW_NS 时，才能认为之后的变化会改变修改时间"""
+    return mtime is None or (listed_at is not None and listed_at - mtime > RACY_WINDOW_NS)
+
+
+def _listing_hash(files, dirs):
+    digest = hashlib.sha1()
+    for name in sorted(files):
+        digest.update(f"f\0{name}\0".encode('utf-8', 'surrogateescape'))
+    for name in sorted(dirs):
+        digest.update(f"d\0{name}\0".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+class LibrarySnapshot:
+    """
+    媒体库扫描的目录快照，保存在 SCAN_SNAPSHOT 表中。
+    每个目录记录修改时间、列目录时间、子项列表哈希、子目录、扫描时读取过的文件（NFO、季目录）的修改时间及扫描结果。
+    目录修改时间和依赖文件均未变化时直接复用上次的子目录和扫描结果，不再列目录和解析 NFO；
+    修改时间变化但子项列表哈希未变时同样复用结果。
+    修改时间与列目录时间过于接近时（修改时间精度较粗的网络挂载上，同一时刻的变化不会改变修改时间）不信任缓存，重新列目录。
+    检查修改时间和重新列目录通过共享目录册（见 library_catalog.get_catalog）并行进行，扫描结果仍按遍历顺序生成。
+    walk 期间结果发生变化或已删除的目录记录在 changes 中，供调用方只处理变化部分。
+    """
+    def __init__(self, db_path, kind):
+        self.db_path = db_path
+        self.kind = kind
+        self.changes = []  # (旧结果, 新结果)，新增目录旧结果为 None，删除目录新结果为 None
+        self._entries = {}
+        self._dirty = set()
+        self._removed = set()
+        self._load()
+
+    def _load(self):
+        try:
+            with get_db_pool(self.db_path).connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    '''SELECT PATH, MTIME_NS, LISTED_AT_NS, LISTING_HASH, CHILDREN, DEPENDENCIES, RESULT
+                       FROM SCAN_SNAPSHOT WHERE KIND = ?''',
+                    (self.kind,)
+                )
+                for path, mtime_ns, listed_at, listing_hash, children, dependencies, result in cursor.fetchall():
+                    self._entries[path] = {
+                        "mtime": mtime_ns,
+                        "listed_at": listed_at,
+                        "hash": listing_hash,
+                        "children": json.loads(children),
+                        "deps": json.loads(dependencies),
+                        "result": json.loads(result),
+                    }
+            logging.debug(f"已加载 {len(self._entries)} 条{self.kind}目录快照")
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"读取目录快照失败，将完整扫描: {e}")
+            self._entries = {}
+
+    def covers(self, root):
+        """root 是否已有快照（没有时调用方应做一次完整的数据库比对）"""
+        return os.path.abspath(root) in self._entries
+
+    @staticmethod
+    def _deps_unchanged(deps, listed_at):
+        return all(_mtime_ns(path) == mtime and _settled(mtime, listed_at) for path, mtime in deps.items())
+
+    def _probe(self, directory):
+        """
+        检查目录是否可直接复用快照，返回 (目录, 修改时间, 快照条目, 依赖是否未变化, 目录列表)。
+        可复用时目录列表为 None；目录不存在或读取失败时修改时间为 None。
+        """
+        entry = self._entries.get(directory)
+        mtime = _mtime_ns(directory)
+        if mtime is None:
+            return directory, None, entry, False, None
+        deps_unchanged = entry is not None and self._deps_unchanged(entry["deps"], entry["listed_at"])
+        if entry is not None and deps_unchanged and entry["mtime"] == mtime and _settled(mtime, entry["listed_at"]):
+            return directory, mtime, entry, True, None
+        listing = get_catalog().listing(directory)
+        if listing is None:
+            return directory, None, entry, False, None
+        return directory, listing.mtime, entry, deps_unchanged, listing
+
+    def walk(self, root, scan_directory):
+        """
+        按 os.walk 的顺序遍历 root，返回各目录的扫描结果列表。
+        scan_directory(目录, 子目录名列表, 文件名列表) 返回 (可 JSON 序列化的结果, 读取过的路径列表)。
+        """
+        root = os.path.abspath(root)
+        catalog = get_catalog()
+        probes = {}
+        prefix = f"{threading.current_thread().name}-snapshot"
+        with ThreadPoolExecutor(max_workers=catalog.workers, thread_name_prefix=prefix) as pool:
+            pending = {pool.submit(self._probe, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, mtime, entry, deps_unchanged, listing = future.result()
+                    if mtime is None:
+                        continue
+                    probes[directory] = (mtime, entry, deps_unchanged, listing)
+                    children = entry["children"] if listing is None else listing.children
+                    for name in children:
+                        child = os.path.join(directory, name)
+                        if child not in probes:
+                            pending.add(pool.submit(self._probe, child))
+
+        results = []
+        seen = set()
+        stack = [root]
+        reused = 0
+        changes_before = len(self.changes)
+        while stack:
+            directory = stack.pop()
+            if directory in seen or directory not in probes:
+                continue
+            seen.add(directory)
+            mtime, entry, deps_unchanged, listing = probes[directory]
+            if listing is None:
+                reused += 1
+            else:
+                listing_hash = _listing_hash(listing.files, listing.dirs)
+                if entry is not None and entry["hash"] == listing_hash and deps_unchanged:
+                    entry["mtime"] = mtime
+                    entry["listed_at"] = listing.listed_at
+                    entry["children"] = list(listing.children)
+                    reused += 1
+                else:
+                    result, dependencies = scan_directory(directory, list(listing.dirs), list(listing.files))
+                    result = json.loads(json.dumps(result))
+                    if entry is None or entry["result"] != result:
+                        self.changes.append((entry["result"] if entry else None, result))
+                    entry = {
+                        "mtime": mtime,
+                        "listed_at": listing.listed_at,
+                        "hash": listing_hash,
+                        "children": list(listing.children),
+                        "deps": {path: _mtime_ns(path) for path in dependencies},
+                        "result": result,
+                    }
+                    self._entries[directory] = entry
+                self._dirty.add(directory)
+            results.append(entry["result"])
+            stack.extend(os.path.join(directory, name) for name in reversed(entry["children"]))
+
+        prefix = root + os.sep
+        for path in [p for p in self._entries if (p == root or p.startswith(prefix)) and p not in seen]:
+            self.changes.append((self._entries.pop(path)["result"], None))
+            self._dirty.discard(path)
+            self._removed.add(path)
+        logging.info(f"已扫描 {root}：{len(seen)} 个目录，其中 {reused} 个未变化，{len(self.changes) - changes_before} 处变化")
+        return results
+
+    def save(self):
+        """写入本次扫描更新和删除的目录快照"""
+        if not self._dirty and not self._removed:
+            return
+        now = time.time()
+        rows = [
+            (self.kind, path, entry["mtime"], entry["listed_at"], entry["hash"],
+             json.dumps(entry["children"], ensure_ascii=False),
+             json.dumps(entry["deps"], ensure_ascii=False), json.dumps(entry["result"], ensure_ascii=False), now)
+            for path, entry in ((path, self._entries[path]) for path in self._dirty)
+        ]
+        try:
+            with get_db_pool(self.db_path).connection() as conn:
+                conn.executemany(
+                    "DELETE FROM SCAN_SNAPSHOT WHERE KIND = ? AND PATH = ?",
+                    [(self.kind, path) for path in self._removed]
+                )
+                conn.executemany(
+                    '''INSERT OR REPLACE INTO SCAN_SNAPSHOT
+                       (KIND, PATH, MTIME_NS, LISTED_AT_NS, LISTING_HASH, CHILDREN, DEPENDENCIES, RESULT, SCANNED_AT)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    rows
+                )
+            self._dirty.clear()
+            self._removed.clear()
+        except sqlite3.Error as e:
+            logging.error(f"保存目录快照失败: {e}")
@@ -8,6 +8,9 @@ import signal
 import sqlite3
 import psutil
 import threading
+from pipeline import Stage, PipelineRunner
+import trigger_bus
+import webdriver_pool
 
 # 配置日志
 logging.basicConfig(
@@ -19,30 +22,38 @@ logging.basicConfig(
     ]
 )
 
-def get_run_interval_from_db():
+# 触发事件轮询间隔（秒）
+TRIGGER_POLL_SECONDS = 15
+
+# 触发事件 -> (需要执行的阶段, 是否只处理事件中的标题)
+TRIGGER_STAGES = {
+    trigger_bus.EVENT_SUBSCRIPTION_ADDED: (['indexer', 'downloader'], True),
+    trigger_bus.EVENT_DOUBAN_UPDATED: (['check_subscr', 'indexer', 'downloader'], True),
+    trigger_bus.EVENT_TRANSFER_COMPLETED: (['dateadded', 'actor_nfo', 'episodes_nfo', 'auto_delete_tasks'], False),
+}
+
+def get_int_config_from_db(option, default):
     try:
         conn = sqlite3.connect('/config/data.db')
         cursor = conn.cursor()
-        cursor.execute("SELECT VALUE FROM CONFIG WHERE OPTION = 'run_interval_hours';")
+        cursor.execute("SELECT VALUE FROM CONFIG WHERE OPTION = ?;", (option,))
         result = cursor.fetchone()
         cursor.close()
         conn.close()
         if result:
             return int(result[0])
         else:
-            logging.warning("未找到 run_interval_hours 配置项，使用默认值 6 小时。")
-            return 6
+            logging.warning(f"未找到 {option} 配置项，使用默认值 {default}。")
+            return default
     except Exception as e:
-        logging.error(f"无法从数据库读取 run_interval_hours: {e}，使用默认值 6 小时。")
-        return 6
+        logging.error(f"无法从数据库读取 {option}: {e}，使用默认值 {default}。")
+        return default
 
-def run_script(script_name):
-    try:
-        result = subprocess.run(['python', script_name], check=True)
-        logging.debug(f"{script_name} 已执行完毕。")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"{script_name} 执行失败，退出程序。错误信息: {e}")
-        sys.exit(0)
+def get_run_interval_from_db():
+    return get_int_config_from_db('run_interval_hours', 6)
+
+def get_douban_poll_minutes_from_db():
+    return get_int_config_from_db('douban_poll_minutes', 30)
 
 def start_app():
     try:
@@ -102,11 +113,17 @@ def report_versions():
         sys.exit(0)
 
 def monitor_chrome_process():
+    # 常驻浏览器由浏览器池按空闲时间和最长存活时间回收
+    webdriver_pool.reap_idle()
+    pooled_pids = webdriver_pool.pooled_pids()
+
     chrome_started_time = None
     chromedriver_started_time = None
 
     for proc in psutil.process_iter(['pid', 'name', 'create_time']):
         try:
+            if proc.info['pid'] in pooled_pids:
+                continue
             process_name = proc.info['name'].lower()
             create_time = proc.info['create_time']
 
@@ -127,6 +144,8 @@ def monitor_chrome_process():
                 logging.warning(f"{log_prefix} 进程已运行超过 {threshold_seconds // 60} 分钟，判定为异常，正在终止。")
                 for proc in psutil.process_iter(['pid', 'name']):
                     try:
+                        if proc.info['pid'] in pooled_pids:
+                            continue
                         if process_name_filter in proc.info['name'].lower():
                             p = psutil.Process(proc.info['pid'])
                             p.terminate()
@@ -171,7 +190,7 @@ def start_chrome_monitor():
     thread.start()
     logging.info("Chrome 进程监控已启动")
 
-def check_site_status_and_save():
+def check_site_status_and_save(config=None):
     """检查站点状态并保存到文件"""
     try:
         # 导入站点测试模块
@@ -225,6 +244,9 @@ def shutdown_handler(signum, frame):
         except ProcessLookupError:
             logging.warning(f"进程 {sync_pid} 不存在，跳过终止操作。")
 
+    # 关闭未被租用的常驻浏览器
+    webdriver_pool.reap_idle(idle_timeout=0)
+
     time.sleep(5)
     logging.info("程序已关闭。")
     sys.exit(0)
@@ -232,90 +254,105 @@ def shutdown_handler(signum, frame):
 signal.signal(signal.SIGTERM, shutdown_handler)
 signal.signal(signal.SIGINT, shutdown_handler)
 
+def start_xunlei_torrent_once(config=None):
+    """首轮下载完成后启动迅雷-种子监听服务，之后的轮次不再重复启动"""
+    global xunlei_started
+    if not xunlei_started:
+        start_xunlei_torrent()
+        xunlei_started = True
+
+def build_stages():
+    """主循环各阶段，在同一进程内按依赖关系调度执行"""
+    # inputs / outputs 声明各阶段读写的数据，调度器据此推导依赖并并行执行互不相关的阶段：
+    #   library      媒体库表 LIB_MOVIES / LIB_TVS / LIB_TV_SEASONS
+    #   library_tmdb 媒体库表中的 TMDB_ID 字段
+    #   nfo          媒体目录中的 .nfo 文件
+    #   douban       豆瓣订阅表 RSS_MOVIES / RSS_TVS
+    #   subscription 缺失订阅表 MISS_MOVIES / MISS_TVS
+    #   index        资源索引结果
+    #   torrent      种子目录与下载器任务
+    return [
+        Stage('site_status', check_site_status_and_save, "站点状态检测", outputs={'site_status'}),
+        Stage('scan_media', 'scan_media', "扫描媒体库", inputs={'nfo'}, outputs={'library'}),
+        Stage('subscr', 'subscr', "获取最新豆瓣订阅", outputs={'douban'}),
+        Stage('check_subscr', 'check_subscr', "检查是否有新增订阅",
+              inputs={'library', 'douban'}, outputs={'subscription'}),
+        Stage('indexer', 'indexer', "建立订阅资源索引", inputs={'subscription'}, outputs={'index'},
+              title_scoped=True),
+        Stage('downloader', 'downloader', "下载订阅媒体资源",
+              inputs={'subscription', 'index'}, outputs={'subscription', 'torrent'}, title_scoped=True),
+        Stage('xunlei_torrent', start_xunlei_torrent_once, "启动迅雷-种子监听服务", inputs={'torrent'}),
+        Stage('tmdb_id', 'tmdb_id', "更新数据库TMDB_ID", inputs={'library', 'nfo'}, outputs={'library_tmdb'}),
+        Stage('dateadded', 'dateadded', "更新媒体NFO文件添加日期", outputs={'nfo'}),
+        Stage('actor_nfo', 'actor_nfo', "更新演职人员中文信息", outputs={'nfo'}),
+        Stage('episodes_nfo', 'episodes_nfo', "更新集演职人员中文信息", outputs={'nfo'}),
+        Stage('auto_delete_tasks', 'auto_delete_tasks', "自动删除已完成做种任务", outputs={'torrent'}),
+    ]
+
+def plan_triggered_run(events):
+    """
+    将待处理事件合并为一次执行计划，返回 (阶段名称集合, 标题集合)。
+    标题集合为 None 表示按标题执行的阶段需要处理全部订阅。
+    """
+    stage_names = set()
+    titles = set()
+    unscoped = False
+    for event, event_titles in events.items():
+        if event not in TRIGGER_STAGES:
+            logging.warning(f"忽略未知的触发事件: {event}")
+            continue
+        event_stages, title_scoped = TRIGGER_STAGES[event]
+        stage_names.update(event_stages)
+        if not title_scoped:
+            continue
+        if None in event_titles:
+            unscoped = True
+        titles.update(t for t in event_titles if t)
+    return stage_names, (None if unscoped or not titles else titles)
+
+def run_triggered_stages(runner):
+    """取出触发事件并执行受影响的阶段"""
+    events = trigger_bus.consume()
+    if not events:
+        return
+    stage_names, titles = plan_triggered_run(events)
+    if not stage_names:
+        return
+    logging.info(f"收到触发事件 {', '.join(sorted(events))}，执行阶段: {', '.join(sorted(stage_names))}")
+    runner.run_stages(stage_names, titles)
+
 def main():
     global app_pid, sync_pid, running, xunlei_started
 
     run_interval_hours = get_run_interval_from_db()
     run_interval_seconds = run_interval_hours * 3600
+    douban_poll_seconds = get_douban_poll_minutes_from_db() * 60
 
     app_pid = start_app()
     sync_pid = start_sync()
     start_chrome_monitor()  # 启动 Chrome 监控线程
 
+    runner = PipelineRunner(build_stages(), should_continue=lambda: running)
+    douban_poll_stage = Stage('douban_poll', 'subscr', "轮询豆瓣想看", entry='poll')
+
+    # 全量流程作为低频兜底；期间按触发事件只执行受影响的阶段
+    next_sweep = 0
+    next_douban_poll = 0
     while running:
-        # 在主循环中定期执行站点状态检测
-        check_site_status_and_save()
-        logging.info("-" * 80)
-        logging.info("站点状态检测：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('scan_media.py')
-        logging.info("-" * 80)
-        logging.info("扫描媒体库：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('subscr.py')
-        logging.info("-" * 80)
-        logging.info("获取最新豆瓣订阅：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('check_subscr.py')
-        logging.info("-" * 80)
-        logging.info("检查是否有新增订阅：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('indexer.py')
-        logging.info("-" * 80)
-        logging.info("建立订阅资源索引：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('downloader.py')
-        logging.info("-" * 80)
-        logging.info("下载订阅媒体资源：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        if not xunlei_started:
-            start_xunlei_torrent()
-            xunlei_started = True
-
-        run_script('tmdb_id.py')
-        logging.info("-" * 80)
-        logging.info("更新数据库TMDB_ID：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('dateadded.py')
-        logging.info("-" * 80)
-        logging.info("更新媒体NFO文件添加日期：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('actor_nfo.py')
-        logging.info("-" * 80)
-        logging.info("更新演职人员中文信息：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('episodes_nfo.py')
-        logging.info("-" * 80)
-        logging.info("更新集演职人员中文信息：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        run_script('auto_delete_tasks.py')
-        logging.info("-" * 80)
-        logging.info("自动删除已完成做种任务：已执行完毕，等待5秒...")
-        logging.info("-" * 80)
-        time.sleep(5)
-
-        logging.info(f"所有任务已完成，等待 {run_interval_hours} 小时后再次运行...")
-        time.sleep(run_interval_seconds)
+        now = time.time()
+        if now >= next_sweep:
+            runner.run_cycle()
+            next_sweep = time.time() + run_interval_seconds
+            next_douban_poll = time.time() + douban_poll_seconds
+            logging.info(f"所有任务已完成，{run_interval_hours} 小时后再次执行全量流程，期间按触发事件执行受影响的任务...")
+        elif douban_poll_seconds > 0 and now >= next_douban_poll:
+            runner.refresh_config()
+            runner.run_stage(douban_poll_stage)
+            next_douban_poll = time.time() + douban_poll_seconds
+
+        if running:
+            run_triggered_stages(runner)
+        time.sleep(TRIGGER_POLL_SECONDS)
 
 if __name__ == "__main__":
     start_check_db_dir()
@@ -0,0 +1,141 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+from file_transfer import is_partial_name
+
+# 缓存的目录数上限，超出时淘汰最久未使用的目录
+MAX_DIRECTORIES = 512
+
+EPISODE_PATTERN = re.compile(r'(S\d{1,2}E\d{1,2})', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'[\. _\-]?(?:19|20)\d{2}[\. _\-]?')
+RESOLUTION_PATTERN = re.compile(r'[\. _\-]?\d{3,4}[ip][\. _\-]?')
+TECH_PATTERN = re.compile(r'[\. _\-]?(?:web-dl|webdl|webrip|bluray|brrip|hdtv|hdr|hevc|h264|h265)[\. _\-]?', re.IGNORECASE)
+FPS_PATTERN = re.compile(r'[\. _\-]?\d{1,2}fps[\. _\-]?', re.IGNORECASE)
+AUDIO_PATTERN = re.compile(r'[\. _\-]?(?:aac|ac3|ddp|dts)[\. _\-]?', re.IGNORECASE)
+SEPARATOR_PATTERN = re.compile(r'[\. _\-]+')
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def media_content_keys(filename):
+    """
+    提取文件名的内容标识 (剧集标识, 电影标题, 中文标题)。
+    剧集标识为大写的 SxxExx，电影标题去除了年份、分辨率、编码、帧率、音频等信息。
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    episode_match = EPISODE_PATTERN.search(name)
+    episode = episode_match.group(1).upper() if episode_match else None
+
+    title = YEAR_PATTERN.sub(' ', name)
+    title = RESOLUTION_PATTERN.sub(' ', title)
+    title = TECH_PATTERN.sub(' ', title)
+    title = FPS_PATTERN.sub(' ', title)
+    title = AUDIO_PATTERN.sub(' ', title)
+    title = SEPARATOR_PATTERN.sub(' ', title).strip().lower()
+
+    chinese = ''.join(CHINESE_PATTERN.findall(name))
+    return episode, title, chinese
+
+
+def same_media_content(keys1, keys2):
+    """根据内容标识判断是否为同一媒体内容"""
+    episode1, title1, chinese1 = keys1
+    episode2, title2, chinese2 = keys2
+    if episode1 and episode2:
+        return episode1 == episode2
+    # 电影：标题相同或互相包含，或中文部分相同
+    if title1 == title2 or title1 in title2 or title2 in title1:
+        return True
+    return bool(chinese1 and chinese2) and chinese1 == chinese2
+
+
+class DirectoryContentIndex:
+    """
+    目标目录的内容索引：目录 -> {文件名: 内容标识}，剧集另按 SxxExx 建立索引。
+    NFO 和复制/下载中的临时文件（隐藏文件、.part 文件）不计入索引。
+    本程序写入或删除文件时同步更新索引，目录修改时间变化（外部修改）时重建。
+    """
+    def __init__(self, max_directories=MAX_DIRECTORIES):
+        self.max_directories = max_directories
+        self._dirs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _dir_mtime(directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _build(self, directory):
+        files, episodes = {}, {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.nfo') or is_partial_name(entry.name) or not entry.is_file():
+                        continue
+                    keys = media_content_keys(entry.name)
+                    files[entry.name] = keys
+                    if keys[0]:
+                        episodes.setdefault(keys[0], []).append(entry.name)
+        except OSError as e:
+            logging.debug(f"读取目录失败: {directory}, 错误: {e}")
+        logging.debug(f"已建立目录内容索引: {directory}，共 {len(files)} 个文件")
+        return {"mtime": self._dir_mtime(directory), "files": files, "episodes": episodes}
+
+    def _entry(self, directory):
+        mtime = self._dir_mtime(directory)
+        entry = self._dirs.get(directory)
+        if entry is None or entry["mtime"] != mtime:
+            entry = self._build(directory)
+            self._dirs[directory] = entry
+            while len(self._dirs) > self.max_directories:
+                self._dirs.popitem(last=False)
+        self._dirs.move_to_end(directory)
+        return entry
+
+    def find_same_content(self, directory, src):
+        """在 directory 中查找与 src 内容相同的文件，返回完整路径或 None"""
+        directory = os.path.abspath(directory)
+        keys = media_content_keys(src)
+        with self._lock:
+            entry = self._entry(directory)
+            if keys[0]:
+                names = entry["episodes"].get(keys[0])
+                if names:
+                    return os.path.join(directory, names[0])
+                candidates = ((name, k) for name, k in entry["files"].items() if not k[0])
+            else:
+                candidates = entry["files"].items()
+            for name, existing_keys in candidates:
+                if same_media_content(keys, existing_keys):
+                    return os.path.join(directory, name)
+        return None
+
+    def _update(self, path, present):
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            entry = self._dirs.get(directory)
+            if entry is None:
+                return
+            keys = entry["files"].pop(name, None)
+            if keys and keys[0]:
+                names = entry["episodes"].get(keys[0], [])
+                if name in names:
+                    names.remove(name)
+            if present and not name.endswith('.nfo') and not is_partial_name(name):
+                keys = media_content_keys(name)
+                entry["files"][name] = keys
+                if keys[0]:
+                    entry["episodes"].setdefault(keys[0], []).append(name)
+            entry["mtime"] = self._dir_mtime(directory)
+
+    def add(self, path):
+        """记录本程序写入的文件"""
+        self._update(path, True)
+
+    def discard(self, path):
+        """记录本程序删除或移走的文件"""
+        self._update(path, False)
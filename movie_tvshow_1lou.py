@@ -1,10 +1,8 @@
 import argparse
-import json
 import logging
 import os
 import re
 import sqlite3
-import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote, quote_plus, urljoin
@@ -12,6 +10,10 @@ from urllib.parse import quote, quote_plus, urljoin
 import requests
 from bs4 import BeautifulSoup
 
+from trigger_bus import filter_scoped_rows
+from result_store import save_results
+from http_engine import PoliteSession, run_concurrently
+
 
 DEFAULT_BASE_URL = "https://www.1lou.me/"
 
@@ -49,7 +51,7 @@ class OneLouIndexer:
         self.config: Dict[str, str] = {}
         self.base_url = DEFAULT_BASE_URL
 
-        self.session = requests.Session()
+        self.session = PoliteSession()
         self.session.trust_env = False
         self.session.headers.update(
             {
@@ -89,7 +91,7 @@ class OneLouIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year FROM MISS_MOVIES")
-                for title, year in cursor.fetchall():
+                for title, year in filter_scoped_rows(cursor.fetchall()):
                     items.append({"标题": str(title), "年份": str(year) if year is not None else ""})
         except Exception as e:
             logging.error(f"提取电影信息时发生错误: {e}")
@@ -101,7 +103,7 @@ class OneLouIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year, season, missing_episodes FROM MISS_TVS")
-                for title, year, season, missing_episodes in cursor.fetchall():
+                for title, year, season, missing_episodes in filter_scoped_rows(cursor.fetchall()):
                     year_str = str(year) if year is not None else ""
                     season_str = str(season) if season is not None else ""
                     missing_list = (
@@ -395,6 +397,22 @@ class OneLouIndexer:
 
         return dedup_resources
 
+    def _parse_candidates(self, candidates: List[SearchHit], kind: str) -> List[Dict[str, Any]]:
+        """并发解析候选帖子，结果按候选顺序合并"""
+        def parse(item: Tuple[int, SearchHit]) -> List[Dict[str, Any]]:
+            idx, h = item
+            try:
+                logging.info(f"1LOU {kind}候选({idx}/{len(candidates)}): {h.title[:80]} => {h.url}")
+                return self.parse_subject_resources(h.url)
+            except Exception as e:
+                logging.warning(f"1LOU 解析帖子资源失败: {h.url} | {e}")
+                return []
+
+        resources: List[Dict[str, Any]] = []
+        for parsed in run_concurrently(parse, list(enumerate(candidates, start=1)), thread_name_prefix="subject"):
+            resources.extend(parsed or [])
+        return resources
+
     def _categorize_movie(self, resources: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         preferred = self.config.get("preferred_resolution", "未知分辨率")
         fallback = self.config.get("fallback_resolution", "未知分辨率")
@@ -436,17 +454,10 @@ class OneLouIndexer:
 
         return categorized
 
-    def save_results_to_json(self, title: str, year: str, site_suffix: str, data: Any, season: Optional[str] = None) -> str:
-        if season:
-            file_name = f"{title}-S{season}-{year}-{site_suffix}.json"
-        else:
-            file_name = f"{title}-{year}-{site_suffix}.json"
-
-        file_path = os.path.join("/tmp/index", file_name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return file_path
+    def save_index_results(self, title: str, year: str, site_suffix: str, data: Any, season: Optional[str] = None) -> str:
+        count = save_results(title, year, site_suffix, data, season=season, db_path=self.db_path)
+        label = f"{title}-S{season}-{year}-{site_suffix}" if season else f"{title}-{year}-{site_suffix}"
+        return f"{label}（{count} 条）"
 
     def index_movie(self, title: str, year: str) -> None:
         empty = {"首选分辨率": [], "备选分辨率": [], "其他分辨率": []}
@@ -454,7 +465,7 @@ class OneLouIndexer:
             hits, final_url = self.search(title)
             if not hits and not final_url:
                 logging.info(f"未找到匹配结果: {title} ({year})")
-                self.save_results_to_json(title, year, "1LOU", empty)
+                self.save_index_results(title, year, "1LOU", empty)
                 return
 
             max_hits = int(self.config.get("1lou_max_hits", "8") or "8")
@@ -462,22 +473,15 @@ class OneLouIndexer:
             if not candidates and final_url:
                 candidates = [SearchHit(title=title, url=final_url, year=None)]
 
-            resources: List[Dict[str, Any]] = []
-            for idx, h in enumerate(candidates, start=1):
-                try:
-                    logging.info(f"1LOU 电影候选({idx}/{len(candidates)}): {h.title[:80]} => {h.url}")
-                    resources.extend(self.parse_subject_resources(h.url))
-                except Exception as e:
-                    logging.warning(f"1LOU 解析帖子资源失败: {h.url} | {e}")
-                    continue
+            resources = self._parse_candidates(candidates, "电影")
 
             resources = self._filter_exclude_keywords(resources)
             categorized = self._categorize_movie(resources)
-            path = self.save_results_to_json(title, year, "1LOU", categorized)
+            path = self.save_index_results(title, year, "1LOU", categorized)
             logging.info(f"已写入索引: {path}")
         except Exception as e:
             logging.error(f"1LOU 索引电影失败: {title} ({year})，错误: {e}")
-            path = self.save_results_to_json(title, year, "1LOU", empty)
+            path = self.save_index_results(title, year, "1LOU", empty)
             logging.info(f"已写入空索引: {path}")
 
     def index_tv(self, title: str, year: str, season: Optional[str] = None) -> None:
@@ -491,7 +495,7 @@ class OneLouIndexer:
             hits, final_url = self.search(title)
             if not hits and not final_url:
                 logging.info(f"未找到匹配结果: {title} ({year})")
-                self.save_results_to_json(title, year, "1LOU", empty, season=season_for_file)
+                self.save_index_results(title, year, "1LOU", empty, season=season_for_file)
                 return
 
             max_hits = int(self.config.get("1lou_max_hits", "8") or "8")
@@ -499,22 +503,15 @@ class OneLouIndexer:
             if not candidates and final_url:
                 candidates = [SearchHit(title=title, url=final_url, year=None)]
 
-            resources: List[Dict[str, Any]] = []
-            for idx, h in enumerate(candidates, start=1):
-                try:
-                    logging.info(f"1LOU 剧集候选({idx}/{len(candidates)}): {h.title[:80]} => {h.url}")
-                    resources.extend(self.parse_subject_resources(h.url))
-                except Exception as e:
-                    logging.warning(f"1LOU 解析帖子资源失败: {h.url} | {e}")
-                    continue
+            resources = self._parse_candidates(candidates, "剧集")
 
             resources = self._filter_exclude_keywords(resources)
             categorized = self._categorize_tv(resources)
-            path = self.save_results_to_json(title, year, "1LOU", categorized, season=season_for_file)
+            path = self.save_index_results(title, year, "1LOU", categorized, season=season_for_file)
             logging.info(f"已写入索引: {path}")
         except Exception as e:
             logging.error(f"1LOU 索引剧集失败: {title} ({year})，错误: {e}")
-            path = self.save_results_to_json(title, year, "1LOU", empty, season=season_for_file)
+            path = self.save_index_results(title, year, "1LOU", empty, season=season_for_file)
             logging.info(f"已写入空索引: {path}")
 
 
@@ -547,21 +544,14 @@ def main() -> None:
             indexer.index_tv(args.title, str(args.year), season=str(args.season) if args.season else None)
         return
 
+    # 多个标题并发索引，同站点的请求并发数和速率由会话统一限制
     movies = indexer.extract_movie_info()
-    for m in movies:
-        try:
-            indexer.index_movie(m["标题"], m["年份"])
-            time.sleep(1)
-        except Exception as e:
-            logging.error(f"索引电影失败 {m}: {e}")
+    run_concurrently(lambda m: indexer.index_movie(m["标题"], m["年份"]), movies, thread_name_prefix="movie")
 
     tvs = indexer.extract_tv_info()
-    for t in tvs:
-        try:
-            indexer.index_tv(t["剧集"], t["年份"], season=t.get("季") or None)
-            time.sleep(1)
-        except Exception as e:
-            logging.error(f"索引剧集失败 {t}: {e}")
+    run_concurrently(
+        lambda t: indexer.index_tv(t["剧集"], t["年份"], season=t.get("季") or None), tvs, thread_name_prefix="tv"
+    )
 
 
 if __name__ == "__main__":
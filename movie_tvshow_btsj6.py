@@ -4,7 +4,6 @@ import logging
 import os
 import re
 import sqlite3
-import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote_plus, urljoin
@@ -12,6 +11,10 @@ from urllib.parse import quote_plus, urljoin
 import requests
 from bs4 import BeautifulSoup
 
+from trigger_bus import filter_scoped_rows
+from result_store import save_results
+from http_engine import PoliteSession, run_concurrently
+
 
 DEFAULT_BASE_URL = "https://www.btsj6.com/"
 
@@ -49,7 +52,7 @@ class BTSJ6Indexer:
         self.config: Dict[str, str] = {}
         self.base_url = DEFAULT_BASE_URL
 
-        self.session = requests.Session()
+        self.session = PoliteSession()
         # Avoid inheriting potentially broken system/env proxy settings (common on Windows).
         self.session.trust_env = False
         self.session.headers.update(
@@ -90,7 +93,7 @@ class BTSJ6Indexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year FROM MISS_MOVIES")
-                for title, year in cursor.fetchall():
+                for title, year in filter_scoped_rows(cursor.fetchall()):
                     items.append({"标题": str(title), "年份": str(year) if year is not None else ""})
         except Exception as e:
             logging.error(f"提取电影信息时发生错误: {e}")
@@ -102,7 +105,7 @@ class BTSJ6Indexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year, season, missing_episodes FROM MISS_TVS")
-                for title, year, season, missing_episodes in cursor.fetchall():
+                for title, year, season, missing_episodes in filter_scoped_rows(cursor.fetchall()):
                     year_str = str(year) if year is not None else ""
                     season_str = str(season) if season is not None else ""
                     missing_list = (
@@ -294,20 +297,24 @@ class BTSJ6Indexer:
             # 有些页面可能结构略有差异，兜底
             anchors = soup.select("a.download-link")
 
-        resources: List[Dict[str, Any]] = []
+        downloads: List[Tuple[str, str]] = []
         for a in anchors:
             href = a.get("href")
             if not href:
                 continue
+            downloads.append((urljoin(self.base_url, href), a.get_text(" ", strip=True) or a.get("title") or ""))
 
-            down_url = urljoin(self.base_url, href)
-            text = a.get_text(" ", strip=True) or a.get("title") or ""
+        # 各下载入口的 magnet 并发解析（同站点并发数和请求速率由会话限制）
+        magnets = run_concurrently(
+            lambda d: self.resolve_magnet(d[0], subject_url), downloads, thread_name_prefix="magnet"
+        )
 
+        resources: List[Dict[str, Any]] = []
+        for (down_url, text), magnet in zip(downloads, magnets):
             resolution = self._extract_resolution(text)
             size = self._extract_size(text)
             audio_tracks, subtitles = self._extract_subtitles_audio(text)
 
-            magnet = self.resolve_magnet(down_url, subject_url)
             link = magnet or down_url
 
             resources.append(
@@ -395,17 +402,10 @@ class BTSJ6Indexer:
 
         return categorized
 
-    def save_results_to_json(self, title: str, year: str, site_suffix: str, data: Any, season: Optional[str] = None) -> str:
-        if season:
-            file_name = f"{title}-S{season}-{year}-{site_suffix}.json"
-        else:
-            file_name = f"{title}-{year}-{site_suffix}.json"
-
-        file_path = os.path.join("/tmp/index", file_name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return file_path
+    def save_index_results(self, title: str, year: str, site_suffix: str, data: Any, season: Optional[str] = None) -> str:
+        count = save_results(title, year, site_suffix, data, season=season, db_path=self.db_path)
+        label = f"{title}-S{season}-{year}-{site_suffix}" if season else f"{title}-{year}-{site_suffix}"
+        return f"{label}（{count} 条）"
 
     def index_movie(self, title: str, year: str) -> None:
         empty = {"首选分辨率": [], "备选分辨率": [], "其他分辨率": []}
@@ -423,18 +423,18 @@ class BTSJ6Indexer:
 
             if not subject_url:
                 logging.info(f"未找到匹配结果: {title} ({year})")
-                self.save_results_to_json(title, year, "BTSJ6", empty)
+                self.save_index_results(title, year, "BTSJ6", empty)
                 return
 
             logging.info(f"BTSJ6 电影匹配: {title} ({year}) => {subject_url}")
             resources = self.parse_subject_resources(subject_url)
             resources = self._filter_exclude_keywords(resources)
             categorized = self._categorize_movie(resources)
-            path = self.save_results_to_json(title, year, "BTSJ6", categorized)
+            path = self.save_index_results(title, year, "BTSJ6", categorized)
             logging.info(f"已写入索引: {path}")
         except Exception as e:
             logging.error(f"BTSJ6 索引电影失败: {title} ({year})，错误: {e}")
-            path = self.save_results_to_json(title, year, "BTSJ6", empty)
+            path = self.save_index_results(title, year, "BTSJ6", empty)
             logging.info(f"已写入空索引: {path}")
 
     def index_tv(self, title: str, year: str, season: Optional[str] = None) -> None:
@@ -454,18 +454,18 @@ class BTSJ6Indexer:
 
             if not subject_url:
                 logging.info(f"未找到匹配结果: {title} ({year})")
-                self.save_results_to_json(title, year, "BTSJ6", empty, season=season)
+                self.save_index_results(title, year, "BTSJ6", empty, season=season)
                 return
 
             logging.info(f"BTSJ6 剧集匹配: {title} ({year}) => {subject_url}")
             resources = self.parse_subject_resources(subject_url)
             resources = self._filter_exclude_keywords(resources)
             categorized = self._categorize_tv(resources)
-            path = self.save_results_to_json(title, year, "BTSJ6", categorized, season=season)
+            path = self.save_index_results(title, year, "BTSJ6", categorized, season=season)
             logging.info(f"已写入索引: {path}")
         except Exception as e:
             logging.error(f"BTSJ6 索引剧集失败: {title} ({year})，错误: {e}")
-            path = self.save_results_to_json(title, year, "BTSJ6", empty, season=season)
+            path = self.save_index_results(title, year, "BTSJ6", empty, season=season)
             logging.info(f"已写入空索引: {path}")
 
 
@@ -500,21 +500,14 @@ def main() -> None:
         return
 
     # 自动模式：读取订阅缺失表
+    # 多个标题并发索引，同站点的请求并发数和速率由会话统一限制
     movies = indexer.extract_movie_info()
-    for m in movies:
-        try:
-            indexer.index_movie(m["标题"], m["年份"])
-            time.sleep(1)
-        except Exception as e:
-            logging.error(f"索引电影失败 {m}: {e}")
+    run_concurrently(lambda m: indexer.index_movie(m["标题"], m["年份"]), movies, thread_name_prefix="movie")
 
     tvs = indexer.extract_tv_info()
-    for t in tvs:
-        try:
-            indexer.index_tv(t["剧集"], t["年份"], season=t.get("季") or None)
-            time.sleep(1)
-        except Exception as e:
-            logging.error(f"索引剧集失败 {t}: {e}")
+    run_concurrently(
+        lambda t: indexer.index_tv(t["剧集"], t["年份"], season=t.get("季") or None), tvs, thread_name_prefix="tv"
+    )
 
 
 if __name__ == "__main__":
@@ -18,6 +18,9 @@ from urllib.parse import quote
 
 # 导入 CaptchaHandler 类
 from captcha_handler import CaptchaHandler
+from trigger_bus import filter_scoped_rows
+from result_store import save_results
+from webdriver_pool import lease_driver
 from pathlib import Path
 import shutil
 
@@ -56,6 +59,11 @@ class MediaIndexer:
         if hasattr(self, 'driver') and self.driver is not None:
             logging.info("WebDriver已经初始化，无需重复初始化")
             return
+        # 优先租用站点常驻浏览器，复用已登录的会话；浏览器池不可用时再独立启动
+        self.driver = lease_driver("gy", self.config, download_dir="/Torrent")
+        if self.driver is not None:
+            logging.info("WebDriver初始化完成（常驻浏览器）")
+            return
         options = Options()
         options.add_argument('--headless=new')  # 使用新版无头模式
         options.add_argument('--no-sandbox')
@@ -316,7 +324,7 @@ class MediaIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT title, year FROM MISS_MOVIES')
-                movies = cursor.fetchall()
+                movies = filter_scoped_rows(cursor.fetchall())
                 for title, year in movies:
                     all_movie_info.append({
                         "标题": title,
@@ -337,7 +345,7 @@ class MediaIndexer:
             
             # 读取订阅的电视节目信息和缺失的集数信息
             cursor.execute('SELECT title, year, season, missing_episodes FROM MISS_TVS')
-            tvs = cursor.fetchall()
+            tvs = filter_scoped_rows(cursor.fetchall())
             
             for title, year, season, missing_episodes in tvs:
                 # 确保 year 和 season 是字符串类型
@@ -590,9 +598,9 @@ class MediaIndexer:
 
                             logging.info(f"过滤后剩余 {len(filtered_resources)} 个资源项")
 
-                            # 保存结果到 JSON 文件
+                            # 保存结果到索引结果库
                             logging.debug(f"分类结果: {categorized_results}")
-                            self.save_results_to_json(
+                            self.save_index_results(
                                 title=item['标题'],
                                 year=item['年份'],
                                 categorized_results=categorized_results
@@ -865,9 +873,9 @@ class MediaIndexer:
 
                     logging.info(f"过滤后剩余 {len(filtered_resources)} 个资源项")
 
-                    # 保存结果到 JSON 文件
+                    # 保存结果到索引结果库
                     logging.debug(f"分类结果: {categorized_results}")
-                    self.save_results_to_json(
+                    self.save_index_results(
                         title=item['剧集'],
                         year=item['年份'],
                         categorized_results=categorized_results,
@@ -895,30 +903,14 @@ class MediaIndexer:
             logging.warning(f"提取热度数据时出错: {e}")
             return 0
 
-    def save_results_to_json(self, title, year, categorized_results, season=None):
-        """将结果保存到 JSON 文件"""
-        # 根据是否有季信息来决定文件名格式
-        if season:
-            file_name = f"{title}-S{season}-{year}-GY.json"
-        else:
-            file_name = f"{title}-{year}-GY.json"
-        
-        file_path = os.path.join("/tmp/index", file_name)
-    
+    def save_index_results(self, title, year, categorized_results, season=None):
+        """将结果保存到索引结果库"""
         try:
-            # 检查并创建目录
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-            # 检查文件是否存在
-            if os.path.exists(file_path):
-                logging.info(f"索引已存在，将覆盖: {file_path}")
-    
-            # 保存文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(categorized_results, f, ensure_ascii=False, indent=4)
-            logging.info(f"结果已保存到 {file_path}")
+            count = save_results(title, year, "GY", categorized_results, season=season, db_path=self.db_path)
+            season_text = f" 第{season}季" if season else ""
+            logging.info(f"结果已保存到索引结果库: {title} ({year}){season_text}，共 {count} 条")
         except Exception as e:
-            logging.error(f"保存结果到 JSON 文件时出错: {e}")
+            logging.error(f"保存索引结果时出错: {e}")
 
     def extract_details_movie(self, title):
         """从标题中提取详细信息，如分辨率、音轨、字幕"""
@@ -12,6 +12,11 @@ import xml.etree.ElementTree as ET
 
 import requests
 
+from trigger_bus import filter_scoped_rows
+from result_store import save_results, normalize_info_hash
+from http_engine import PoliteSession, run_concurrently
+from tmdb_cache import tmdb_get
+
 
 os.makedirs("/tmp/log", exist_ok=True)
 logging.basicConfig(
@@ -60,6 +65,19 @@ class JackettIndexer:
 
         logging.info(f"Jackett 脚本启动: argv={sys.argv}")
 
+        # 所有请求共用一个会话以复用连接，并按站点限制并发数和请求速率
+        self._http = PoliteSession()
+        self._http.trust_env = False
+        self._http.headers.update(
+            {
+                "User-Agent": (
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                    "AppleWebKit/537.36 (KHTML, like Gecko) "
+                    "Chrome/120.0.0.0 Safari/537.36"
+                )
+            }
+        )
+
     def load_config(self) -> None:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -160,7 +178,7 @@ class JackettIndexer:
             if year and str(year).isdigit():
                 params[year_key] = int(year)
 
-            r = s.get(f"{base}{search_path}", params=params, timeout=(10, 15))
+            r = tmdb_get(f"{base}{search_path}", params=params, timeout=(10, 15), session=s)
             r.raise_for_status()
             data = r.json() if r.content else {}
             results = data.get("results") or []
@@ -172,10 +190,11 @@ class JackettIndexer:
                 return None
 
             # 取英文详情名（更贴近 Jackett 索引器的英文标题）
-            r2 = s.get(
+            r2 = tmdb_get(
                 f"{base}{details_path_tpl.format(id=tmdb_id)}",
                 params={"api_key": api_key, "language": "en-US"},
                 timeout=(10, 15),
+                session=s,
             )
             r2.raise_for_status()
             details = r2.json() if r2.content else {}
@@ -193,18 +212,7 @@ class JackettIndexer:
             return None
 
     def _session(self) -> requests.Session:
-        s = requests.Session()
-        s.trust_env = False
-        s.headers.update(
-            {
-                "User-Agent": (
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/120.0.0.0 Safari/537.36"
-                )
-            }
-        )
-        return s
+        return self._http
 
     def extract_movie_targets(self) -> list[SearchTarget]:
         targets: list[SearchTarget] = []
@@ -212,7 +220,7 @@ class JackettIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year FROM MISS_MOVIES")
-                rows = cursor.fetchall()
+                rows = filter_scoped_rows(cursor.fetchall())
             for title, year in rows:
                 targets.append(SearchTarget(title=str(title), year=str(year)))
         except Exception as e:
@@ -225,7 +233,7 @@ class JackettIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year, season, missing_episodes FROM MISS_TVS")
-                rows = cursor.fetchall()
+                rows = filter_scoped_rows(cursor.fetchall())
             for title, year, season, missing in rows:
                 missing_list: list[int] = []
                 if missing:
@@ -570,6 +578,10 @@ class JackettIndexer:
                 }
                 if size_str:
                     entry["size"] = size_str
+                # Torznab 的 infohash 属性用于跨站点识别同一种子（magnet 链接由结果库自行解析）
+                btih = normalize_info_hash(attrs.get("infohash"))
+                if btih:
+                    entry["info_hash"] = btih
 
                 if media_type == "movie":
                     results[bucket].append(entry)
@@ -606,15 +618,8 @@ class JackettIndexer:
         except Exception:
             pass
 
-        # 保存 JSON
-        if target.season is not None:
-            file_name = f"{target.title}-S{target.season}-{target.year}-JACKETT.json"
-        else:
-            file_name = f"{target.title}-{target.year}-JACKETT.json"
-        out_path = os.path.join("/tmp/index", file_name)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=4)
+        # 保存到索引结果库
+        save_results(target.title, target.year, "JACKETT", results, season=target.season, db_path=self.db_path)
 
     def run_auto(self) -> None:
         self.load_config()
@@ -625,12 +630,10 @@ class JackettIndexer:
             logging.error("Jackett API Key 未配置，退出")
             return
 
-        os.makedirs("/tmp/index", exist_ok=True)
-
         movie_targets = self.extract_movie_targets()
         tv_targets = self.extract_tv_targets()
 
-        for t in movie_targets:
+        def index_movie(t: SearchTarget) -> None:
             try:
                 logging.info(f"Jackett 搜索电影: {t.title} ({t.year})")
                 params = {"t": "movie", "q": t.title}
@@ -656,10 +659,10 @@ class JackettIndexer:
             except Exception as e:
                 logging.error(f"Jackett 电影索引失败: {t.title} ({t.year}) err={e}")
 
-        for t in tv_targets:
+        def index_tv(t: SearchTarget) -> None:
             try:
                 if t.season is None:
-                    continue
+                    return
                 logging.info(f"Jackett 搜索剧集: {t.title} S{t.season} ({t.year})")
                 params = {"t": "tvsearch", "q": t.title, "season": int(t.season)}
                 items = self._fetch_items(params)
@@ -680,6 +683,10 @@ class JackettIndexer:
             except Exception as e:
                 logging.error(f"Jackett 剧集索引失败: {t.title} S{t.season} ({t.year}) err={e}")
 
+        # 多个标题并发搜索，Jackett 的请求并发数和速率由会话统一限制
+        run_concurrently(index_movie, movie_targets, thread_name_prefix="movie")
+        run_concurrently(index_tv, tv_targets, thread_name_prefix="tv")
+
     def run_manual(self, media_type: str, title: str, year: int | None, season: int | None = None, episodes: str | None = None) -> None:
         self.load_config()
         if not self._is_enabled():
@@ -1,5 +1,4 @@
 import argparse
-import json
 import logging
 import os
 import re
@@ -20,6 +19,9 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import SessionNotCreatedException
 
 from captcha_handler import CaptchaHandler
+from trigger_bus import filter_scoped_rows
+from webdriver_pool import lease_driver
+from result_store import save_results
 
 
 os.makedirs("/tmp/log", exist_ok=True)
@@ -81,6 +83,12 @@ class SeedHubIndexer:
         if self.driver is not None:
             return
 
+        # 无头模式下优先租用站点常驻浏览器，复用已通过验证的会话；浏览器池不可用时再独立启动
+        if self.headless:
+            self.driver = lease_driver("seedhub", self.config, download_dir=os.path.abspath("Torrent"))
+            if self.driver is not None:
+                return
+
         configured_driver_path = (self.config.get("chromedriver_path") or "").strip()
         driver_path = os.environ.get("CHROMEDRIVER_PATH") or configured_driver_path or "/usr/lib/chromium/chromedriver"
         service = Service(executable_path=driver_path) if driver_path and os.path.exists(driver_path) else None
@@ -176,7 +184,7 @@ class SeedHubIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year FROM MISS_MOVIES")
-                rows = cursor.fetchall()
+                rows = filter_scoped_rows(cursor.fetchall())
             for title, year in rows:
                 targets.append(SearchTarget(title=str(title), year=str(year)))
         except Exception as e:
@@ -189,7 +197,7 @@ class SeedHubIndexer:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT title, year, season, missing_episodes FROM MISS_TVS")
-                rows = cursor.fetchall()
+                rows = filter_scoped_rows(cursor.fetchall())
             for title, year, season, missing in rows:
                 missing_list = []
                 if missing:
@@ -529,16 +537,10 @@ class SeedHubIndexer:
         return categorized
 
     def _save_results(self, target: SearchTarget, categorized_results: dict[str, Any]) -> None:
-        if target.season:
-            file_name = f"{target.title}-S{target.season}-{target.year}-SEEDHUB.json"
-        else:
-            file_name = f"{target.title}-{target.year}-SEEDHUB.json"
-
-        out_path = os.path.join("/tmp/index", file_name)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(categorized_results, f, ensure_ascii=False, indent=4)
-        logging.info(f"SeedHub 索引已保存: {out_path}")
+        season = target.season or None
+        count = save_results(target.title, target.year, "SEEDHUB", categorized_results, season=season, db_path=self.db_path)
+        season_text = f" S{target.season}" if season else ""
+        logging.info(f"SeedHub 索引已保存: {target.title} ({target.year}){season_text}，共 {count} 条")
 
     def run_auto(self) -> None:
         return self.run_auto_with_options(warmup=True)
@@ -0,0 +1,65 @@
+import re
+import copy
+import logging
+import threading
+from collections import OrderedDict
+
+# 缓存的解析结果数上限
+MAX_ENTRIES = 4096
+
+# 文件名中的集号（S01E02、E02、EP02），前后不能紧接字母或数字
+EPISODE_TOKEN_PATTERN = re.compile(r'(?<![A-Za-z0-9])(?:S\d{1,2})?EP?(\d{1,4})(?!\d)', re.IGNORECASE)
+
+
+def episode_template(name):
+    """
+    将文件名中唯一的集号替换为占位符，返回 (模板, 集号)。
+    没有或有多个集号时返回 (None, None)。
+    """
+    matches = list(EPISODE_TOKEN_PATTERN.finditer(name))
+    if len(matches) != 1:
+        return None, None
+    match = matches[0]
+    return f"{name[:match.start(1)]}\0{name[match.end(1):]}", int(match.group(1))
+
+
+class ParseCache:
+    """
+    文件名解析结果缓存。
+    先按文件名精确匹配；同一剧集的其他集文件名通常只有集号不同，
+    按“去掉集号的模板”命中时直接复用已解析结果并替换集号，无需重新解析。
+    """
+    def __init__(self, parser, max_entries=MAX_ENTRIES):
+        self.parser = parser
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def parse(self, name):
+        """返回 parser(name) 的结果副本"""
+        template, episode = episode_template(name)
+        with self._lock:
+            result = self._results.get(name)
+            if result is None and template is not None and template in self._templates:
+                result = copy.deepcopy(self._templates[template])
+                result['episode'] = episode
+                logging.debug(f"按同目录剧集模板解析: {name}")
+                self._remember(self._results, name, result)
+            if result is not None:
+                self._results.move_to_end(name)
+                return copy.deepcopy(result)
+
+        result = self.parser(name)
+        with self._lock:
+            self._remember(self._results, name, result)
+            # 解析器识别出的集号与模板中的集号一致时，才将该结果作为模板
+            if template is not None and result.get('episode') == episode:
+                self._remember(self._templates, template, result)
+        return copy.deepcopy(result)
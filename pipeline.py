@@ -0,0 +1,321 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 各阶段日志目录，与原先独立运行脚本时的日志文件保持一致，供WEB实时日志读取
+LOG_DIR = "/tmp/log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# 同时运行的阶段数上限（可通过 CONFIG 中的 pipeline_max_workers 配置）
+DEFAULT_MAX_WORKERS = 3
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池，同一进程内的所有阶段及共享存储（索引结果、TMDB 缓存、已处理文件台账、NFO 缓存、目录快照、触发事件）共用。
+    连接在首次借出时创建，归还后复用，最多同时借出 size 个连接；借出期间不要再借出其他连接，以免耗尽连接池。
+    """
+    def __init__(self, db_path=DB_PATH, size=4, timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接，正常结束时提交事务，异常时回滚"""
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._create_connection()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """关闭连接池中的全部连接"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_db_pools = {}
+_db_pools_lock = threading.Lock()
+
+
+def get_db_pool(db_path=DB_PATH):
+    """获取进程级共享的连接池（按数据库路径区分），进程退出时关闭其中的连接"""
+    with _db_pools_lock:
+        pool = _db_pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _db_pools[db_path] = pool
+            atexit.register(pool.close_all)
+        return pool
+
+
+def load_shared_config(pool=None):
+    """通过连接池一次性读取 CONFIG 表，供本轮所有阶段共用"""
+    pool = pool or get_db_pool()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
+        config = {option: value for option, value in cursor.fetchall()}
+    logging.debug("加载共享配置成功")
+    return config
+
+
+class Stage:
+    """
+    流水线中的一个阶段。
+    target 为模块名（调用该模块的 entry 函数）或可直接调用的函数，
+    入口函数接收本轮共享的配置字典作为唯一参数。
+    inputs / outputs 为该阶段读取和写入的数据资源名称，调度器据此推导依赖关系。
+    title_scoped 为 True 时，触发执行会通过 titles 关键字参数传入受影响的标题。
+    """
+    def __init__(self, name, target, description, inputs=(), outputs=(), entry='main', log_name=None,
+                 title_scoped=False):
+        self.name = name
+        self.target = target
+        self.description = description
+        self.inputs = frozenset(inputs)
+        self.outputs = frozenset(outputs)
+        self.entry = entry
+        self.title_scoped = title_scoped
+        # 默认沿用模块名作为日志文件名，例如 /tmp/log/scan_media.log
+        if log_name is None and isinstance(target, str):
+            log_name = target
+        self.log_name = log_name
+
+    def resolve(self):
+        """导入阶段模块并返回入口函数（模块只在首次运行时导入一次）"""
+        if callable(self.target):
+            return self.target
+        module = importlib.import_module(self.target)
+        return getattr(module, self.entry)
+
+
+def build_dependencies(stages):
+    """
+    根据声明顺序和读写资源推导阶段依赖：
+    后声明的阶段若读取了先前阶段的输出（读后写）、写入了先前阶段读取的资源（写后读）
+    或与先前阶段写入同一资源（写后写），则必须等待该阶段完成。
+    """
+    names = set()
+    dependencies = {}
+    for index, stage in enumerate(stages):
+        if stage.name in names:
+            raise ValueError(f"阶段名称重复: {stage.name}")
+        names.add(stage.name)
+        dependencies[stage.name] = {
+            earlier.name for earlier in stages[:index]
+            if (stage.inputs & earlier.outputs)
+            or (stage.outputs & earlier.inputs)
+            or (stage.outputs & earlier.outputs)
+        }
+    return dependencies
+
+
+class PipelineRunner:
+    """
+    进程内流水线执行器：各阶段以模块方式导入并直接调用入口函数，
+    共享一份配置和一个数据库连接池，阶段之间不再等待固定时间。
+    依赖已满足的阶段并行执行，同时运行的阶段数受 max_workers 限制。
+    """
+    def __init__(self, stages, db_path=DB_PATH, should_continue=None, max_workers=None):
+        self.stages = list(stages)
+        self.dependencies = build_dependencies(self.stages)
+        self.pool = get_db_pool(db_path)
+        self.config = {}
+        self.should_continue = should_continue or (lambda: True)
+        self.max_workers = max_workers
+        self.timings = {}
+
+    def _attach_stage_log(self, stage):
+        if not stage.log_name:
+            return None
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handler = logging.FileHandler(os.path.join(LOG_DIR, f"{stage.log_name}.log"), mode='w')
+        except OSError as e:
+            logging.warning(f"无法创建阶段日志文件 {stage.log_name}.log: {e}")
+            return None
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        # 并行执行时只记录本阶段线程（及以其名称为前缀的子线程）产生的日志
+        thread_prefix = threading.current_thread().name
+        handler.addFilter(
+            lambda record: record.threadName == thread_prefix or record.threadName.startswith(f"{thread_prefix}-")
+        )
+        logging.getLogger().addHandler(handler)
+        return handler
+
+    def _detach_stage_log(self, handler):
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+
+    def run_stage(self, stage, titles=None):
+        """执行单个阶段，返回是否成功；阶段内的异常不会中断整个流水线"""
+        handler = self._attach_stage_log(stage)
+        start = time.monotonic()
+        success = False
+        try:
+            entry = stage.resolve()
+            if titles and stage.title_scoped:
+                logging.info(f"{stage.description}：仅处理 {len(titles)} 个标题: {', '.join(sorted(titles))}")
+                entry(self.config, titles=titles)
+            else:
+                entry(self.config)
+            success = True
+        except SystemExit as e:
+            # 兼容各脚本中 exit(0) 形式的提前退出
+            success = e.code in (None, 0)
+            if not success:
+                logging.error(f"{stage.description} 异常退出，退出码: {e.code}")
+        except Exception as e:
+            logging.exception(f"{stage.description} 执行失败: {e}")
+        finally:
+            self._detach_stage_log(handler)
+        elapsed = time.monotonic() - start
+        self.timings[stage.name] = elapsed
+        logging.info("-" * 80)
+        status = "已执行完毕" if success else "执行失败"
+        logging.info(f"{stage.description}：{status}，耗时 {elapsed:.1f} 秒")
+        logging.info("-" * 80)
+        return success
+
+    def _resolve_max_workers(self):
+        if self.max_workers:
+            return max(1, int(self.max_workers))
+        try:
+            return max(1, int(self.config.get('pipeline_max_workers', DEFAULT_MAX_WORKERS)))
+        except (TypeError, ValueError):
+            logging.warning(f"pipeline_max_workers 配置无效，使用默认值 {DEFAULT_MAX_WORKERS}")
+            return DEFAULT_MAX_WORKERS
+
+    def _critical_path(self):
+        """按本轮各阶段耗时计算最长依赖链"""
+        finish = {}
+        previous = {}
+        for stage in self.stages:
+            if stage.name not in self.timings:
+                continue
+            deps = [d for d in self.dependencies[stage.name] if d in finish]
+            parent = max(deps, key=lambda d: finish[d], default=None)
+            previous[stage.name] = parent
+            finish[stage.name] = (finish[parent] if parent else 0) + self.timings[stage.name]
+        if not finish:
+            return [], 0
+        name = max(finish, key=finish.get)
+        total = finish[name]
+        path = []
+        while name:
+            path.append(name)
+            name = previous[name]
+        return list(reversed(path)), total
+
+    def _start_stage(self, stage, finished, titles=None):
+        def target():
+            success = False
+            try:
+                success = self.run_stage(stage, titles)
+            finally:
+                finished.put((stage.name, success))
+
+        thread = threading.Thread(target=target, name=f"stage-{stage.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_config(self):
+        """重新读取共享配置"""
+        self.config = load_shared_config(self.pool)
+        return self.config
+
+    def run_cycle(self):
+        """执行一轮全部阶段：依赖满足的阶段并行运行，失败的阶段不会阻止后续阶段"""
+        return self._run(self.stages)
+
+    def run_stages(self, names, titles=None):
+        """
+        只执行指定的阶段（由触发事件决定），阶段之间仍按依赖顺序调度。
+        titles 为受影响的标题集合，传给支持按标题执行的阶段；为空时处理全部订阅。
+        """
+        names = set(names)
+        unknown = names - {stage.name for stage in self.stages}
+        if unknown:
+            logging.warning(f"忽略未知的阶段: {', '.join(sorted(unknown))}")
+        return self._run([stage for stage in self.stages if stage.name in names], titles)
+
+    def _run(self, stages, titles=None):
+        self.refresh_config()
+        self.timings = {}
+        max_workers = self._resolve_max_workers()
+        cycle_start = time.monotonic()
+
+        selected = {stage.name for stage in stages}
+        pending = list(stages)
+        completed = set()
+        running = set()
+        finished = queue.Queue()
+        stopped = False
+
+        while pending or running:
+            if not stopped and not self.should_continue():
+                logging.info("收到停止信号，不再启动新的阶段，等待运行中的阶段结束")
+                stopped = True
+            if not stopped:
+                for stage in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if (self.dependencies[stage.name] & selected) <= completed:
+                        pending.remove(stage)
+                        running.add(stage.name)
+                        self._start_stage(stage, finished, titles)
+            if stopped:
+                pending = []
+            if not running:
+                break
+            name, _ = finished.get()
+            running.discard(name)
+            completed.add(name)
+
+        path, path_seconds = self._critical_path()
+        logging.info(f"本轮流水线总耗时 {time.monotonic() - cycle_start:.1f} 秒，并发上限 {max_workers}")
+        if path:
+            logging.info(f"关键路径: {' -> '.join(path)}（{path_seconds:.1f} 秒）")
+        return self.timings
@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from pipeline import get_db_pool
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+
+def file_identity(path):
+    """文件标识 (大小, 修改时间, inode)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class ProcessedFilesLedger:
+    """
+    已处理文件台账，保存在 PROCESSED_FILES 表中。
+    以完整路径为键并记录文件标识，同一路径出现不同的文件时视为未处理；
+    旧版 files_record.txt 中的文件名只读兼容，不再写入。
+    另在 PROCESSED_DIRECTORIES 表中记录已全部处理的目录指纹，启动扫描时跳过未变化的目录。
+    """
+    def __init__(self, db_path=DB_PATH, legacy_record_path=None):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._directories = {}
+        self._legacy_names = set()
+        self._load()
+        if legacy_record_path:
+            self._load_legacy(legacy_record_path)
+
+    def _load(self):
+        try:
+            with get_db_pool(self.db_path).connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT PATH, SIZE, MTIME_NS, INODE FROM PROCESSED_FILES")
+                for path, size, mtime_ns, inode in cursor.fetchall():
+                    self._entries[path] = (size, mtime_ns, inode) if size is not None else None
+                cursor.execute("SELECT PATH, FINGERPRINT FROM PROCESSED_DIRECTORIES")
+                self._directories = dict(cursor.fetchall())
+            logging.debug(f"已加载 {len(self._entries)} 条已处理文件记录")
+        except sqlite3.Error as e:
+            logging.error(f"读取已处理文件记录失败: {e}")
+
+    def _load_legacy(self, record_path):
+        if not os.path.exists(record_path):
+            return
+        try:
+            with open(record_path, 'r') as f:
+                self._legacy_names = {line.split('/')[-1] for line in f.read().splitlines() if line}
+            logging.debug(f"已加载 {len(self._legacy_names)} 条旧版已处理文件名记录")
+        except OSError as e:
+            logging.warning(f"读取旧版已处理文件记录失败: {e}")
+
+    def __contains__(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._entries:
+                return os.path.basename(path) in self._legacy_names
+            recorded = self._entries[path]
+        return recorded is not None and recorded == file_identity(path)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, path):
+        """记录已处理的文件（文件已被移动时只记录路径）"""
+        path = os.path.abspath(path)
+        identity = file_identity(path)
+        size, mtime_ns, inode = identity or (None, None, None)
+        with self._lock:
+            self._entries[path] = identity
+            try:
+                with get_db_pool(self.db_path).connection() as conn:
+                    conn.execute(
+                        '''INSERT OR REPLACE INTO PROCESSED_FILES (PATH, FILENAME, SIZE, MTIME_NS, INODE, PROCESSED_AT)
+                           VALUES (?, ?, ?, ?, ?, ?)''',
+                        (path, os.path.basename(path), size, mtime_ns, inode, time.time())
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"保存已处理文件记录失败: {e}")
+
+    def directory_unchanged(self, directory, fingerprint):
+        """目录上次扫描时已全部处理且指纹未变化"""
+        with self._lock:
+            return self._directories.get(os.path.abspath(directory)) == fingerprint
+
+    def mark_directory(self, directory, fingerprint):
+        """记录已全部处理的目录指纹"""
+        directory = os.path.abspath(directory)
+        with self._lock:
+            if self._directories.get(directory) == fingerprint:
+                return
+            self._directories[directory] = fingerprint
+            try:
+                with get_db_pool(self.db_path).connection() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO PROCESSED_DIRECTORIES (PATH, FINGERPRINT, CHECKED_AT) VALUES (?, ?, ?)",
+                        (directory, fingerprint, time.time())
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"保存目录扫描记录失败: {e}")
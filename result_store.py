@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import base64
+import sqlite3
+import logging
+
+from pipeline import get_db_pool
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 分辨率分类及电视节目资源类型，与各索引脚本输出的结构一致
+RESOLUTION_BUCKETS = ["首选分辨率", "备选分辨率", "其他分辨率"]
+ITEM_TYPES = ["全集", "集数范围", "单集"]
+
+
+def _key(title, year, season=None):
+    """统一主键格式：有季信息的为电视节目，否则为电影（与原索引文件命名规则一致）"""
+    if season not in (None, ""):
+        return "tv", str(title), str(year), _to_int(season) or 0
+    return "movie", str(title), str(year), 0
+
+
+def _subscription_key(media_type, title, year, season=None):
+    season = (_to_int(season) or 0) if media_type == "tv" else 0
+    return media_type, str(title), str(year), season
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_info_hash(value):
+    """将 hex 或 base32 形式的 BTIH 统一为 40 位小写 hex，无法识别时返回 None"""
+    value = str(value or "").strip()
+    if re.fullmatch(r"[0-9a-fA-F]{40}", value):
+        return value.lower()
+    if re.fullmatch(r"[A-Z2-7]{32}", value.upper()):
+        return base64.b32decode(value.upper()).hex()
+    return None
+
+
+def btih_from_magnet(link):
+    """从 magnet 链接的 xt 参数提取 BTIH"""
+    if not link or not str(link).startswith("magnet:"):
+        return None
+    match = re.search(r"xt=urn:btih:([0-9A-Za-z]+)", str(link))
+    return normalize_info_hash(match.group(1)) if match else None
+
+
+def info_hash(item):
+    """资源的 BTIH：优先使用索引脚本记录的 info_hash，否则从 magnet 链接解析"""
+    return normalize_info_hash(item.get("info_hash")) or btih_from_magnet(item.get("link"))
+
+
+def _flatten(categorized_results):
+    """将分类结果展开为 (分辨率分类, 资源类型, 资源) 列表"""
+    for bucket in RESOLUTION_BUCKETS:
+        group = categorized_results.get(bucket) or []
+        if isinstance(group, dict):
+            for item_type, items in group.items():
+                for item in items or []:
+                    yield bucket, item_type, item
+        else:
+            for item in group:
+                yield bucket, "", item
+
+
+def save_results(title, year, site, categorized_results, season=None, db_path=DB_PATH):
+    """
+    保存某个站点对某部影片（或某一季）的索引结果，替换该站点此前的结果。
+    未找到资源时同样记录本次搜索，以便区分"已搜索但无结果"和"尚未搜索"。
+    同一站点内 BTIH 相同的资源只保留第一条。
+    """
+    media_type, title, year, season = _key(title, year, season)
+    fetched_at = time.time()
+    rows = []
+    seen_hashes = set()
+    for bucket, item_type, item in _flatten(categorized_results):
+        btih = info_hash(item)
+        if btih:
+            if btih in seen_hashes:
+                continue
+            seen_hashes.add(btih)
+        rows.append((media_type, title, year, season, site, bucket, item_type,
+                     item.get("resolution"), item.get("title"), item.get("size"),
+                     _to_int(item.get("popularity")) or 0, item.get("link"),
+                     _to_int(item.get("start_episode")), _to_int(item.get("end_episode")),
+                     btih, json.dumps(item, ensure_ascii=False), fetched_at))
+    with get_db_pool(db_path).connection() as conn:
+        conn.execute(
+            "DELETE FROM INDEX_RESULTS WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ?",
+            (media_type, title, year, season, site)
+        )
+        conn.executemany(
+            '''INSERT INTO INDEX_RESULTS (MEDIA_TYPE, TITLE, YEAR, SEASON, SITE, RESOLUTION_BUCKET, ITEM_TYPE,
+                                          RESOLUTION, RESOURCE_TITLE, SIZE, POPULARITY, LINK,
+                                          START_EPISODE, END_EPISODE, INFO_HASH, DATA, FETCHED_AT)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            rows
+        )
+        conn.execute(
+            '''INSERT OR REPLACE INTO INDEX_SEARCHES (MEDIA_TYPE, TITLE, YEAR, SEASON, SITE, RESULT_COUNT, FETCHED_AT)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (media_type, title, year, season, site, len(rows), fetched_at)
+        )
+    return len(rows)
+
+
+def load_results(title, year, site, season=None, db_path=DB_PATH):
+    """
+    读取某个站点的索引结果，返回与索引脚本输出相同结构的分类字典；
+    该站点尚未搜索过时返回 None。
+    带有 BTIH 的资源附加 info_hash 和 alternative_sources（索引到同一种子的其他站点）。
+    """
+    media_type, title, year, season = _key(title, year, season)
+    with get_db_pool(db_path).connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM INDEX_SEARCHES WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ?",
+            (media_type, title, year, season, site)
+        )
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute(
+            '''SELECT RESOLUTION_BUCKET, ITEM_TYPE, INFO_HASH, DATA FROM INDEX_RESULTS
+               WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ?
+               ORDER BY ID''',
+            (media_type, title, year, season, site)
+        )
+        rows = cursor.fetchall()
+        cursor.execute(
+            '''SELECT INFO_HASH, SITE FROM INDEX_RESULTS
+               WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE != ? AND INFO_HASH IN (
+                   SELECT INFO_HASH FROM INDEX_RESULTS
+                   WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ?
+               )
+               ORDER BY ID''',
+            (media_type, title, year, season, site) * 2
+        )
+        alternatives = {}
+        for btih, other_site in cursor.fetchall():
+            sites = alternatives.setdefault(btih, [])
+            if other_site not in sites:
+                sites.append(other_site)
+
+    if media_type == "tv":
+        results = {bucket: {item_type: [] for item_type in ITEM_TYPES} for bucket in RESOLUTION_BUCKETS}
+    else:
+        results = {bucket: [] for bucket in RESOLUTION_BUCKETS}
+    for bucket, item_type, btih, data in rows:
+        item = json.loads(data)
+        if btih:
+            item["info_hash"] = btih
+            item["alternative_sources"] = alternatives.get(btih, [])
+        if media_type == "tv":
+            results.setdefault(bucket, {}).setdefault(item_type, []).append(item)
+        else:
+            results.setdefault(bucket, []).append(item)
+    return results
+
+
+def query_results(media_type, title, year, season=None, sites=None, resolution_bucket=None, item_type=None,
+                  max_age=None, by_popularity=True, dedupe=True, db_path=DB_PATH):
+    """
+    跨站点查询索引结果，返回 [(站点, 资源)]。
+    media_type 为 'movie' 或 'tv'；电视节目未指定季时返回所有季的结果。
+    max_age 为结果的最长有效时间（秒），超过的结果不返回。
+    by_popularity 为 True 时按热度降序排列，否则保持索引脚本写入的顺序。
+    dedupe 为 True 时同一季中 BTIH 相同的资源只保留排在最前的一条，其他站点记入 alternative_sources。
+    """
+    conditions = ["MEDIA_TYPE = ?", "TITLE = ?", "YEAR = ?"]
+    params = [media_type, str(title), str(year)]
+    if season not in (None, ""):
+        conditions.append("SEASON = ?")
+        params.append(_to_int(season) or 0)
+    if sites:
+        conditions.append(f"SITE IN ({', '.join('?' for _ in sites)})")
+        params.extend(sites)
+    if resolution_bucket:
+        conditions.append("RESOLUTION_BUCKET = ?")
+        params.append(resolution_bucket)
+    if item_type:
+        conditions.append("ITEM_TYPE = ?")
+        params.append(item_type)
+    if max_age is not None:
+        conditions.append("FETCHED_AT >= ?")
+        params.append(time.time() - max_age)
+    with get_db_pool(db_path).connection() as conn:
+        cursor = conn.cursor()
+        order = "POPULARITY DESC, ID" if by_popularity else "ID"
+        cursor.execute(
+            f"SELECT SITE, SEASON, INFO_HASH, DATA FROM INDEX_RESULTS WHERE {' AND '.join(conditions)} ORDER BY {order}",
+            params
+        )
+        rows = cursor.fetchall()
+
+    results = []
+    merged = {}
+    for site, row_season, btih, data in rows:
+        if btih and dedupe and (row_season, btih) in merged:
+            kept_site, sites = merged[(row_season, btih)]
+            if site != kept_site and site not in sites:
+                sites.append(site)
+            continue
+        item = json.loads(data)
+        if btih:
+            item["info_hash"] = btih
+            item["alternative_sources"] = []
+            merged[(row_season, btih)] = (site, item["alternative_sources"])
+        results.append((site, item))
+    return results
+
+
+def searched_sites(media_type, title, year, season=None, max_age=None, db_path=DB_PATH):
+    """返回在有效期内已搜索过该影片的站点集合（含无结果的站点）"""
+    conditions = ["MEDIA_TYPE = ?", "TITLE = ?", "YEAR = ?"]
+    params = [media_type, str(title), str(year)]
+    if season not in (None, ""):
+        conditions.append("SEASON = ?")
+        params.append(_to_int(season) or 0)
+    if max_age is not None:
+        conditions.append("FETCHED_AT >= ?")
+        params.append(time.time() - max_age)
+    with get_db_pool(db_path).connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT DISTINCT SITE FROM INDEX_SEARCHES WHERE {' AND '.join(conditions)}", params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def missing_signature(missing_episodes):
+    """将订阅的缺失集数规范化为签名，用于判断缺失集数自上次索引后是否变化"""
+    if missing_episodes is None:
+        return None
+    episodes = sorted({int(ep) for ep in re.findall(r"\d+", str(missing_episodes))})
+    return ",".join(str(ep) for ep in episodes)
+
+
+def stale_titles(site, subscriptions, ttl, negative_ttl, db_path=DB_PATH):
+    """
+    返回该站点需要重新索引的标题集合。
+    subscriptions 为 [(media_type, title, year, season, 缺失集数签名)]；
+    从未索引、缺失集数已变化或超过有效期的订阅需要重新索引，无结果的索引使用较短的 negative_ttl。
+    """
+    now = time.time()
+    stale = set()
+    with get_db_pool(db_path).connection() as conn:
+        cursor = conn.cursor()
+        for media_type, title, year, season, signature in subscriptions:
+            cursor.execute(
+                '''SELECT RESULT_COUNT, FETCHED_AT, MISSING_SIGNATURE FROM INDEX_SEARCHES
+                   WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ?''',
+                (*_subscription_key(media_type, title, year, season), site)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                stale.add(title)
+                continue
+            result_count, fetched_at, indexed_signature = row
+            if indexed_signature != signature:
+                stale.add(title)
+            elif now - (fetched_at or 0) > (ttl if result_count else negative_ttl):
+                stale.add(title)
+    return stale
+
+
+def stamp_searches(site, since, subscriptions, db_path=DB_PATH):
+    """为 since 之后该站点完成的搜索记录本次索引时订阅的缺失集数签名"""
+    with get_db_pool(db_path).connection() as conn:
+        conn.executemany(
+            '''UPDATE INDEX_SEARCHES SET MISSING_SIGNATURE = ?
+               WHERE MEDIA_TYPE = ? AND TITLE = ? AND YEAR = ? AND SEASON = ? AND SITE = ? AND FETCHED_AT >= ?''',
+            [(signature, *_subscription_key(media_type, title, year, season), site, since)
+             for media_type, title, year, season, signature in subscriptions]
+        )
+
+
+def prune_results(max_age, db_path=DB_PATH):
+    """删除超过保留时间的索引结果（如已取消的订阅或手动搜索留下的结果）"""
+    cutoff = time.time() - max_age
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            removed = conn.execute("DELETE FROM INDEX_SEARCHES WHERE FETCHED_AT < ?", (cutoff,)).rowcount
+            conn.execute("DELETE FROM INDEX_RESULTS WHERE FETCHED_AT < ?", (cutoff,))
+        if removed:
+            logging.info(f"已清理 {removed} 条过期的资源索引记录")
+    except sqlite3.Error as e:
+        logging.error(f"清理过期资源索引结果失败: {e}")
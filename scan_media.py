@@ -2,7 +2,9 @@ import os
 import re
 import sqlite3
 import logging
-import xml.etree.ElementTree as ET
+import trigger_bus
+from library_catalog import get_catalog
+from library_snapshot import LibrarySnapshot
 
 # 配置日志
 logging.basicConfig(
@@ -29,360 +31,443 @@ def load_config(db_path):
         logging.error(f"数据库加载配置错误: {e}")
         exit(0)
 
-def scan_movies(path):
+MEDIA_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')
+
+# 多种电影命名格式
+MOVIE_PATTERNS = [
+    re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
+    re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
+    re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
+    re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
+    re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
+]
+
+# 多种季目录命名格式
+SEASON_PATTERNS = [
+    re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
+    re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
+    re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
+    re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
+]
+
+EPISODE_PATTERN = re.compile(r'^(.*) - S(\d+)E(\d+) - (.*)$', re.IGNORECASE)
+EPISODE_PATTERN_ALT = re.compile(r'^(.*)\.S(\d+)E(\d+)\.(.*)$', re.IGNORECASE)  # 支持点号分隔
+
+def scan_movie_directory(root, files):
+    """扫描单个目录中的电影文件，返回 (电影列表, 读取过的 NFO 文件列表)"""
     movies = []
-    media_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso']
-    
-    # 多种电影命名格式
-    movie_patterns = [
-        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-    ]
+    nfo_files = []
+    for file in files:
+        if file.lower().endswith(MEDIA_EXTENSIONS):
+            matched = False
+            for pattern in MOVIE_PATTERNS:
+                match = pattern.match(os.path.splitext(file)[0])
+                if match:
+                    movie_name = match.group(1).strip()
+                    year = int(match.group(2))
+                    tmdb_id = None
+                    
+                    # 检查NFO文件
+                    media_file_name = os.path.splitext(file)[0]
+                    nfo_file_path = os.path.join(root, media_file_name + '.nfo')
+                    nfo = get_catalog().nfo(nfo_file_path)
+                    if nfo is not None:
+                        nfo_files.append(nfo_file_path)
+                        if nfo['error']:
+                            logging.warning(f"无法解析 NFO 文件: {nfo_file_path}")
+                        elif nfo['uniqueids'].get('tmdb'):
+                            tmdb_id = nfo['uniqueids']['tmdb'].strip()
+
+                    movies.append((movie_name, year, tmdb_id))
+                    matched = True
+                    break
+            
+            if not matched:
+                logging.warning(f"无法从文件名提取标题和年份: {file}")
+
+    return movies, nfo_files
 
-    for root, _, files in os.walk(path):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in media_extensions):
-                matched = False
-                for pattern in movie_patterns:
-                    match = pattern.match(os.path.splitext(file)[0])
-                    if match:
-                        movie_name = match.group(1).strip()
-                        year = int(match.group(2))
-                        tmdb_id = None
-                        
-                        # 检查NFO文件
-                        media_file_name = os.path.splitext(file)[0]
-                        nfo_file_path = os.path.join(root, media_file_name + '.nfo')
-                        if os.path.exists(nfo_file_path):
-                            try:
-                                tree = ET.parse(nfo_file_path)
-                                root_element = tree.getroot()
-                                uniqueid_elements = root_element.findall('uniqueid')
-                                for uniqueid in uniqueid_elements:
-                                    if uniqueid.attrib.get('type') == 'tmdb':
-                                        tmdb_id = uniqueid.text.strip()
-                                        break
-                            except ET.ParseError:
-                                logging.warning(f"无法解析 NFO 文件: {nfo_file_path}")
-
-                        movies.append((movie_name, year, tmdb_id))
-                        matched = True
-                        break
-                
-                if not matched:
-                    logging.warning(f"无法从文件名提取标题和年份: {file}")
+def scan_movies(path, snapshot=None):
+    """扫描电影目录；传入 snapshot 时未变化的目录直接复用上次的扫描结果"""
+    if snapshot is not None:
+        results = snapshot.walk(path, lambda root, dirs, files: scan_movie_directory(root, files))
+        return [tuple(movie) for movies in results for movie in movies]
 
+    movies = []
+    for root, _, files in get_catalog().walk(path):
+        movies.extend(scan_movie_directory(root, files)[0])
     return movies
 
-def scan_episodes(path):
+def scan_episode_directory(root, dirs, files):
+    """
+    扫描单个目录：目录中有 tvshow.nfo 时读取各季目录，并识别目录中直接存放的剧集文件。
+    返回 ({剧名: {'tmdb_id', 'seasons'}}, 读取过的 NFO 文件和季目录列表)。
+    """
     episodes = {}
-    
-    # 多种季目录命名格式
-    season_patterns = [
-        re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
-        re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
-        re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
-        re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
-    ]
-    
-    episode_pattern = re.compile(r'^(.*) - S(\d+)E(\d+) - (.*)$', re.IGNORECASE)
-    episode_pattern_alt = re.compile(r'^(.*)\.S(\d+)E(\d+)\.(.*)$', re.IGNORECASE)  # 支持点号分隔
-
-    for root, dirs, files in os.walk(path):
-        # 检查 tvshow.nfo
-        if 'tvshow.nfo' in files:
-            tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
-            try:
-                tree = ET.parse(tvshow_nfo_path)
-                root_element = tree.getroot()
-
-                title_element = root_element.find('title')
-                if title_element is not None:
-                    show_name = title_element.text.strip()
-                else:
-                    logging.warning(f"tvshow.nfo 文件中未找到标题元素: {tvshow_nfo_path}")
-                    continue
-
-                tmdb_id = None
-                uniqueid_elements = root_element.findall('uniqueid')
-                for uniqueid in uniqueid_elements:
-                    if uniqueid.attrib.get('type') == 'tmdb':
-                        tmdb_id = uniqueid.text.strip()
-                        break
+    dependencies = []
+    catalog = get_catalog()
+
+    # 检查 tvshow.nfo
+    if 'tvshow.nfo' in files:
+        tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
+        dependencies.append(tvshow_nfo_path)
+        tvshow_nfo = catalog.nfo(tvshow_nfo_path)
+        if tvshow_nfo is None or tvshow_nfo['error']:
+            logging.warning(f"无法解析 tvshow.nfo 文件: {tvshow_nfo_path}")
+            return episodes, dependencies
+        if tvshow_nfo['title'] is not None:
+            show_name = tvshow_nfo['title'].strip()
+        else:
+            logging.warning(f"tvshow.nfo 文件中未找到标题元素: {tvshow_nfo_path}")
+            return episodes, dependencies
+
+        tmdb_id = tvshow_nfo['uniqueids'].get('tmdb')
+        if tmdb_id is not None:
+            tmdb_id = tmdb_id.strip()
+
+        if show_name not in episodes:
+            episodes[show_name] = {'tmdb_id': tmdb_id, 'seasons': {}}
+
+        # 支持多种季目录格式
+        for dir_name in dirs:
+            season_number = None
+            for pattern in SEASON_PATTERNS:
+                match = pattern.match(dir_name)
+                if match:
+                    season_number = int(match.group(1))
+                    break
+            
+            if season_number is not None:
+                season_path = os.path.join(root, dir_name)
+                season_nfo_path = os.path.join(season_path, 'season.nfo')
+                dependencies.append(season_path)
+
+                year = None
+                season_nfo = catalog.nfo(season_nfo_path)
+                if season_nfo is not None:
+                    dependencies.append(season_nfo_path)
+                    if season_nfo['error']:
+                        logging.warning(f"无法解析 season.nfo 文件: {season_nfo_path}")
+                        continue
+                    if season_nfo['seasonnumber'] is not None:
+                        season_number = int(season_nfo['seasonnumber'].strip())
+
+                    if season_nfo['year'] is not None:
+                        year = int(season_nfo['year'].strip())
+                    elif season_nfo['releasedate']:
+                        date_text = season_nfo['releasedate'].strip()
+                        match = re.match(r'(\d{4})', date_text)
+                        if match:
+                            year_str = match.group(1)
+                            if not year_str.startswith('000'):
+                                year = int(year_str)
+
+                    if season_number not in episodes[show_name]['seasons']:
+                        episodes[show_name]['seasons'][season_number] = {'year': year, 'episodes': []}
+
+                    # 扫描该季的媒体文件（遍历时已列出的季目录直接复用目录册中的列表）
+                    season_listing = catalog.listing(season_path)
+                    for file in (season_listing.files if season_listing is not None else []):
+                        if file.lower().endswith(MEDIA_EXTENSIONS):
+                            episode_match = EPISODE_PATTERN.match(os.path.splitext(file)[0])
+                            if not episode_match:
+                                episode_match = EPISODE_PATTERN_ALT.match(os.path.splitext(file)[0])
+                            
+                            if episode_match:
+                                episode_number = int(episode_match.group(3))
+                                if episode_number not in episodes[show_name]['seasons'][season_number]['episodes']:
+                                    episodes[show_name]['seasons'][season_number]['episodes'].append(episode_number)
+
+    # 处理直接在根目录下的剧集文件
+    for file in files:
+        if file.lower().endswith(MEDIA_EXTENSIONS):
+            episode_match = EPISODE_PATTERN.match(os.path.splitext(file)[0])
+            if not episode_match:
+                episode_match = EPISODE_PATTERN_ALT.match(os.path.splitext(file)[0])
+            
+            if episode_match:
+                show_name = episode_match.group(1).strip()
+                season = int(episode_match.group(2))
+                episode = int(episode_match.group(3))
 
                 if show_name not in episodes:
-                    episodes[show_name] = {'tmdb_id': tmdb_id, 'seasons': {}}
+                    episodes[show_name] = {'tmdb_id': None, 'seasons': {}}
+                if season not in episodes[show_name]['seasons']:
+                    episodes[show_name]['seasons'][season] = {'year': None, 'episodes': []}
 
-                # 支持多种季目录格式
-                for dir_name in dirs:
-                    season_number = None
-                    for pattern in season_patterns:
-                        match = pattern.match(dir_name)
-                        if match:
-                            season_number = int(match.group(1))
-                            break
-                    
-                    if season_number is not None:
-                        season_path = os.path.join(root, dir_name)
-                        season_nfo_path = os.path.join(season_path, 'season.nfo')
-
-                        year = None
-                        if os.path.exists(season_nfo_path):
-                            try:
-                                season_tree = ET.parse(season_nfo_path)
-                                season_root = season_tree.getroot()
-
-                                season_number_element = season_root.find('seasonnumber')
-                                if season_number_element is not None and season_number_element.text is not None:
-                                    season_number = int(season_number_element.text.strip())
-
-                                year_element = season_root.find('year')
-                                if year_element is not None and year_element.text is not None:
-                                    year = int(year_element.text.strip())
-                                else:
-                                    releasedate_element = season_root.find('releasedate')
-                                    if releasedate_element is not None and releasedate_element.text:
-                                        date_text = releasedate_element.text.strip()
-                                        match = re.match(r'(\d{4})', date_text)
-                                        if match:
-                                            year_str = match.group(1)
-                                            if not year_str.startswith('000'):
-                                                year = int(year_str)
-
-                                if season_number not in episodes[show_name]['seasons']:
-                                    episodes[show_name]['seasons'][season_number] = {'year': year, 'episodes': []}
-
-                                # 扫描该季的媒体文件
-                                for file in os.listdir(season_path):
-                                    if file.lower().endswith(('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')):
-                                        episode_match = episode_pattern.match(os.path.splitext(file)[0])
-                                        if not episode_match:
-                                            episode_match = episode_pattern_alt.match(os.path.splitext(file)[0])
-                                        
-                                        if episode_match:
-                                            episode_number = int(episode_match.group(3))
-                                            if episode_number not in episodes[show_name]['seasons'][season_number]['episodes']:
-                                                episodes[show_name]['seasons'][season_number]['episodes'].append(episode_number)
-                            except ET.ParseError:
-                                logging.warning(f"无法解析 season.nfo 文件: {season_nfo_path}")
-                                continue
-
-            except ET.ParseError:
-                logging.warning(f"无法解析 tvshow.nfo 文件: {tvshow_nfo_path}")
-                continue
+                if episode not in episodes[show_name]['seasons'][season]['episodes']:
+                    episodes[show_name]['seasons'][season]['episodes'].append(episode)
+
+    return episodes, dependencies
 
-        # 处理直接在根目录下的剧集文件
-        for file in files:
-            if file.lower().endswith(('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')):
-                episode_match = episode_pattern.match(os.path.splitext(file)[0])
-                if not episode_match:
-                    episode_match = episode_pattern_alt.match(os.path.splitext(file)[0])
-                
-                if episode_match:
-                    show_name = episode_match.group(1).strip()
-                    season = int(episode_match.group(2))
-                    episode = int(episode_match.group(3))
-
-                    if show_name not in episodes:
-                        episodes[show_name] = {'tmdb_id': None, 'seasons': {}}
-                    if season not in episodes[show_name]['seasons']:
-                        episodes[show_name]['seasons'][season] = {'year': None, 'episodes': []}
-
-                    if episode not in episodes[show_name]['seasons'][season]['episodes']:
-                        episodes[show_name]['seasons'][season]['episodes'].append(episode)
+def _episodes_to_rows(episodes):
+    """转换为可 JSON 序列化的列表（JSON 对象的键只能是字符串，季号需保持整数）"""
+    return [
+        [show_name, show_info['tmdb_id'],
+         [[season, season_info['year'], season_info['episodes']] for season, season_info in show_info['seasons'].items()]]
+        for show_name, show_info in episodes.items()
+    ]
 
+def _merge_episode_rows(episodes, rows):
+    """按扫描顺序合并单个目录的结果：剧集和季以先扫描到的为准，集数取并集"""
+    for show_name, tmdb_id, seasons in rows:
+        if show_name not in episodes:
+            episodes[show_name] = {'tmdb_id': tmdb_id, 'seasons': {}}
+        for season, year, episode_numbers in seasons:
+            season_info = episodes[show_name]['seasons'].setdefault(season, {'year': year, 'episodes': []})
+            for episode in episode_numbers:
+                if episode not in season_info['episodes']:
+                    season_info['episodes'].append(episode)
+
+def scan_episodes(path, snapshot=None):
+    """扫描剧集目录；传入 snapshot 时未变化的目录直接复用上次的扫描结果"""
+    episodes = {}
+    if snapshot is not None:
+        def scan_directory(root, dirs, files):
+            directory_episodes, dependencies = scan_episode_directory(root, dirs, files)
+            return _episodes_to_rows(directory_episodes), dependencies
+
+        for rows in snapshot.walk(path, scan_directory):
+            _merge_episode_rows(episodes, rows)
+        return episodes
+
+    for root, dirs, files in get_catalog().walk(path):
+        _merge_episode_rows(episodes, _episodes_to_rows(scan_episode_directory(root, dirs, files)[0]))
     return episodes
 
+def _load_temp_table(cursor, name, columns, rows, key=None):
+    """将扫描结果写入当前连接的临时表，供集合化的插入、更新和删除使用"""
+    cursor.execute(f'DROP TABLE IF EXISTS temp.{name}')
+    cursor.execute(f'CREATE TEMP TABLE {name} ({", ".join(columns)})')
+    if key:
+        cursor.execute(f'CREATE INDEX temp.IDX_{name} ON {name} ({", ".join(key)})')
+    cursor.executemany(f'INSERT INTO temp.{name} VALUES ({", ".join("?" * len(columns))})', rows)
+
+def _parse_episodes(episodes_str, title, season):
+    """解析以逗号分隔的集数字段"""
+    # 字段为 INTEGER 类型，只有一集时会被存储为整数
+    if isinstance(episodes_str, int):
+        episodes_str = str(episodes_str)
+    if not episodes_str or not episodes_str.strip():
+        return set()
+    try:
+        return set(map(int, episodes_str.split(',')))
+    except ValueError as e:
+        logging.error(f"无法解析电视剧 '{title}' 第 {season} 季的集数: {episodes_str}. 错误: {e}")
+        return set()
+
 def insert_or_update_movies(db_path, movies):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    for title, year, tmdb_id in movies:
-        cursor.execute('SELECT id, tmdb_id FROM LIB_MOVIES WHERE title = ? AND year = ?', (title, year))
-        existing_movie = cursor.fetchone()
-        
-        if existing_movie:
-            logging.debug(f"电影 '{title} ({year})' 已存在于数据库中。")
-            existing_tmdb_id = existing_movie[1]
-            
-            # 添加调试日志
-            logging.debug(f"比较 TMDB ID: 当前值={tmdb_id}, 数据库值={existing_tmdb_id}")
-            
-            # 确保数据类型一致
-            if tmdb_id and str(tmdb_id).strip() != str(existing_tmdb_id).strip():
-                cursor.execute('UPDATE LIB_MOVIES SET tmdb_id = ? WHERE id = ?', (tmdb_id, existing_movie[0]))
-                logging.info(f"已更新电影 '{title} ({year})' 的 TMDB ID: {tmdb_id}")
-            else:
-                logging.debug(f"电影 '{title} ({year})' 的 TMDB ID 未发生变化。")
-        else:
-            cursor.execute('INSERT INTO LIB_MOVIES (title, year, tmdb_id) VALUES (?, ?, ?)', (title, year, tmdb_id))
-            logging.info(f"已将电影 '{title} ({year})' 插入数据库。")
+    _load_temp_table(cursor, 'SCAN_MOVIES', ['TITLE TEXT', 'YEAR INTEGER', 'TMDB_ID TEXT'], movies)
+    cursor.execute('''
+        SELECT DISTINCT s.TITLE, s.YEAR FROM SCAN_MOVIES s
+        WHERE NOT EXISTS (SELECT 1 FROM LIB_MOVIES m WHERE m.TITLE = s.TITLE AND m.YEAR = s.YEAR)
+    ''')
+    new_movies = cursor.fetchall()
+
+    # 已存在的电影只在扫描到不同的 TMDB ID 时更新；
+    # 未变化的行不参与 upsert，避免冲突时消耗 AUTOINCREMENT 序号
+    changes_before = conn.total_changes
+    cursor.execute('''
+        INSERT INTO LIB_MOVIES (TITLE, YEAR, TMDB_ID)
+        SELECT s.TITLE, s.YEAR, s.TMDB_ID FROM SCAN_MOVIES s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM LIB_MOVIES m WHERE m.TITLE = s.TITLE AND m.YEAR = s.YEAR
+            AND (s.TMDB_ID IS NULL OR trim(s.TMDB_ID) = '' OR trim(s.TMDB_ID) = trim(m.TMDB_ID))
+        )
+        ON CONFLICT (TITLE, YEAR) DO UPDATE SET TMDB_ID = excluded.TMDB_ID
+        WHERE trim(excluded.TMDB_ID) != '' AND trim(excluded.TMDB_ID) IS NOT trim(LIB_MOVIES.TMDB_ID)
+    ''')
+    updated = conn.total_changes - changes_before - len(new_movies)
 
     conn.commit()
     conn.close()
 
+    for title, year in new_movies:
+        logging.info(f"已将电影 '{title} ({year})' 插入数据库。")
+    if updated > 0:
+        logging.info(f"已更新 {updated} 部电影的 TMDB ID")
+
 def insert_or_update_episodes(db_path, episodes):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    for show_name, show_info in episodes.items():
-        tmdb_id = show_info['tmdb_id']
-        # 查询所有同名电视剧
-        cursor.execute('SELECT id, tmdb_id FROM LIB_TVS WHERE title = ?', (show_name,))
-        existing_tvs = cursor.fetchall()
-        
-        tv_id = None
-        if existing_tvs:
-            # 优先使用有tmdb_id的条目
-            for existing_tv in existing_tvs:
-                if existing_tv[1] is not None and existing_tv[1] != '':
-                    tv_id = existing_tv[0]
-                    logging.debug(f"电视剧 '{show_name}' 已存在于数据库中。")
-                    break
-            
-            # 如果没有tmdb_id，则使用第一个条目
-            if tv_id is None:
-                tv_id = existing_tvs[0][0]
-                # 如果扫描到tmdb_id而数据库中没有，则更新
-                if tmdb_id:
-                    cursor.execute('UPDATE LIB_TVS SET tmdb_id = ? WHERE id = ?', (tmdb_id, tv_id))
-                    logging.info(f"已更新电视剧 '{show_name}' 的 TMDB ID: {tmdb_id}")
-                
-            # 删除其他重复条目
-            if len(existing_tvs) > 1:
-                for existing_tv in existing_tvs:
-                    if existing_tv[0] != tv_id:
-                        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE tv_id = ?', (existing_tv[0],))
-                        cursor.execute('DELETE FROM LIB_TVS WHERE id = ?', (existing_tv[0],))
-                        logging.info(f"已删除重复的电视剧条目: {show_name} (ID: {existing_tv[0]})")
-        else:
-            cursor.execute('INSERT INTO LIB_TVS (title, tmdb_id) VALUES (?, ?)', (show_name, tmdb_id))
-            tv_id = cursor.lastrowid
+    _load_temp_table(cursor, 'SCAN_TVS', ['TITLE TEXT PRIMARY KEY', 'TMDB_ID TEXT'],
+                     [(show_name, show_info['tmdb_id']) for show_name, show_info in episodes.items()])
+
+    # 每部电视剧保留一个条目：优先使用有 tmdb_id 的条目，否则使用第一个条目（按年份、ID 排序）
+    cursor.execute('DROP TABLE IF EXISTS temp.SCAN_TV_IDS')
+    cursor.execute('''
+        CREATE TEMP TABLE SCAN_TV_IDS AS
+        SELECT s.TITLE, s.TMDB_ID, COALESCE(
+            (SELECT t.ID FROM LIB_TVS t WHERE t.TITLE = s.TITLE AND t.TMDB_ID IS NOT NULL AND t.TMDB_ID != ''
+             ORDER BY t.YEAR, t.ID LIMIT 1),
+            (SELECT t.ID FROM LIB_TVS t WHERE t.TITLE = s.TITLE ORDER BY t.YEAR, t.ID LIMIT 1)
+        ) AS ID
+        FROM SCAN_TVS s
+    ''')
+
+    # 保留的条目没有 tmdb_id 而本次扫描到时更新
+    cursor.execute('''
+        SELECT k.TITLE, k.TMDB_ID FROM SCAN_TV_IDS k JOIN LIB_TVS t ON t.ID = k.ID
+        WHERE k.TMDB_ID IS NOT NULL AND k.TMDB_ID != '' AND (t.TMDB_ID IS NULL OR t.TMDB_ID = '')
+    ''')
+    tmdb_updates = cursor.fetchall()
+    cursor.execute('''
+        UPDATE LIB_TVS SET TMDB_ID = (SELECT k.TMDB_ID FROM SCAN_TV_IDS k WHERE k.ID = LIB_TVS.ID)
+        WHERE ID IN (SELECT ID FROM SCAN_TV_IDS WHERE TMDB_ID IS NOT NULL AND TMDB_ID != '')
+          AND (TMDB_ID IS NULL OR TMDB_ID = '')
+    ''')
+    for show_name, tmdb_id in tmdb_updates:
+        logging.info(f"已更新电视剧 '{show_name}' 的 TMDB ID: {tmdb_id}")
+
+    # 删除其他重复条目
+    duplicates_query = 'SELECT t.ID FROM LIB_TVS t JOIN SCAN_TV_IDS k ON k.TITLE = t.TITLE WHERE t.ID != k.ID'
+    cursor.execute(f'SELECT ID, TITLE FROM LIB_TVS WHERE ID IN ({duplicates_query})')
+    duplicates = cursor.fetchall()
+    if duplicates:
+        cursor.execute(f'DELETE FROM LIB_TV_SEASONS WHERE TV_ID IN ({duplicates_query})')
+        cursor.execute(f'DELETE FROM LIB_TVS WHERE ID IN ({duplicates_query})')
+        for tv_id, show_name in duplicates:
+            logging.info(f"已删除重复的电视剧条目: {show_name} (ID: {tv_id})")
+
+    # 插入新的电视剧
+    cursor.execute('SELECT TITLE FROM SCAN_TV_IDS WHERE ID IS NULL')
+    new_shows = [row[0] for row in cursor.fetchall()]
+    if new_shows:
+        cursor.execute('INSERT INTO LIB_TVS (TITLE, TMDB_ID) SELECT TITLE, TMDB_ID FROM SCAN_TV_IDS WHERE ID IS NULL')
+        cursor.execute('''
+            UPDATE SCAN_TV_IDS SET ID = (SELECT MIN(t.ID) FROM LIB_TVS t WHERE t.TITLE = SCAN_TV_IDS.TITLE)
+            WHERE ID IS NULL
+        ''')
+        for show_name in new_shows:
             logging.info(f"已将电视剧 '{show_name}' 插入数据库。")
 
+    cursor.execute('SELECT TITLE, ID FROM SCAN_TV_IDS')
+    tv_ids = dict(cursor.fetchall())
+    cursor.execute('''
+        SELECT ID, TV_ID, SEASON, YEAR, EPISODES FROM LIB_TV_SEASONS
+        WHERE TV_ID IN (SELECT ID FROM SCAN_TV_IDS) ORDER BY ID
+    ''')
+    existing_seasons = {}
+    for row in cursor.fetchall():
+        existing_seasons.setdefault((row[1], row[2]), row)
+
+    # 集数字段只在有新增集数时重写
+    season_inserts, episode_updates, year_updates = [], [], []
+    for show_name, show_info in episodes.items():
+        tv_id = tv_ids[show_name]
         for season, season_info in show_info['seasons'].items():
             year = season_info['year']
             current_episodes = set(season_info['episodes'])
+            existing_season = existing_seasons.get((tv_id, season))
 
-            cursor.execute('SELECT id, episodes FROM LIB_TV_SEASONS WHERE tv_id = ? AND season = ?', (tv_id, season))
-            existing_season = cursor.fetchone()
-
-            if existing_season:
-                existing_episodes_str = existing_season[1]
-                logging.debug(f"现有集数字符串: {existing_episodes_str}")
-                
-                # 确保 existing_episodes_str 是字符串
-                if isinstance(existing_episodes_str, int):
-                    existing_episodes_str = str(existing_episodes_str)
-                    logging.warning(f"集数字符串被错误地存储为整数，已转换为字符串: {existing_episodes_str}")
-
-                if existing_episodes_str:  # 检查是否为空字符串
-                    existing_episodes = set(map(int, existing_episodes_str.split(',')))
-                else:
-                    existing_episodes = set()
-                    logging.debug(f"现有集数为空，初始化为空集。")
-
-                # 检查数据库中季年份是否为空，如果为空且本次扫描到季年份，则更新
-                cursor.execute('SELECT year FROM LIB_TV_SEASONS WHERE id = ?', (existing_season[0],))
-                db_year = cursor.fetchone()[0]
-                if (db_year is None or db_year == 0 or db_year == '') and year:
-                    cursor.execute('UPDATE LIB_TV_SEASONS SET year = ? WHERE id = ?', (year, existing_season[0]))
-                    logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的年份：{year}")
-
-                # 只更新新增的集数
-                new_episodes = current_episodes - existing_episodes
-                if new_episodes:
-                    updated_episodes_str = ','.join(map(str, sorted(existing_episodes.union(new_episodes))))
-                    cursor.execute('UPDATE LIB_TV_SEASONS SET episodes = ?, year = ? WHERE id = ?', (updated_episodes_str, year, existing_season[0]))
-                    logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的集数和年份：{updated_episodes_str}, {year}")
-                else:
-                    logging.debug(f"电视剧 '{show_name}' 第 {season} 季已是最新状态。")
-            else:
+            if existing_season is None:
                 episodes_str = ','.join(map(str, sorted(current_episodes)))
-                cursor.execute('INSERT INTO LIB_TV_SEASONS (tv_id, season, year, episodes) VALUES (?, ?, ?, ?)', (tv_id, season, year, episodes_str))
+                season_inserts.append((tv_id, season, year, episodes_str))
                 logging.info(f"已将电视剧 '{show_name}' 第 {season} 季的集数 {episodes_str} 和年份 {year} 插入数据库。")
+                continue
+
+            season_id, _, _, db_year, existing_episodes_str = existing_season
+            existing_episodes = _parse_episodes(existing_episodes_str, show_name, season)
+            new_episodes = current_episodes - existing_episodes
+            if new_episodes:
+                updated_episodes_str = ','.join(map(str, sorted(existing_episodes.union(new_episodes))))
+                episode_updates.append((updated_episodes_str, year, season_id))
+                logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的集数和年份：{updated_episodes_str}, {year}")
+            elif (db_year is None or db_year == 0 or db_year == '') and year:
+                # 数据库中季年份为空且本次扫描到季年份时更新
+                year_updates.append((year, season_id))
+                logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的年份：{year}")
+
+    cursor.executemany('INSERT INTO LIB_TV_SEASONS (TV_ID, SEASON, YEAR, EPISODES) VALUES (?, ?, ?, ?)', season_inserts)
+    cursor.executemany('UPDATE LIB_TV_SEASONS SET EPISODES = ?, YEAR = ? WHERE ID = ?', episode_updates)
+    cursor.executemany('UPDATE LIB_TV_SEASONS SET YEAR = ? WHERE ID = ?', year_updates)
 
     conn.commit()
     conn.close()
 
-def delete_obsolete_movies(db_path, current_movies):
+def delete_obsolete_movies(db_path, current_movies, only=None):
+    # only 为 (标题, 年份) 集合时只检查这些电影
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute('SELECT title, year FROM LIB_MOVIES')
-    all_movies = cursor.fetchall()
-
-    # 将 current_movies 转换为 {(title, year)} 集合，并确保 year 是整数类型
-    current_movies_set = {(title, int(year)) for title, year, _ in current_movies}
+    _load_temp_table(cursor, 'SCAN_MOVIES', ['TITLE TEXT', 'YEAR INTEGER'],
+                     [(title, int(year)) for title, year, _ in current_movies], key=('TITLE', 'YEAR'))
+    condition = 'NOT EXISTS (SELECT 1 FROM SCAN_MOVIES s WHERE s.TITLE = LIB_MOVIES.TITLE AND s.YEAR = LIB_MOVIES.YEAR)'
+    if only is not None:
+        _load_temp_table(cursor, 'SCAN_ONLY', ['TITLE TEXT', 'YEAR INTEGER'], list(only), key=('TITLE', 'YEAR'))
+        condition += ' AND EXISTS (SELECT 1 FROM SCAN_ONLY o WHERE o.TITLE = LIB_MOVIES.TITLE AND o.YEAR = LIB_MOVIES.YEAR)'
 
-    for title, year in all_movies:
-        if (title, year) not in current_movies_set:
-            cursor.execute('DELETE FROM LIB_MOVIES WHERE title = ? AND year = ?', (title, year))
-            logging.info(f"已从数据库中删除电影 '{title} ({year})'。")
+    cursor.execute(f'SELECT TITLE, YEAR FROM LIB_MOVIES WHERE {condition}')
+    obsolete_movies = cursor.fetchall()
+    if obsolete_movies:
+        cursor.execute(f'DELETE FROM LIB_MOVIES WHERE {condition}')
 
     conn.commit()
     conn.close()
 
-def delete_obsolete_episodes(db_path, current_episodes):
+    for title, year in obsolete_movies:
+        logging.info(f"已从数据库中删除电影 '{title} ({year})'。")
+
+def delete_obsolete_episodes(db_path, current_episodes, only=None):
+    # only 为剧名集合时只检查这些电视剧
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute('SELECT id, title FROM LIB_TVS')
-    all_shows = cursor.fetchall()
-
-    for tv_id, title in all_shows:
-        if title not in current_episodes:
-            cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE tv_id = ?', (tv_id,))
-            cursor.execute('DELETE FROM LIB_TVS WHERE id = ?', (tv_id,))
+    _load_temp_table(cursor, 'SCAN_TVS', ['TITLE TEXT PRIMARY KEY'], [(title,) for title in current_episodes])
+    scope = ''
+    if only is not None:
+        _load_temp_table(cursor, 'SCAN_ONLY', ['TITLE TEXT PRIMARY KEY'], [(title,) for title in only])
+        scope = ' AND TITLE IN (SELECT TITLE FROM SCAN_ONLY)'
+
+    # 删除已不存在的电视剧及其所有季
+    obsolete_query = f'SELECT ID FROM LIB_TVS WHERE TITLE NOT IN (SELECT TITLE FROM SCAN_TVS){scope}'
+    cursor.execute(f'SELECT ID, TITLE FROM LIB_TVS WHERE ID IN ({obsolete_query})')
+    obsolete_shows = cursor.fetchall()
+    if obsolete_shows:
+        cursor.execute(f'DELETE FROM LIB_TV_SEASONS WHERE TV_ID IN ({obsolete_query})')
+        cursor.execute(f'DELETE FROM LIB_TVS WHERE ID IN ({obsolete_query})')
+        for _, title in obsolete_shows:
             logging.info(f"已从数据库中删除电视剧 '{title}' 及其所有季。")
+
+    # 移除已删除的集数
+    cursor.execute(f'''
+        SELECT s.ID, t.TITLE, s.SEASON, s.EPISODES FROM LIB_TV_SEASONS s JOIN LIB_TVS t ON t.ID = s.TV_ID
+        WHERE t.ID IN (SELECT ID FROM LIB_TVS WHERE TITLE IN (SELECT TITLE FROM SCAN_TVS){scope})
+    ''')
+    episode_updates, season_deletes = [], []
+    for season_id, title, season, episodes_str in cursor.fetchall():
+        if isinstance(episodes_str, int):
+            logging.warning(f"电视剧 '{title}' 第 {season} 季的集数字段为整数，已转换为字符串: {episodes_str}")
+        existing_episodes = _parse_episodes(episodes_str, title, season)
+        if not existing_episodes:
+            logging.warning(f"电视剧 '{title}' 第 {season} 季的集数为空，初始化为空集。")
+
+        # 获取当前扫描到的集数，如果不存在则默认为空集
+        current_episodes_for_season = current_episodes.get(title, {}).get('seasons', {}).get(season, {}).get('episodes', [])
+        removed_episodes = existing_episodes - set(current_episodes_for_season)
+        if not removed_episodes:
+            continue
+        updated_episodes = existing_episodes - removed_episodes
+        if updated_episodes:
+            episode_updates.append((','.join(map(str, sorted(updated_episodes))), season_id))
+            logging.info(f"已从电视剧 '{title}' 第 {season} 季中移除集数: {sorted(removed_episodes)}")
         else:
-            cursor.execute('SELECT id, season, episodes FROM LIB_TV_SEASONS WHERE tv_id = ?', (tv_id,))
-            all_seasons = cursor.fetchall()
-
-            for season_id, season, episodes_str in all_seasons:
-                # 类型检查，确保 episodes_str 是字符串
-                if isinstance(episodes_str, int):
-                    episodes_str = str(episodes_str)
-                    logging.warning(f"电视剧 '{title}' 第 {season} 季的集数字段为整数，已转换为字符串: {episodes_str}")
-
-                # 检查 episodes_str 是否为空字符串
-                if not episodes_str or not episodes_str.strip():
-                    existing_episodes = set()
-                    logging.warning(f"电视剧 '{title}' 第 {season} 季的集数为空，初始化为空集。")
-                else:
-                    try:
-                        existing_episodes = set(map(int, episodes_str.split(',')))
-                    except ValueError as e:
-                        logging.error(f"无法解析电视剧 '{title}' 第 {season} 季的集数: {episodes_str}. 错误: {e}")
-                        existing_episodes = set()
-
-                # 获取当前扫描到的集数，如果不存在则默认为空集
-                current_episodes_for_season = current_episodes.get(title, {}).get('seasons', {}).get(season, {}).get('episodes', [])
-                current_episodes_set = set(current_episodes_for_season)
-
-                # 检查是否有集数被删除
-                removed_episodes = existing_episodes - current_episodes_set
-                if removed_episodes:
-                    # 从数据库中移除被删除的集数
-                    updated_episodes = existing_episodes - removed_episodes
-                    if updated_episodes:
-                        updated_episodes_str = ','.join(map(str, sorted(updated_episodes)))
-                        cursor.execute('UPDATE LIB_TV_SEASONS SET episodes = ? WHERE id = ?', (updated_episodes_str, season_id))
-                        logging.info(f"已从电视剧 '{title}' 第 {season} 季中移除集数: {sorted(removed_episodes)}")
-                    else:
-                        # 如果该季所有集数都被删除，则删除该季记录
-                        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE id = ?', (season_id,))
-                        logging.info(f"电视剧 '{title}' 第 {season} 季所有集数已被删除，移除该季记录。")
-                else:
-                    logging.debug(f"电视剧 '{title}' 第 {season} 季没有集数被删除。")
+            # 如果该季所有集数都被删除，则删除该季记录
+            season_deletes.append((season_id,))
+            logging.info(f"电视剧 '{title}' 第 {season} 季所有集数已被删除，移除该季记录。")
+
+    cursor.executemany('UPDATE LIB_TV_SEASONS SET EPISODES = ? WHERE ID = ?', episode_updates)
+    cursor.executemany('DELETE FROM LIB_TV_SEASONS WHERE ID = ?', season_deletes)
 
     conn.commit()
     conn.close()
 
-def update_tv_year(base_path, db_path):
+def update_tv_year(base_path, db_path, only=None):
+    # only 为目录名集合时只处理这些剧集目录
     # 正则表达式用于匹配电视剧标题和年份
     pattern = re.compile(r'^(.*)\s+\((\d{4})\)')
     
@@ -393,7 +478,8 @@ def update_tv_year(base_path, db_path):
             return []
         
         # 获取所有文件夹名称
-        directories = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
+        directories = [name for name in os.listdir(path)
+                       if (only is None or name in only) and os.path.isdir(os.path.join(path, name))]
         
         # 解析每个文件夹名称
         shows = []
@@ -410,35 +496,32 @@ def update_tv_year(base_path, db_path):
         # 连接到数据库
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
-        
-        # 更新数据库中的记录
-        for show in shows:
-            title = show['title']
-            year = show['year']
-            
-            # 查询数据库中是否存在相同的标题和年份
-            cursor.execute("SELECT id FROM LIB_TVS WHERE title = ? AND year = ?", (title, year))
-            result = cursor.fetchone()
-            
-            if result:
-                logging.debug(f"已存在相同数据，跳过更新：{title} ({year})")
-            else:
-                # 查询数据库中是否存在相同的标题
-                cursor.execute("SELECT id FROM LIB_TVS WHERE title = ?", (title,))
-                result = cursor.fetchone()
-                
-                if result:
-                    show_id = result[0]
-                    # 更新年份
-                    cursor.execute("UPDATE LIB_TVS SET year = ? WHERE id = ?", (year, show_id))
-                    logging.info(f"更新 {title} 的年份：{year}")
-                else:
-                    logging.warning(f"没有匹配条目：{title}")
+
+        # 同名目录有多个时以最后一个的年份为准
+        years = {show['title']: show['year'] for show in shows}
+        _load_temp_table(cursor, 'SCAN_TV_YEARS', ['TITLE TEXT PRIMARY KEY', 'YEAR INTEGER'], list(years.items()))
+
+        cursor.execute('SELECT TITLE FROM SCAN_TV_YEARS WHERE TITLE NOT IN (SELECT TITLE FROM LIB_TVS)')
+        for (title,) in cursor.fetchall():
+            logging.warning(f"没有匹配条目：{title}")
+
+        # 不存在相同标题和年份的条目时，更新第一个同名条目（按年份、ID 排序）的年份
+        cursor.execute('''
+            SELECT (SELECT t.ID FROM LIB_TVS t WHERE t.TITLE = y.TITLE ORDER BY t.YEAR, t.ID LIMIT 1), y.TITLE, y.YEAR
+            FROM SCAN_TV_YEARS y
+            WHERE y.TITLE IN (SELECT TITLE FROM LIB_TVS)
+              AND NOT EXISTS (SELECT 1 FROM LIB_TVS e WHERE e.TITLE = y.TITLE AND e.YEAR = y.YEAR)
+        ''')
+        updates = cursor.fetchall()
+        cursor.executemany("UPDATE LIB_TVS SET YEAR = ? WHERE ID = ?", [(year, show_id) for show_id, _, year in updates])
 
         # 提交并关闭数据库连接
         conn.commit()
         conn.close()
 
+        for _, title, year in updates:
+            logging.info(f"更新 {title} 的年份：{year}")
+
     # 扫描目录并提取信息
     shows = scan_directories(base_path)
     
@@ -503,9 +586,79 @@ def clean_duplicate_tvs(db_path):
     conn.commit()
     conn.close()
 
-def main():
+def _count_rows(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+def movies_match_database(db_path, movies):
+    """数据库中的电影数与扫描结果一致（记录在扫描程序之外被增删时需要完整比对）"""
+    expected = len({(title, int(year)) for title, year, _ in movies})
+    actual = _count_rows(db_path, 'LIB_MOVIES')
+    if actual != expected:
+        logging.info(f"数据库中有 {actual} 部电影，扫描结果为 {expected} 部，执行完整比对")
+        return False
+    return True
+
+def episodes_match_database(db_path, all_episodes):
+    """数据库中的电视剧数和季数与扫描结果一致"""
+    expected = (len(all_episodes), sum(len(show_info['seasons']) for show_info in all_episodes.values()))
+    actual = (_count_rows(db_path, 'LIB_TVS'), _count_rows(db_path, 'LIB_TV_SEASONS'))
+    if actual != expected:
+        logging.info(f"数据库中有 {actual[0]} 部电视剧、{actual[1]} 季，扫描结果为 {expected[0]} 部、{expected[1]} 季，执行完整比对")
+        return False
+    return True
+
+def apply_movie_changes(db_path, movies, changes):
+    """只将目录快照中发生变化的目录同步到数据库"""
+    added = [tuple(movie) for _, new in changes if new for movie in new]
+    removed = {(movie[0], movie[1]) for old, _ in changes if old for movie in old}
+    if added:
+        insert_or_update_movies(db_path, added)
+    if removed:
+        delete_obsolete_movies(db_path, movies, only=removed)
+    logging.info(f"电影目录变化 {len(changes)} 处，新增或更新 {len(added)} 部，待核对删除 {len(removed)} 部")
+
+def apply_episode_changes(db_path, all_episodes, changes):
+    """只将目录快照中涉及变化的电视剧同步到数据库"""
+    show_names = {row[0] for change in changes for rows in change if rows for row in rows}
+    changed = {name: all_episodes[name] for name in show_names if name in all_episodes}
+    if changed:
+        insert_or_update_episodes(db_path, changed)
+    if show_names:
+        delete_obsolete_episodes(db_path, all_episodes, only=show_names)
+    logging.info(f"剧集目录变化 {len(changes)} 处，涉及 {len(show_names)} 部电视剧")
+
+def scan_scoped(db_path, scope):
+    """只扫描指定的影视目录并更新数据库，不删除范围外的记录"""
+    movies = []
+    for path in scope.get("movie", []):
+        if os.path.exists(path):
+            movies.extend(scan_movies(path))
+    if movies:
+        insert_or_update_movies(db_path, movies)
+
+    all_episodes = {}
+    for path in scope.get("tv", []):
+        if os.path.exists(path):
+            all_episodes.update(scan_episodes(path))
+    if all_episodes:
+        insert_or_update_episodes(db_path, all_episodes)
+        # 年份从剧集目录名解析，只处理本次范围内的剧集目录
+        for path in scope.get("tv", []):
+            update_tv_year(os.path.dirname(path), db_path, only={os.path.basename(path)})
+        clean_duplicate_tvs(db_path)
+    logging.info(f"已扫描 {len(scope.get('movie', []))} 个电影目录、{len(scope.get('tv', []))} 个剧集目录")
+
+def main(config=None, scope=None):
     db_path = '/config/data.db'
-    config = load_config(db_path)
+    if config is None:
+        config = load_config(db_path)
+    if scope is None:
+        scope = trigger_bus.path_scope_from_env()
+    if scope:
+        scan_scoped(db_path, scope)
+        get_catalog().flush()
+        return
     movies_path = config['movies_path']
     episodes_path = config['episodes_path']
     anime_path = config.get('anime_path', episodes_path)  # 如果没有设置动漫路径，则使用电视剧路径
@@ -513,20 +666,30 @@ def main():
 
     # 扫描电影目录
     if os.path.exists(movies_path):
-        movies = scan_movies(movies_path)
-        # 插入或更新电影数据
-        insert_or_update_movies(db_path, movies)
-        # 删除数据库中多余的电影记录
-        delete_obsolete_movies(db_path, movies)
+        movie_snapshot = LibrarySnapshot(db_path, 'movies')
+        covered = movie_snapshot.covers(movies_path)
+        movies = scan_movies(movies_path, movie_snapshot)
+        # 只同步变化的目录；首次扫描或同步后数据库记录与扫描结果不一致（记录被外部修改）时完整比对
+        if covered:
+            apply_movie_changes(db_path, movies, movie_snapshot.changes)
+        if not covered or not movies_match_database(db_path, movies):
+            # 插入或更新电影数据
+            insert_or_update_movies(db_path, movies)
+            # 删除数据库中多余的电影记录
+            delete_obsolete_movies(db_path, movies)
+        movie_snapshot.save()
     else:
         logging.warning(f"电影目录不存在: {movies_path}")
 
     # 收集所有电视剧类型的媒体（电视剧、动漫、综艺）
     all_episodes = {}
+    tv_snapshot = LibrarySnapshot(db_path, 'tv')
+    covered = all(tv_snapshot.covers(path) for path in {episodes_path, anime_path, variety_path}
+                  if os.path.exists(path))
 
     # 扫描电视剧目录
     if os.path.exists(episodes_path):
-        episodes = scan_episodes(episodes_path)
+        episodes = scan_episodes(episodes_path, tv_snapshot)
         # 合并到all_episodes
         for show_name, show_info in episodes.items():
             all_episodes[show_name] = show_info
@@ -535,7 +698,7 @@ def main():
 
     # 扫描动漫目录
     if os.path.exists(anime_path) and anime_path != episodes_path:
-        anime_episodes = scan_episodes(anime_path)
+        anime_episodes = scan_episodes(anime_path, tv_snapshot)
         # 合并到all_episodes
         for show_name, show_info in anime_episodes.items():
             all_episodes[show_name] = show_info
@@ -544,7 +707,7 @@ def main():
 
     # 扫描综艺目录
     if os.path.exists(variety_path) and variety_path != episodes_path:
-        variety_episodes = scan_episodes(variety_path)
+        variety_episodes = scan_episodes(variety_path, tv_snapshot)
         # 合并到all_episodes
         for show_name, show_info in variety_episodes.items():
             all_episodes[show_name] = show_info
@@ -553,9 +716,13 @@ def main():
 
     # 插入或更新电视剧数据
     if all_episodes:
-        insert_or_update_episodes(db_path, all_episodes)
-        # 删除数据库中多余的电视剧记录
-        delete_obsolete_episodes(db_path, all_episodes)
+        if covered:
+            apply_episode_changes(db_path, all_episodes, tv_snapshot.changes)
+        if not covered or not episodes_match_database(db_path, all_episodes):
+            insert_or_update_episodes(db_path, all_episodes)
+            # 删除数据库中多余的电视剧记录
+            delete_obsolete_episodes(db_path, all_episodes)
+    tv_snapshot.save()
     
     # 更新电视剧年份信息（对所有目录进行操作）
     if os.path.exists(episodes_path):
@@ -567,6 +734,7 @@ def main():
 
     # 在处理完所有扫描逻辑后，执行数据清理
     clean_duplicate_tvs(db_path)
+    get_catalog().flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
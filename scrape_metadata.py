@@ -1,13 +1,19 @@
 import os
 import re
+import queue
 import sqlite3
 import logging
+import uuid
+import threading
 import requests
+import trigger_bus
+from concurrent.futures import ThreadPoolExecutor, Future
+from tmdb_cache import tmdb_get
+from http_engine import PoliteSession
+from library_catalog import get_catalog
 import xml.etree.ElementTree as ET
 import xml.dom.minidom
 from datetime import datetime
-import time
-import random
 
 # 配置日志
 logging.basicConfig(
@@ -22,6 +28,19 @@ logging.basicConfig(
 """ 全局缓存：(title, year, media_type) -> tmdb_id """
 tmdb_id_cache = {}
 
+# 同时向 TMDB 查询元数据的线程数及请求速率（次/秒）
+TMDB_FETCH_WORKERS = 6
+TMDB_RATE_PER_SECOND = 10.0
+TMDB_BURST = 10
+# 同时下载图片的线程数及请求速率（次/秒）
+IMAGE_DOWNLOAD_WORKERS = 4
+IMAGE_RATE_PER_SECOND = 20.0
+IMAGE_BURST = 8
+# 图片下载的分块大小（字节）
+IMAGE_CHUNK_SIZE = 1024 * 1024
+# 已提交但尚未写入 NFO 的条目数上限，超出时遍历线程等待
+MAX_PENDING_ITEMS = 64
+
 def load_config(db_path):
     """从数据库中加载配置"""
     try:
@@ -36,7 +55,7 @@ def load_config(db_path):
         logging.error(f"数据库加载配置错误: {e}")
         exit(0)
 
-def get_movie_info_from_tmdb(tmdb_id, config):
+def get_movie_info_from_tmdb(tmdb_id, config, session=None):
     """通过TMDB API获取详细电影信息"""
     TMDB_API_KEY = config['tmdb_api_key']
     TMDB_BASE_URL = config['tmdb_base_url']
@@ -47,7 +66,7 @@ def get_movie_info_from_tmdb(tmdb_id, config):
         'append_to_response': 'credits,keywords,images'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = tmdb_get(url, params=params, timeout=10, session=session)
         resp.raise_for_status()
         data = resp.json()
         info = {
@@ -131,7 +150,7 @@ def get_movie_info_from_tmdb(tmdb_id, config):
         logging.error(f"获取TMDB详细信息失败: {e}")
         return None
 
-def get_tv_info_from_tmdb(tmdb_id, config):
+def get_tv_info_from_tmdb(tmdb_id, config, session=None):
     """通过TMDB API获取详细剧集信息"""
     TMDB_API_KEY = config['tmdb_api_key']
     TMDB_BASE_URL = config['tmdb_base_url']
@@ -142,7 +161,7 @@ def get_tv_info_from_tmdb(tmdb_id, config):
         'append_to_response': 'credits,external_ids,images,keywords'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = tmdb_get(url, params=params, timeout=10, session=session)
         resp.raise_for_status()
         data = resp.json()
         info = {
@@ -240,7 +259,7 @@ def get_tv_info_from_tmdb(tmdb_id, config):
         logging.error(f"获取TMDB剧集详细信息失败: {e}")
         return None
 
-def get_episode_info_from_tmdb(tv_id, season_num, episode_num, config):
+def get_episode_info_from_tmdb(tv_id, season_num, episode_num, config, session=None):
     """通过TMDB API获取单集详细信息"""
     TMDB_API_KEY = config['tmdb_api_key']
     TMDB_BASE_URL = config['tmdb_base_url']
@@ -251,7 +270,7 @@ def get_episode_info_from_tmdb(tv_id, season_num, episode_num, config):
         'append_to_response': 'credits'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = tmdb_get(url, params=params, timeout=10, session=session)
         resp.raise_for_status()
         data = resp.json()
         info = {
@@ -329,10 +348,6 @@ def write_pretty_xml(root, nfo_path):
     with open(nfo_path, "wb") as f:
         f.write(pretty_xml)
         logging.debug(f"已保存 NFO 文件: {nfo_path}")
-        # 添加随机休眠
-        sleep_time = random.uniform(5, 10)
-        logging.debug(f"随机休眠 {sleep_time:.2f} 秒，避免频繁请求 API")
-        time.sleep(sleep_time)
 
 def _convert_node(element, doc):
     """递归将 ElementTree 节点转换为 minidom 节点"""
@@ -358,24 +373,43 @@ def _convert_node(element, doc):
 
     return node
 
-def download_image(url, save_path):
-    """下载图片并保存"""
+def download_image(url, save_path, session=None):
+    """下载图片并保存：先写入同目录下唯一的隐藏临时文件，完整下载后再重命名"""
+    directory, name = os.path.split(save_path)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
     try:
-        response = requests.get(url, stream=True, timeout=10)
-        if response.status_code == 200:
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            logging.info(f"图片已保存: {save_path}")
-            return True
-        else:
-            logging.warning(f"下载失败，状态码: {response.status_code} - {url}")
+        with (session or requests).get(url, stream=True, timeout=10) as response:
+            if response.status_code == 200:
+                with open(temp_path, 'xb') as f:
+                    for chunk in response.iter_content(IMAGE_CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(temp_path, save_path)
+                logging.info(f"图片已保存: {save_path}")
+                return True
+            else:
+                logging.warning(f"下载失败，状态码: {response.status_code} - {url}")
     except Exception as e:
         logging.error(f"下载图片时出错: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
     return False
 
+def artwork_downloads(media_dir, info, config):
+    """返回需要下载的图片 [(url, 保存路径)]：根据配置选取海报、背景图和ClearLogo，已存在的图片不再下载"""
+    downloads = []
+    for option, key, filename in (('scrape_poster', 'poster', 'poster.jpg'),
+                                  ('scrape_fanart', 'fanart', 'fanart.jpg'),
+                                  ('scrape_clearlogo', 'clearlogo', 'clearlogo.png')):
+        if config.get(option, 'True') != 'True' or not info.get(key):
+            continue
+        save_path = os.path.join(media_dir, filename)
+        if not os.path.exists(save_path):
+            downloads.append((info[key], save_path))
+    return downloads
+
 def generate_movie_nfo(nfo_path, info, config):
-    """生成电影NFO文件，info为包含所有字段的dict"""
+    """生成电影NFO文件，info为包含所有字段的dict（图片见 artwork_downloads）"""
     root = ET.Element("movie")
     
     # 根据配置决定是否刮削剧情简介
@@ -476,37 +510,11 @@ def generate_movie_nfo(nfo_path, info, config):
             fanart_thumb = ET.SubElement(fanart_el, "thumb")
             fanart_thumb.text = info["fanart"]
             
-    movie_dir = os.path.dirname(nfo_path)
-    
-    # 下载海报
-    if config.get('scrape_poster', 'True') == 'True':
-        poster_url = info.get("poster")
-        if poster_url:
-            poster_path = os.path.join(movie_dir, "poster.jpg")
-            if not os.path.exists(poster_path):
-                download_image(poster_url, poster_path)
-                
-    # 下载背景图
-    if config.get('scrape_fanart', 'True') == 'True':
-        fanart_url = info.get("fanart")
-        if fanart_url:
-            fanart_path = os.path.join(movie_dir, "fanart.jpg")
-            if not os.path.exists(fanart_path):
-                download_image(fanart_url, fanart_path)
-                
-    # 下载ClearLogo
-    if config.get('scrape_clearlogo', 'True') == 'True':
-        clearlogo_url = info.get("clearlogo")
-        if clearlogo_url:
-            clearlogo_path = os.path.join(movie_dir, "clearlogo.png")
-            if not os.path.exists(clearlogo_path):
-                download_image(clearlogo_url, clearlogo_path)
-                
     logging.info(f"生成影片NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
 def generate_tvshow_nfo(nfo_path, info, config):
-    """生成剧集NFO文件，info为包含所有字段的dict"""
+    """生成剧集NFO文件，info为包含所有字段的dict（图片见 artwork_downloads）"""
     root = ET.Element("tvshow")
     
     # 根据配置决定是否刮削剧情简介
@@ -621,32 +629,6 @@ def generate_tvshow_nfo(nfo_path, info, config):
     if info.get("namedseason"):
         ET.SubElement(root, "namedseason", number="1").text = info["namedseason"]
         
-    tv_dir = os.path.dirname(nfo_path)
-    
-    # 下载海报
-    if config.get('scrape_poster', 'True') == 'True':
-        poster_url = info.get("poster")
-        if poster_url:
-            poster_path = os.path.join(tv_dir, "poster.jpg")
-            if not os.path.exists(poster_path):
-                download_image(poster_url, poster_path)
-                
-    # 下载背景图
-    if config.get('scrape_fanart', 'True') == 'True':
-        fanart_url = info.get("fanart")
-        if fanart_url:
-            fanart_path = os.path.join(tv_dir, "fanart.jpg")
-            if not os.path.exists(fanart_path):
-                download_image(fanart_url, fanart_path)
-                
-    # 下载ClearLogo
-    if config.get('scrape_clearlogo', 'True') == 'True':
-        clearlogo_url = info.get("clearlogo")
-        if clearlogo_url:
-            clearlogo_path = os.path.join(tv_dir, "clearlogo.png")
-            if not os.path.exists(clearlogo_path):
-                download_image(clearlogo_url, clearlogo_path)
-                
     logging.info(f"生成剧集NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
@@ -752,21 +734,230 @@ def generate_episode_nfo(nfo_path, episode_info):
     logging.info(f"生成集NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
-def scan_metadata(path, config, path_type):
+class ScrapePipeline:
+    """
+    元数据刮削流水线。
+    遍历线程通过 submit 提交缺少 NFO 的条目；TMDB 线程池共用一个限速会话查询 tmdb_id 和详细信息，
+    同一部剧的查询在本次运行中只发起一次；图片线程池复用 keep-alive 连接并行下载海报、背景图和ClearLogo；
+    单独的写入线程生成 NFO 文件。同一条目的图片下载完成后才写入 NFO（NFO 存在即视为已刮削）。
+    同一目录下的多个条目（同一电影的多个版本、平铺的电影目录）共用图片文件，每个图片路径只由第一个条目下载，
+    其他条目等该图片下载结束后再写入 NFO；下载失败时释放认领，之后的条目重新下载。
+    """
+    def __init__(self, config, fetch_workers=TMDB_FETCH_WORKERS, image_workers=IMAGE_DOWNLOAD_WORKERS,
+                 max_pending=MAX_PENDING_ITEMS):
+        self.config = config
+        # 线程名以当前线程名为前缀，流水线按阶段线程名归集日志
+        prefix = threading.current_thread().name
+        self.api_session = PoliteSession(host_concurrency=fetch_workers, rate_per_second=TMDB_RATE_PER_SECOND,
+                                         burst=TMDB_BURST)
+        self.image_session = PoliteSession(host_concurrency=image_workers, rate_per_second=IMAGE_RATE_PER_SECOND,
+                                           burst=IMAGE_BURST)
+        self._fetch_pool = ThreadPoolExecutor(max_workers=max(1, fetch_workers), thread_name_prefix=f"{prefix}-tmdb")
+        self._image_pool = ThreadPoolExecutor(max_workers=max(1, image_workers), thread_name_prefix=f"{prefix}-image")
+        self._writes = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+        self._claimed_images = {}  # 图片保存路径 -> 下载结果的 Future
+        self._claimed_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name=f"{prefix}-writer", daemon=True)
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, job):
+        """
+        提交待刮削条目（dict）：kind 为 movie / tvshow / season / episode，nfo_path 为要生成的 NFO 路径，
+        movie/tvshow/season 另含 title、year（season 另含 season_number），
+        episode 另含 candidates（按从近到远排列的上级剧集目录 (标题, 年份)）、season、episode、file。
+        待处理条目过多时阻塞等待。
+        """
+        self._slots.acquire()
+        self._fetch_pool.submit(self._fetch, job)
+
+    def close(self):
+        """等待已提交的条目全部处理完毕"""
+        self._fetch_pool.shutdown(wait=True)
+        self._image_pool.shutdown(wait=True)
+        self._writes.put(None)
+        self._writer.join()
+        self.api_session.close()
+        self.image_session.close()
+
+    def _once(self, key, func, *args):
+        """同一 key 只调用一次 func，并发的相同请求等待首次调用的结果；结果为 None 时不保留，之后的请求重新调用"""
+        with self._memo_lock:
+            future = self._memo.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._memo[key] = future
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            if future.exception() is not None or future.result() is None:
+                with self._memo_lock:
+                    self._memo.pop(key, None)
+        return future.result()
+
+    def _lookup_tmdb_id(self, title, year, media_type):
+        tmdb_id = query_tmdb_id(title, year, media_type, self.config)
+        if not tmdb_id:
+            tmdb_id = query_tmdb_api(title, year, media_type, self.config, session=self.api_session)
+        return tmdb_id
+
+    def _tmdb_id(self, title, year, media_type):
+        return self._once(('id', title, year, media_type), self._lookup_tmdb_id, title, year, media_type)
+
+    def _tv_info(self, tmdb_id):
+        return self._once(('tv', tmdb_id), get_tv_info_from_tmdb, tmdb_id, self.config, self.api_session)
+
+    def _resolve(self, job):
+        """查询条目的元数据，返回 NFO 内容所需的信息，找不到时返回 None"""
+        kind = job["kind"]
+        if kind == 'movie':
+            tmdb_id = self._tmdb_id(job["title"], job["year"], 'movie')
+            if not tmdb_id:
+                logging.warning(f"未找到TMDB_ID: {job['title']} ({job['year']})，跳过NFO生成")
+                return None
+            return get_movie_info_from_tmdb(tmdb_id, self.config, session=self.api_session)
+        if kind in ('tvshow', 'season'):
+            tmdb_id = self._tmdb_id(job["title"], job["year"], 'tv')
+            return self._tv_info(tmdb_id) if tmdb_id else None
+
+        info = None
+        for tv_name, tv_year in job["candidates"]:
+            tmdb_id = self._tmdb_id(tv_name, tv_year, 'tv')
+            if tmdb_id:
+                info = self._tv_info(tmdb_id)
+                break
+        if not info:
+            logging.warning(f"未找到TMDB_ID，跳过NFO生成: {job['file']}")
+            return None
+        episode_info = get_episode_info_from_tmdb(info["tmdbid"], job["season"], job["episode"], self.config,
+                                                  session=self.api_session)
+        if episode_info:
+            episode_info["showtitle"] = info.get("showtitle", info.get("title", ""))
+            episode_info["original_filename"] = job["file"]
+            if not episode_info.get("studio"):
+                episode_info["studio"] = info.get("studios", [""])[0] if info.get("studios") else ""
+        return episode_info
+
+    def _claim_downloads(self, downloads):
+        """
+        认领图片下载，返回 (由本条目下载的 [(url, 保存路径, Future)], 需等待其他条目下载完成的 Future 列表)。
+        """
+        owned, waits = [], []
+        with self._claimed_lock:
+            for url, save_path in downloads:
+                future = self._claimed_images.get(save_path)
+                if future is None:
+                    future = Future()
+                    self._claimed_images[save_path] = future
+                    owned.append((url, save_path, future))
+                else:
+                    waits.append(future)
+        return owned, waits
+
+    def _write_after(self, futures, job):
+        """futures 全部完成后将条目交给写入线程（在完成回调中提交，不占用线程等待）"""
+        if not futures:
+            self._writes.put(job)
+            return
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._writes.put(job)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _fetch(self, job):
+        try:
+            info = self._resolve(job)
+            if not info:
+                self._slots.release()
+                return
+            job["info"] = info
+            owned, waits = [], []
+            if job["kind"] in ('movie', 'tvshow'):
+                owned, waits = self._claim_downloads(
+                    artwork_downloads(os.path.dirname(job["nfo_path"]), info, self.config))
+            if owned:
+                self._image_pool.submit(self._download, job, owned, waits)
+            else:
+                self._write_after(waits, job)
+        except Exception as e:
+            logging.error(f"查询元数据时出错 {job['nfo_path']}: {e}")
+            self._slots.release()
+
+    def _download(self, job, owned, waits):
+        try:
+            for url, save_path, future in owned:
+                try:
+                    saved = download_image(url, save_path, session=self.image_session)
+                except Exception as e:
+                    logging.error(f"下载图片时出错: {e}")
+                    saved = False
+                if not saved:
+                    # 释放认领，之后的条目可以重新下载
+                    with self._claimed_lock:
+                        if self._claimed_images.get(save_path) is future:
+                            del self._claimed_images[save_path]
+                future.set_result(saved)
+        finally:
+            self._write_after(waits, job)
+
+    def _write_loop(self):
+        while True:
+            job = self._writes.get()
+            if job is None:
+                return
+            try:
+                kind, nfo_path, info = job["kind"], job["nfo_path"], job["info"]
+                if kind == 'movie':
+                    generate_movie_nfo(nfo_path, info, self.config)
+                elif kind == 'tvshow':
+                    generate_tvshow_nfo(nfo_path, info, self.config)
+                elif kind == 'season':
+                    generate_season_nfo(nfo_path, info, season_number=job["season_number"])
+                else:
+                    generate_episode_nfo(nfo_path, info)
+            except Exception as e:
+                logging.error(f"生成NFO文件时出错 {job['nfo_path']}: {e}")
+            finally:
+                self._slots.release()
+
+def scan_metadata(path, config, path_type, pipeline=None):
     """扫描指定路径下的媒体文件，只生成缺失的NFO文件（区分电影/剧集路径）"""
+    if pipeline is None:
+        with ScrapePipeline(config) as pipeline:
+            return scan_metadata(path, config, path_type, pipeline=pipeline)
+
     media_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso']
     
-    for root, dirs, files in os.walk(path):
+    for root, dirs, files in get_catalog().walk(path):
         if path_type == 'movie':
             # 仅处理电影文件，不执行任何剧集相关逻辑
-            process_movies(root, files, media_extensions, config)
+            process_movies(root, files, media_extensions, pipeline)
         elif path_type == 'tv':
             # 仅处理剧集相关逻辑，不执行电影处理逻辑
-            process_tvshow_directory(root, dirs, config)
-            process_season_directory(root, dirs, config)
-            process_episode_files(root, files, media_extensions, config)
+            process_tvshow_directory(root, files, pipeline)
+            process_season_directory(root, files, pipeline)
+            process_episode_files(root, files, media_extensions, pipeline)
 
-def process_movies(root, files, media_extensions, config):
+def process_movies(root, files, media_extensions, pipeline):
     """处理电影文件"""
     
     # 多种电影命名格式（与 scan_media.py 保持一致）
@@ -778,6 +969,7 @@ def process_movies(root, files, media_extensions, config):
         re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
     ]
 
+    existing = set(files)
     for file in files:
         if any(file.lower().endswith(ext) for ext in media_extensions):
             matched = False
@@ -789,28 +981,19 @@ def process_movies(root, files, media_extensions, config):
                     media_file_name = os.path.splitext(file)[0]
                     nfo_file_path = os.path.join(root, media_file_name + '.nfo')
                     
-                    if os.path.exists(nfo_file_path):
+                    if media_file_name + '.nfo' in existing:
                         logging.debug(f"电影NFO已存在，跳过: {nfo_file_path}")
                         matched = True
                         break
                     
-                    tmdb_id = query_tmdb_id(movie_name, year, 'movie', config)
-                    if not tmdb_id:
-                        tmdb_id = query_tmdb_api(movie_name, year, 'movie', config)
-                    if tmdb_id:
-                        info = get_movie_info_from_tmdb(tmdb_id, config)
-                        if info:
-                            generate_movie_nfo(nfo_file_path, info, config)  # 传递配置
-                    else:
-                        logging.warning(f"未找到TMDB_ID: {movie_name} ({year})，跳过NFO生成")
-                    
+                    pipeline.submit({"kind": 'movie', "nfo_path": nfo_file_path, "title": movie_name, "year": year})
                     matched = True
                     break
             
             if not matched:
                 logging.warning(f"无法从文件名提取标题和年份: {file}")
 
-def process_tvshow_directory(root, dirs, config):
+def process_tvshow_directory(root, files, pipeline):
     """处理剧集主目录"""
     
     # 多种电视剧目录命名格式（与 scan_media.py 保持一致）
@@ -837,19 +1020,13 @@ def process_tvshow_directory(root, dirs, config):
         return  # 不是剧集主目录，跳过
     
     tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
-    if os.path.exists(tvshow_nfo_path):
+    if 'tvshow.nfo' in files:
         logging.debug(f"剧集NFO已存在，跳过: {tvshow_nfo_path}")
         return  # 跳出函数，不处理此目录
 
-    tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-    if not tmdb_id:
-        tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-    if tmdb_id:
-        info = get_tv_info_from_tmdb(tmdb_id, config)
-        if info:
-            generate_tvshow_nfo(tvshow_nfo_path, info, config)
+    pipeline.submit({"kind": 'tvshow', "nfo_path": tvshow_nfo_path, "title": tv_name, "year": tv_year})
 
-def process_season_directory(root, dirs, config):
+def process_season_directory(root, files, pipeline):
     """处理剧集季目录"""
     parent_dir = os.path.dirname(root)
     parent_name = os.path.basename(parent_dir)
@@ -897,19 +1074,38 @@ def process_season_directory(root, dirs, config):
         return  # 不是季目录，跳过
     
     season_nfo_path = os.path.join(root, 'season.nfo')
-    if os.path.exists(season_nfo_path):
+    if 'season.nfo' in files:
         logging.debug(f"季NFO已存在，跳过: {season_nfo_path}")
         return  # 跳出函数，不处理此目录
 
-    tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-    if not tmdb_id:
-        tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-    if tmdb_id:
-        info = get_tv_info_from_tmdb(tmdb_id, config)
-        if info:
-            generate_season_nfo(season_nfo_path, info, season_number=season_number)
+    pipeline.submit({"kind": 'season', "nfo_path": season_nfo_path, "title": tv_name, "year": tv_year,
+                     "season_number": season_number})
 
-def process_episode_files(root, files, media_extensions, config):
+def find_tv_candidates(root):
+    """向上查找剧集主目录，返回按从近到远排列的 [(标题, 年份)]"""
+    # 多种电视剧目录命名格式（用于向上搜索）
+    tv_patterns = [
+        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
+        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
+        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
+        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
+        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
+    ]
+    
+    candidates = []
+    parent = root
+    while parent != os.path.dirname(parent):  # 防止无限循环
+        parent_dir = os.path.dirname(parent)
+        parent_name = os.path.basename(parent_dir)
+        for pattern in tv_patterns:
+            parent_match = pattern.match(parent_name)
+            if parent_match:
+                candidates.append((parent_match.group(1).strip(), int(parent_match.group(2))))
+                break
+        parent = parent_dir
+    return candidates
+
+def process_episode_files(root, files, media_extensions, pipeline):
     """处理单集文件"""
     
     # 多种剧集文件命名格式（扩展自 scan_media.py 的模式）
@@ -922,6 +1118,8 @@ def process_episode_files(root, files, media_extensions, config):
         re.compile(r'^(.*)\.S(\d{1,2})E(\d{1,4})$', re.IGNORECASE),          # 格式: Show.Name.S1E1 (无标题)
     ]
     
+    existing = set(files)
+    candidates = None
     for file in files:
         # 首先检查是否为支持的媒体文件
         if not any(file.lower().endswith(ext) for ext in media_extensions):
@@ -940,71 +1138,19 @@ def process_episode_files(root, files, media_extensions, config):
             logging.debug(f"文件不符合剧集命名格式，跳过: {file}")
             continue
         
-        show_name = episode_match.group(1).strip()
         season_num = int(episode_match.group(2))
         episode_num = int(episode_match.group(3))
         episode_nfo_path = os.path.join(root, os.path.splitext(file)[0] + '.nfo')
         
-        if os.path.exists(episode_nfo_path):
+        if os.path.splitext(file)[0] + '.nfo' in existing:
             logging.debug(f"集NFO已存在，跳过: {episode_nfo_path}")
             continue
         
-        # 向上查找剧集主目录
-        parent = root
-        info = None
-        found_tv = False
-        
-        # 多种电视剧目录命名格式（用于向上搜索）
-        tv_patterns = [
-            re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-            re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-            re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-            re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-            re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-        ]
-        
-        while not found_tv and parent != os.path.dirname(parent):  # 防止无限循环
-            parent_dir = os.path.dirname(parent)
-            parent_name = os.path.basename(parent_dir)
-            
-            for pattern in tv_patterns:
-                parent_match = pattern.match(parent_name)
-                if parent_match:
-                    tvshow_nfo_path = os.path.join(parent_dir, 'tvshow.nfo')
-                    if os.path.exists(tvshow_nfo_path):
-                        tv_name = parent_match.group(1).strip()
-                        tv_year = int(parent_match.group(2))
-                        tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-                        if not tmdb_id:
-                            tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-                        if tmdb_id:
-                            info = get_tv_info_from_tmdb(tmdb_id, config)
-                            found_tv = True
-                        break
-                    else:
-                        tv_name = parent_match.group(1).strip()
-                        tv_year = int(parent_match.group(2))
-                        tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-                        if not tmdb_id:
-                            tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-                        if tmdb_id:
-                            info = get_tv_info_from_tmdb(tmdb_id, config)
-                            found_tv = True
-                        break
-            if found_tv:
-                break
-            parent = parent_dir
-        
-        if info:
-            episode_info = get_episode_info_from_tmdb(info["tmdbid"], season_num, episode_num, config)
-            if episode_info:
-                episode_info["showtitle"] = info.get("showtitle", info.get("title", ""))
-                episode_info["original_filename"] = file
-                if not episode_info.get("studio"):
-                    episode_info["studio"] = info.get("studios", [""])[0] if info.get("studios") else ""
-                generate_episode_nfo(episode_nfo_path, episode_info)
-        else:
-            logging.warning(f"未找到TMDB_ID，跳过NFO生成: {file}")
+        # 同一目录下的单集共用上级剧集目录
+        if candidates is None:
+            candidates = find_tv_candidates(root)
+        pipeline.submit({"kind": 'episode', "nfo_path": episode_nfo_path, "candidates": candidates,
+                         "season": season_num, "episode": episode_num, "file": file})
 
 def query_tmdb_id(title, year, media_type, config):
     """通过数据库查询获取tmdb_id"""
@@ -1034,7 +1180,7 @@ def query_tmdb_id(title, year, media_type, config):
         logging.error(f"查询数据库时出错: {e}")
     return None
 
-def query_tmdb_api(title, year, media_type, config):
+def query_tmdb_api(title, year, media_type, config, session=None):
     """通过TMDB API查询获取tmdb_id"""
     cache_key = (title, year, media_type)
     if cache_key in tmdb_id_cache:
@@ -1052,7 +1198,7 @@ def query_tmdb_api(title, year, media_type, config):
     }
     logging.info(f"通过TMDB API查询 {title} 获取TMDB_ID")
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10, session=session)
         response.raise_for_status()
         search_results = response.json().get('results', [])
         for result in search_results:
@@ -1090,22 +1236,33 @@ def main():
         logging.info("媒体元数据刮削功能未启用，程序无需运行。")
         exit(0)
         
-    movies_path = config['movies_path']
-    episodes_path = config['episodes_path']
-    anime_path = config['anime_path']
-    variety_path = config['variety_path']
-    
-    # 扫描电影路径（指定path_type为'movie'）
-    scan_metadata(movies_path, config, path_type='movie')
-    
-    # 扫描剧集路径（指定path_type为'tv'）
-    scan_metadata(episodes_path, config, path_type='tv')
+    # 各路径共用一条刮削流水线，遍历下一个路径时上一个路径的条目仍在查询和下载
+    with ScrapePipeline(config) as pipeline:
+        # 只刮削本次入库涉及的影视目录
+        scope = trigger_bus.path_scope_from_env()
+        if scope:
+            for path in scope["movie"]:
+                scan_metadata(path, config, path_type='movie', pipeline=pipeline)
+            for path in scope["tv"]:
+                scan_metadata(path, config, path_type='tv', pipeline=pipeline)
+            return
+
+        movies_path = config['movies_path']
+        episodes_path = config['episodes_path']
+        anime_path = config['anime_path']
+        variety_path = config['variety_path']
+        
+        # 扫描电影路径（指定path_type为'movie'）
+        scan_metadata(movies_path, config, path_type='movie', pipeline=pipeline)
+        
+        # 扫描剧集路径（指定path_type为'tv'）
+        scan_metadata(episodes_path, config, path_type='tv', pipeline=pipeline)
 
-    # 扫描动漫路径（指定path_type为'tv'）
-    scan_metadata(anime_path, config, path_type='tv')
+        # 扫描动漫路径（指定path_type为'tv'）
+        scan_metadata(anime_path, config, path_type='tv', pipeline=pipeline)
 
-    # 扫描综艺路径（指定path_type为'variety'）
-    scan_metadata(variety_path, config, path_type='tv')
+        # 扫描综艺路径（指定path_type为'variety'）
+        scan_metadata(variety_path, config, path_type='tv', pipeline=pipeline)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -19,6 +19,7 @@ import shutil
 
 # 导入新的验证码处理模块
 from captcha_handler import CaptchaHandler
+from webdriver_pool import lease_driver
 
 # 配置日志
 os.makedirs("/tmp/log", exist_ok=True)
@@ -45,6 +46,11 @@ class SiteTester:
         if hasattr(self, 'driver') and self.driver is not None:
             logging.info("WebDriver已经初始化，无需重复初始化")
             return
+        # 优先租用常驻浏览器，浏览器池不可用时再独立启动
+        self.driver = lease_driver("site_test")
+        if self.driver is not None:
+            logging.info("WebDriver初始化完成（常驻浏览器）")
+            return
         options = Options()
         options.add_argument('--headless=new')  # 使用新版无头模式
         options.add_argument('--no-sandbox')
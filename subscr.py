@@ -6,6 +6,7 @@ import random
 import sqlite3
 import logging
 import re
+import trigger_bus
 
 # 配置日志
 logging.basicConfig(
@@ -38,8 +39,11 @@ def chinese_to_int(chinese_num):
         raise ValueError(f"无法解析中文数字: {chinese_num}")
 
 class DouBanRSSParser:
-    def __init__(self):
-        self.load_config()
+    def __init__(self, config=None):
+        if config is None:
+            self.load_config()
+        else:
+            self.config = dict(config)
         self.cookie = self.config.get("douban_cookie", "")
         self.douban_user_ids = self.config.get("douban_user_ids", "your_douban_id")  # 修改为读取用户ID列表
         self.db_path = '/config/data.db'
@@ -50,6 +54,8 @@ class DouBanRSSParser:
             "Connection": "keep-alive",
         }
         self.db_connection = sqlite3.connect(self.db_path)
+        # 本次运行中新插入的标题，供触发后续阶段使用
+        self.new_titles = set()
 
     def load_config(self, db_path='/config/data.db'):
         """从数据库中加载配置"""
@@ -239,6 +245,7 @@ class DouBanRSSParser:
                              movie_details['year'], movie_details['url'], movie_details['sub_title'], 
                              movie_details['season'], movie_details['status']))
             self.db_connection.commit()
+            self.new_titles.add(movie_details['title'])
             logging.info(f"成功插入 {movie_details['title']} 到数据库，状态: {movie_details['status']}")
             logging.info("-" * 80)
         except sqlite3.IntegrityError:
@@ -450,9 +457,28 @@ class DouBanRSSParser:
         self.db_connection.close()
         logging.info("关闭数据库连接")
 
+def main(config=None):
+    parser = DouBanRSSParser(config)
+    try:
+        parser.run()
+        parser.check_and_update_media_info()
+    finally:
+        parser.close_db()
+
+def poll(config=None):
+    """
+    轻量轮询豆瓣想看：只同步兴趣列表，不逐条复查标题和集数。
+    出现新条目时发布触发事件，由主程序仅为这些标题检查订阅、建立索引并下载。
+    """
+    parser = DouBanRSSParser(config)
+    try:
+        parser.run()
+    finally:
+        parser.close_db()
+    if parser.new_titles:
+        logging.info(f"发现新的豆瓣条目: {', '.join(sorted(parser.new_titles))}")
+        trigger_bus.publish(trigger_bus.EVENT_DOUBAN_UPDATED, parser.new_titles)
+
 # 主程序入口
 if __name__ == "__main__":
-    parser = DouBanRSSParser()
-    parser.run()
-    parser.check_and_update_media_info()
-    parser.close_db()
\ No newline at end of file
+    main()
\ No newline at end of file
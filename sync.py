@@ -1,18 +1,25 @@
 import os
 import re
+import hashlib
 import logging
 import requests
 import sqlite3
-import shutil
 import time
 import json
 import subprocess
 import threading
+from functools import lru_cache
 from collections import defaultdict
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import trigger_bus
+from tmdb_cache import tmdb_get
+from processed_ledger import ProcessedFilesLedger
+from transfer_queue import TransferQueue, DEFAULT_CLOSE_SETTLE_DELAY
+from file_transfer import copy_file, move_file, is_partial_name
+from media_content_index import DirectoryContentIndex
+from parse_cache import ParseCache
 
 # 新增：导入 guessit
 try:
@@ -20,6 +27,9 @@ try:
 except ImportError:
     guessit = None
 
+# guessit 解析结果缓存（同目录剧集按模板复用）
+guessit_cache = ParseCache(lambda name: dict(guessit.guessit(name))) if guessit else None
+
 # 新增：导入下载器API
 try:
     from transmission_rpc import Client as TransmissionClient
@@ -249,6 +259,138 @@ def generate_folder_name(media_info, media_type, classification):
     
     return folder_name
 
+# 下载器任务索引刷新间隔（秒）：超过该时间的查找先增量刷新；未命中时最短间隔 LABEL_INDEX_MISS_REFRESH 秒再刷新
+LABEL_INDEX_REFRESH = 30
+LABEL_INDEX_MISS_REFRESH = 5
+# Transmission 的 recently-active 只包含近期活跃的任务，每隔该时间（秒）全量同步一次
+LABEL_INDEX_FULL_REFRESH = 600
+
+class DownloaderLabelIndex:
+    """
+    下载器任务名称→标签索引，进程内常驻并复用下载器连接。
+    qBittorrent 通过 sync/maindata 的 rid 增量同步，Transmission 通过 recently-active 增量同步，
+    连接或同步失败时丢弃客户端，下次查找时重新连接并全量刷新。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        self._client = None
+        self._tasks = {}    # 任务 ID（qBittorrent 为 hash，Transmission 为 id）-> (任务名称, 标签)
+        self._labels = {}   # 任务名称 -> 标签（未设置标签时为 None）
+        self._rid = 0
+        self._refreshed_at = 0
+        self._full_refreshed_at = 0
+
+    def _reset(self, settings):
+        self._settings = settings
+        self._client = None
+        self._tasks = {}
+        self._labels = {}
+        self._rid = 0
+        self._refreshed_at = 0
+        self._full_refreshed_at = 0
+
+    def _connect(self):
+        download_type, host, port, username, password = self._settings
+        if download_type == 'transmission' and TransmissionClient:
+            logging.debug("使用 TransmissionClient 连接下载器...")
+            return TransmissionClient(host=host, port=port, username=username, password=password)
+        if download_type == 'qbittorrent' and QBittorrentClient:
+            logging.debug("使用 QBittorrentClient 连接下载器...")
+            client = QBittorrentClient(host=f"http://{host}:{port}", username=username, password=password)
+            client.auth_log_in()
+            return client
+        return None
+
+    def _set_task(self, task_id, name, label):
+        old = self._tasks.get(task_id)
+        if old and old[0] != name:
+            self._labels.pop(old[0], None)
+        self._tasks[task_id] = (name, label)
+        self._labels[name] = label
+
+    def _remove_task(self, task_id):
+        old = self._tasks.pop(task_id, None)
+        if old:
+            self._labels.pop(old[0], None)
+
+    @staticmethod
+    def _transmission_label(t):
+        try:
+            if hasattr(t, 'labels') and t.labels:
+                return t.labels[0]
+            if hasattr(t, 'label') and t.label:
+                return t.label
+        except Exception as ex:
+            logging.warning(f"获取 Transmission 任务标签异常: {ex}")
+        return None
+
+    def _refresh_transmission(self):
+        if not self._tasks or time.monotonic() - self._full_refreshed_at >= LABEL_INDEX_FULL_REFRESH:
+            torrents = self._client.get_torrents(arguments=['id', 'name', 'labels', 'label'])
+            self._tasks = {}
+            self._labels = {}
+            self._full_refreshed_at = time.monotonic()
+            removed = []
+        else:
+            torrents, removed = self._client.get_recently_active_torrents(arguments=['id', 'name', 'labels', 'label'])
+        for task_id in removed:
+            self._remove_task(task_id)
+        for t in torrents:
+            self._set_task(t.id, t.name, self._transmission_label(t))
+
+    def _refresh_qbittorrent(self):
+        data = self._client.sync_maindata(rid=self._rid)
+        if data.get('full_update'):
+            self._tasks = {}
+            self._labels = {}
+        for task_hash in data.get('torrents_removed') or []:
+            self._remove_task(task_hash)
+        for task_hash, changes in (data.get('torrents') or {}).items():
+            name, label = self._tasks.get(task_hash, ('', None))
+            name = changes.get('name', name)
+            if 'tags' in changes:
+                tags = changes.get('tags') or ''
+                label = tags.split(',')[0].strip() if tags else None
+            self._set_task(task_hash, name, label)
+        self._rid = data.get('rid', self._rid)
+
+    def _refresh(self):
+        if self._client is None:
+            self._client = self._connect()
+            self._tasks = {}
+            self._labels = {}
+            self._rid = 0
+            if self._client is None:
+                return
+        try:
+            if self._settings[0] == 'transmission':
+                self._refresh_transmission()
+            else:
+                self._refresh_qbittorrent()
+            self._refreshed_at = time.monotonic()
+        except Exception:
+            # 丢弃连接，下次查找时重新连接并全量同步
+            self._client = None
+            raise
+
+    def lookup(self, folder_name, settings):
+        """返回 (是否找到同名任务, 标签)"""
+        with self._lock:
+            if settings != self._settings:
+                self._reset(settings)
+            elapsed = time.monotonic() - self._refreshed_at
+            if elapsed >= LABEL_INDEX_REFRESH or (folder_name not in self._labels and elapsed >= LABEL_INDEX_MISS_REFRESH):
+                try:
+                    self._refresh()
+                except Exception as e:
+                    logging.error(f"同步下载器任务列表失败: {e}")
+            return folder_name in self._labels, self._labels.get(folder_name)
+
+downloader_label_index = DownloaderLabelIndex()
+# 目标目录内容索引，用于转移前查找同内容文件
+media_content_index = DirectoryContentIndex()
+
 def get_task_label_from_downloader(folder_name, config):
     """
     根据文件夹名称查找下载器任务名称相同的任务，并返回标签（如有）。
@@ -268,53 +410,11 @@ def get_task_label_from_downloader(folder_name, config):
         logging.info("下载管理未启用或为迅雷，跳过标签查找。")
         return None
 
-    try:
-        if download_type == 'transmission' and TransmissionClient:
-            logging.debug("使用 TransmissionClient 连接下载器...")
-            client = TransmissionClient(
-                host=download_host,
-                port=download_port,
-                username=download_username,
-                password=download_password
-            )
-            for t in client.get_torrents(arguments=['name', 'labels', 'label']):
-                try:
-                    # 直接用任务名和文件夹名比对
-                    if t.name == folder_name:
-                        logging.info(f"找到匹配的 Transmission 任务: {t.name}")
-                        if hasattr(t, 'labels') and t.labels:
-                            logging.info(f"Transmission 任务标签（labels）: {t.labels[0]}")
-                            return t.labels[0]
-                        elif hasattr(t, 'label') and t.label:
-                            logging.info(f"Transmission 任务标签（label）: {t.label}")
-                            return t.label
-                        else:
-                            logging.info("Transmission 任务未设置标签")
-                            return None
-                except Exception as ex:
-                    logging.warning(f"获取 Transmission 任务异常: {ex}")
-                    continue
-        elif download_type == 'qbittorrent' and QBittorrentClient:
-            logging.debug("使用 QBittorrentClient 连接下载器...")
-            client = QBittorrentClient(
-                host=f"http://{download_host}:{download_port}",
-                username=download_username,
-                password=download_password
-            )
-            client.auth_log_in()
-            for t in client.torrents_info():
-                try:
-                    # 直接用任务名和文件夹名比对
-                    if t.get('name', '') == folder_name:
-                        tags = t.get('tags', '')
-                        logging.info(f"找到匹配的 qBittorrent 任务: {t.get('name', '')}，标签: {tags}")
-                        return tags.split(',')[0] if tags else None
-                except Exception as ex:
-                    logging.warning(f"qBittorrent 任务解析异常: {ex}")
-                    continue
-    except Exception as e:
-        logging.error(f"获取下载任务标签失败: {e}")
-    return None
+    settings = (download_type, download_host, download_port, download_username, download_password)
+    found, label = downloader_label_index.lookup(folder_name, settings)
+    if found:
+        logging.info(f"找到匹配的下载任务: {folder_name}，标签: {label}")
+    return label
 
 def extract_info_from_label(label):
     logging.debug(f"解析下载任务标签: {label}")
@@ -362,7 +462,7 @@ def get_tmdb_info(title, year, media_type, season=None):
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.get(url, params=params, timeout=10)
+                response = tmdb_get(url, params=params, timeout=10)
                 response.raise_for_status()
                 return response.json().get('results', [])
             except requests.RequestException as e:
@@ -612,7 +712,7 @@ def get_first_season_year(tmdb_id, config):
             'append_to_response': 'seasons'
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -658,7 +758,7 @@ def get_media_genre_classification(tmdb_id, media_type):
             'language': 'zh-CN'
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -716,11 +816,63 @@ def get_media_genre_classification(tmdb_id, media_type):
         # 出错时返回默认分类
         return media_type
 
+# 整季集名称在内存中的有效期（秒）
+SEASON_NAMES_TTL = 3600
+
+class SeasonEpisodeNames:
+    """
+    按 (tmdb_id, 季, 语言) 获取并缓存整季的集名称。
+    同一季的其他集直接从内存读取，整季导入时只需一次 TMDB 请求。
+    """
+    def __init__(self, ttl=SEASON_NAMES_TTL):
+        self.ttl = ttl
+        self._seasons = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+
+    def _fetch(self, tmdb_id, season_number, language):
+        TMDB_API_KEY = config.get("tmdb_api_key", "")
+        TMDB_BASE_URL = config.get("tmdb_base_url", "")
+        url = f"{TMDB_BASE_URL}/3/tv/{tmdb_id}/season/{season_number}"
+        params = {
+            'api_key': TMDB_API_KEY,
+            'language': language
+        }
+        response = tmdb_get(url, params=params, timeout=10)
+        response.raise_for_status()
+        episodes = response.json().get('episodes', [])
+        logging.debug(f"已获取 TMDB ID {tmdb_id} 第 {season_number} 季的 {len(episodes)} 集名称 ({language})")
+        return {episode.get('episode_number'): episode.get('name', '') for episode in episodes}
+
+    def get(self, tmdb_id, season_number, episode_number, language='zh-CN'):
+        """
+        返回集名称；整季数据中没有该集时返回 None。
+        请求失败时抛出 requests.RequestException。
+        """
+        key = (str(tmdb_id), int(season_number), language)
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        # 同一季只请求一次，其他并发处理的同季文件等待结果
+        with fetch_lock:
+            with self._lock:
+                cached = self._seasons.get(key)
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                cached = (time.monotonic(), self._fetch(tmdb_id, season_number, language))
+                with self._lock:
+                    self._seasons[key] = cached
+        return cached[1].get(int(episode_number))
+
+season_episode_names = SeasonEpisodeNames()
+
 def get_tv_episode_name(tmdb_id, season_number, episode_number):
     # 增加重试机制
     max_retries = 3
     for attempt in range(max_retries):
         try:
+            episode_name = season_episode_names.get(tmdb_id, season_number, episode_number, 'zh-CN')
+            if episode_name is not None:
+                return episode_name
+            # 整季数据中没有该集（如刚更新的集），单独查询
             TMDB_API_KEY = config.get("tmdb_api_key", "")
             TMDB_BASE_URL = config.get("tmdb_base_url", "")
             url = f"{TMDB_BASE_URL}/3/tv/{tmdb_id}/season/{season_number}/episode/{episode_number}"
@@ -728,7 +880,7 @@ def get_tv_episode_name(tmdb_id, season_number, episode_number):
                 'api_key': TMDB_API_KEY,
                 'language': 'zh-CN'
             }
-            response = requests.get(url, params=params, timeout=10)
+            response = tmdb_get(url, params=params, timeout=10)
             response.raise_for_status()
             episode_info = response.json()
             return episode_info.get('name', f"第{episode_number}集")
@@ -744,40 +896,41 @@ def get_tv_episode_name(tmdb_id, season_number, episode_number):
                 logging.error(f"请求错误: {e}")
     return f"第{episode_number}集"
 
+# 文件名和文件夹名中常见的广告关键词和域名
+AD_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'UIndex', 
+    r'dygod\.org', 
+    r'阳光电影',
+    r'\.com', 
+    r'\.cn', 
+    r'\.net',
+    r'【更多', 
+    r'不太灵影视',
+    r'高清电影',
+    r'高清剧集',
+    r'BT影视',
+    r'www\.[a-zA-Z0-9]+\.[a-zA-Z]+',  # 通用域名格式 www.xxx.com
+    r'[a-zA-Z0-9]+\.(com|cn|net|org|cc|tk|ml|ga|cf)',  # 常见域名后缀
+    r'发布者', 
+    r'GM-Team',
+    r'国漫',
+    r'日漫',
+    r'动漫',
+    r'官方',
+    r'正版',
+    r'付费',
+    r'VIP',
+    r'会员'
+]]
+
+@lru_cache(maxsize=4096)
 def preprocess_filename(filename):
     """
     预处理文件名，移除广告、无效文字等
     """
-    # 移除常见的广告关键词和域名
-    ad_patterns = [
-        r'UIndex', 
-        r'dygod\.org', 
-        r'阳光电影',
-        r'\.com', 
-        r'\.cn', 
-        r'\.net',
-        r'【更多', 
-        r'不太灵影视',
-        r'高清电影',
-        r'高清剧集',
-        r'BT影视',
-        r'www\.[a-zA-Z0-9]+\.[a-zA-Z]+',  # 通用域名格式 www.xxx.com
-        r'[a-zA-Z0-9]+\.(com|cn|net|org|cc|tk|ml|ga|cf)',  # 常见域名后缀
-        r'发布者', 
-        r'GM-Team',
-        r'国漫',
-        r'日漫',
-        r'动漫',
-        r'官方',
-        r'正版',
-        r'付费',
-        r'VIP',
-        r'会员'
-    ]
-    
     processed_filename = filename
-    for pattern in ad_patterns:
-        processed_filename = re.sub(pattern, '', processed_filename, flags=re.IGNORECASE)
+    for pattern in AD_PATTERNS:
+        processed_filename = pattern.sub('', processed_filename)
     
     # 只去除首尾空格，不清理中间的符号
     processed_filename = processed_filename.strip()
@@ -785,40 +938,14 @@ def preprocess_filename(filename):
     logging.debug(f"文件名预处理: '{filename}' -> '{processed_filename}'")
     return processed_filename
 
+@lru_cache(maxsize=4096)
 def preprocess_folder_name(folder_name):
     """
     预处理文件夹名称，移除广告、无效文字等
     """
-    # 移除常见的广告关键词和域名
-    ad_patterns = [
-        r'UIndex', 
-        r'dygod\.org', 
-        r'阳光电影',
-        r'\.com', 
-        r'\.cn', 
-        r'\.net',
-        r'【更多', 
-        r'不太灵影视',
-        r'高清电影',
-        r'高清剧集',
-        r'BT影视',
-        r'www\.[a-zA-Z0-9]+\.[a-zA-Z]+',  # 通用域名格式 www.xxx.com
-        r'[a-zA-Z0-9]+\.(com|cn|net|org|cc|tk|ml|ga|cf)',  # 常见域名后缀
-        r'发布者', 
-        r'GM-Team',
-        r'国漫',
-        r'日漫',
-        r'动漫',
-        r'官方',
-        r'正版',
-        r'付费',
-        r'VIP',
-        r'会员'
-    ]
-    
     processed_folder_name = folder_name
-    for pattern in ad_patterns:
-        processed_folder_name = re.sub(pattern, '', processed_folder_name, flags=re.IGNORECASE)
+    for pattern in AD_PATTERNS:
+        processed_folder_name = pattern.sub('', processed_folder_name)
     
     # 只去除首尾空格，不清理中间的符号
     processed_folder_name = processed_folder_name.strip()
@@ -836,8 +963,8 @@ def extract_info_with_guessit(filename):
     # 移除扩展名
     filename_without_ext = '.'.join(processed_filename.split('.')[:-1]) if '.' in processed_filename else processed_filename
     
-    # 使用guessit解析文件名
-    info = guessit.guessit(filename_without_ext)
+    # 使用guessit解析文件名（结果已缓存）
+    info = guessit_cache.parse(filename_without_ext)
     
     # 提取关键信息
     title = info.get('title', '')
@@ -1383,68 +1510,6 @@ def extract_info(filename, folder_name=None, label_info=None):
 
     return raw_info
 
-def is_same_media_content(file1_path, file2_path):
-    """
-    判断两个文件是否为同一媒体内容（基于文件名的核心信息）
-    """
-    # 提取文件名核心部分（去除后缀）
-    name1 = os.path.splitext(os.path.basename(file1_path))[0]
-    name2 = os.path.splitext(os.path.basename(file2_path))[0]
-    
-    logging.debug(f"比较文件内容: {name1} vs {name2}")
-    
-    # 提取核心标识（电影名或剧集标识）
-    # 对于剧集：提取 SxxExx 部分
-    episode_pattern = r'(S\d{1,2}E\d{1,2})'
-    episode_match1 = re.search(episode_pattern, name1, re.IGNORECASE)
-    episode_match2 = re.search(episode_pattern, name2, re.IGNORECASE)
-    
-    if episode_match1 and episode_match2:
-        # 如果都是剧集，比较剧集标识
-        result = episode_match1.group(1).upper() == episode_match2.group(1).upper()
-        logging.debug(f"剧集比较结果: {result}")
-        return result
-    
-    # 对于电影：使用更宽松的比较方式
-    # 提取主要标题部分（移除年份、质量等信息）
-    def extract_movie_title(name):
-        # 移除年份 (如 2025)
-        name = re.sub(r'[\. _\-]?(?:19|20)\d{2}[\. _\-]?', ' ', name)
-        # 移除质量信息 (如 2160p, 1080p, 4k等)
-        name = re.sub(r'[\. _\-]?\d{3,4}[ip][\. _\-]?', ' ', name)
-        # 移除其他技术信息
-        name = re.sub(r'[\. _\-]?(?:web-dl|webdl|webrip|bluray|brrip|hdtv|hdr|hevc|h264|h265)[\. _\-]?', ' ', name, flags=re.IGNORECASE)
-        # 移除帧率信息
-        name = re.sub(r'[\. _\-]?\d{1,2}fps[\. _\-]?', ' ', name, flags=re.IGNORECASE)
-        # 移除音频信息
-        name = re.sub(r'[\. _\-]?(?:aac|ac3|ddp|dts)[\. _\-]?', ' ', name, flags=re.IGNORECASE)
-        # 清理多余空格和分隔符
-        name = re.sub(r'[\. _\-]+', ' ', name)
-        name = name.strip()
-        return name.lower()
-    
-    title1 = extract_movie_title(name1)
-    title2 = extract_movie_title(name2)
-    
-    logging.debug(f"电影标题比较: '{title1}' vs '{title2}'")
-    
-    # 如果提取后的标题相同，或者一个包含另一个，则认为是相同内容
-    result = (title1 == title2) or (title1 in title2) or (title2 in title1)
-    logging.debug(f"电影比较结果: {result}")
-    
-    # 如果上述方法都不行，尝试更宽松的匹配
-    if not result:
-        # 提取中文部分进行比较
-        chinese1 = re.findall(r'[\u4e00-\u9fff]+', name1)
-        chinese2 = re.findall(r'[\u4e00-\u9fff]+', name2)
-        if chinese1 and chinese2:
-            chinese_title1 = ''.join(chinese1)
-            chinese_title2 = ''.join(chinese2)
-            result = chinese_title1 == chinese_title2
-            logging.debug(f"中文标题比较: '{chinese_title1}' vs '{chinese_title2}', 结果: {result}")
-    
-    return result
-
 def move_or_copy_file(src, dst, action, media_type, config):
     """
     执行文件转移操作，增加完善的错误处理和冲突解决机制
@@ -1468,17 +1533,13 @@ def move_or_copy_file(src, dst, action, media_type, config):
         # 查找同内容文件（处理不同后缀或质量的同一内容）
         existing_file_path = None
         if os.path.exists(dst_dir):
-            src_basename = os.path.basename(src)
-            logging.debug(f"在目录 {dst_dir} 中查找相同内容的文件")
-            for existing_file in os.listdir(dst_dir):
-                existing_file_full_path = os.path.join(dst_dir, existing_file)
-                if os.path.isfile(existing_file_full_path) and not existing_file_full_path.endswith('.nfo'):
-                    is_same = is_same_media_content(src, existing_file_full_path)
-                    logging.debug(f"比较文件 {src_basename} 与 {existing_file}: {'相同' if is_same else '不同'}")
-                    if is_same:
-                        existing_file_path = existing_file_full_path
-                        logging.debug(f"找到相同内容的已存在文件: {existing_file_path}")
-                        break
+            existing_file_path = media_content_index.find_same_content(dst_dir, src)
+            if existing_file_path and is_partial_name(os.path.basename(existing_file_path)):
+                # 未完成的复制临时文件不是已存在的文件，复制到 dst 时从断点继续
+                logging.debug(f"忽略未完成的临时文件: {existing_file_path}")
+                existing_file_path = None
+            if existing_file_path:
+                logging.debug(f"找到相同内容的已存在文件: {existing_file_path}")
         
         # 处理文件冲突
         target_file = existing_file_path if existing_file_path else dst
@@ -1506,10 +1567,12 @@ def move_or_copy_file(src, dst, action, media_type, config):
                     else:
                         logging.info(f"新文件 ({src_size} bytes) 大于已存在文件 ({target_size} bytes)，将覆盖: {target_file}")
                         os.remove(target_file)
+                        media_content_index.discard(target_file)
                 elif file_overwrite_option == "always":
                     # 强制覆盖模式
                     logging.info(f"根据配置强制覆盖已存在文件: {target_file}")
                     os.remove(target_file)
+                    media_content_index.discard(target_file)
                 else:
                     # 默认行为（兼容旧版本）
                     if src_size < target_size:
@@ -1521,6 +1584,7 @@ def move_or_copy_file(src, dst, action, media_type, config):
                     else:
                         logging.info(f"新文件 ({src_size} bytes) 大于已存在文件 ({target_size} bytes)，将覆盖: {target_file}")
                         os.remove(target_file)
+                        media_content_index.discard(target_file)
             except OSError as e:
                 logging.error(f"检查文件大小时出错: {e}")
                 return False
@@ -1528,14 +1592,14 @@ def move_or_copy_file(src, dst, action, media_type, config):
             logging.info(f"源文件和目标文件是同一个文件，跳过处理: {src}")
             return False
         
-        # 执行文件转移操作
+        # 执行文件转移操作（同一文件系统内移动直接重命名，复制优先使用 reflink）
         if action == 'move':
-            shutil.move(src, target_file)
+            move_file(src, target_file)
             logging.info(f"文件已移动: {src} -> {target_file}")
             # 新增：移动完成后尝试清理源目录
             try_clean_source_directory(src, config)
         elif action == 'copy':
-            shutil.copy2(src, target_file)
+            copy_file(src, target_file)
             logging.info(f"文件已复制: {src} -> {target_file}")
         elif action == 'softlink':
             os.symlink(src, target_file)
@@ -1545,7 +1609,8 @@ def move_or_copy_file(src, dst, action, media_type, config):
             logging.info(f"已创建硬链接: {src} -> {target_file}")
         else:
             raise ValueError(f"不支持的操作类型: {action}")
-            
+
+        media_content_index.add(target_file)
         return True
         
     except FileNotFoundError as e:
@@ -1763,17 +1828,8 @@ def try_clean_source_directory(file_path, config):
         logging.error(f"检查源目录清理条件时出错: {e}")
 
 def load_processed_files():
-    processed_filenames = set()
-    if os.path.exists(FILES_RECORD_PATH):
-        with open(FILES_RECORD_PATH, 'r') as f:
-            for line in f.read().splitlines():
-                processed_filenames.add(line.split('/')[-1])
-    return processed_filenames
-
-def save_processed_files(processed_filenames):
-    with open(FILES_RECORD_PATH, 'w') as f:
-        for filename in processed_filenames:
-            f.write(filename + '\n')
+    """加载已处理文件台账（数据库），旧版 files_record.txt 中的记录只读兼容"""
+    return ProcessedFilesLedger(legacy_record_path=FILES_RECORD_PATH)
 
 def get_alias_mapping(db_path, alias_name):
     """从数据库获取指定关系映射"""
@@ -1788,16 +1844,109 @@ def get_alias_mapping(db_path, alias_name):
         logging.error(f"查询指定关系失败: {e}")
     return None
 
-def refresh_media_library():
+def refresh_media_library(scope=None):
+    """刷新媒体库；scope 为 {"movie": [...], "tv": [...]} 时只扫描和刮削这些影视目录"""
+    env = trigger_bus.path_scope_env(scope)
     # 刷新媒体库
-    subprocess.run(['python', 'scan_media.py'])  
+    subprocess.run(['python', 'scan_media.py'], env=env)
     # 刷新正在订阅
     subprocess.run(['python', 'check_subscr.py'])   
     # 刮削NFO元数据
-    subprocess.run(['python', 'scrape_metadata.py'])
+    subprocess.run(['python', 'scrape_metadata.py'], env=env)
     # 刷新媒体库tmdb_id
     subprocess.run(['python', 'tmdb_id.py'])
 
+# 入库后等待多久再刷新媒体库（秒），期间转移的文件合并为一次刷新
+LIBRARY_REFRESH_DELAY = 30
+# 持续有文件入库时，最多推迟多久必须刷新一次（秒）
+LIBRARY_REFRESH_MAX_DELAY = 300
+
+def library_scope_directory(target_path):
+    """返回入库文件所属的 (类型, 影视目录)，即媒体库根目录下的第一级目录；不在媒体库中时返回 (None, None)"""
+    movies_path = config.get("movies_path", "")
+    episodes_path = config.get("episodes_path", "")
+    roots = [(movies_path, "movie")] + [
+        (config.get(key, episodes_path), "tv") for key in ("episodes_path", "anime_path", "variety_path")
+    ]
+    target_path = os.path.abspath(target_path)
+    # 较长的根目录优先，避免动漫、综艺目录位于电视剧目录下时被误判
+    for root, kind in sorted(roots, key=lambda item: len(item[0] or ''), reverse=True):
+        if not root:
+            continue
+        root = os.path.abspath(root)
+        relative = os.path.relpath(target_path, root)
+        if relative.startswith(os.pardir) or os.sep not in relative:
+            continue
+        return kind, os.path.join(root, relative.split(os.sep)[0])
+    return None, None
+
+class LibraryRefreshCoordinator:
+    """
+    合并一段时间内入库的文件：最后一次入库 LIBRARY_REFRESH_DELAY 秒后，
+    只针对受影响的影视目录刷新一次媒体库，并按媒体类型各通知一次 tinyMediaManager，
+    刷新完成后再通知主程序执行入库后的阶段。
+    """
+    def __init__(self, delay=LIBRARY_REFRESH_DELAY, max_delay=LIBRARY_REFRESH_MAX_DELAY):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._scope = {"movie": set(), "tv": set()}
+        self._full_refresh = False
+        self._tmm_media_types = set()
+        self._titles = set()
+        self._timer = None
+        self._first_scheduled = None
+
+    def schedule(self, target_path, media_type, title=None):
+        """登记入库文件，推迟刷新直到一段时间内没有新的入库"""
+        kind, directory = library_scope_directory(target_path)
+        with self._lock:
+            if kind:
+                self._scope[kind].add(directory)
+            else:
+                self._full_refresh = True
+            self._tmm_media_types.add('movie' if media_type == 'movie' else 'tv')
+            if title:
+                self._titles.add(title)
+            now = time.monotonic()
+            if self._timer is None:
+                self._first_scheduled = now
+            elif now - self._first_scheduled < self.max_delay:
+                self._timer.cancel()
+            else:
+                return
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即执行已登记的刷新"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            scope, self._scope = self._scope, {"movie": set(), "tv": set()}
+            full_refresh, self._full_refresh = self._full_refresh, False
+            media_types, self._tmm_media_types = self._tmm_media_types, set()
+            titles, self._titles = self._titles, set()
+            self._timer = None
+        if not (scope["movie"] or scope["tv"] or full_refresh):
+            return
+        # 上一次刷新尚未结束时等待，避免多次刷新同时运行
+        with self._refresh_lock:
+            if full_refresh:
+                logging.info("刷新整个媒体库")
+                refresh_media_library()
+            else:
+                logging.info(f"刷新媒体库：{len(scope['movie'])} 个电影目录、{len(scope['tv'])} 个剧集目录")
+                refresh_media_library(scope)
+            # 通知主程序执行入库后的阶段（NFO 处理、清理已完成任务等）
+            trigger_bus.publish(trigger_bus.EVENT_TRANSFER_COMPLETED, sorted(titles))
+            for media_type in sorted(media_types):
+                notify_tmm(media_type)
+
+library_refresh = LibraryRefreshCoordinator()
+
 def process_file(file_path, processed_filenames):
     """
     处理单个文件：
@@ -1892,12 +2041,11 @@ def process_file(file_path, processed_filenames):
                         # 检查目标文件是否已存在
                         if os.path.exists(dst_file_path):
                             logging.info(f"未识别目录中已存在同名文件，跳过处理: {dst_file_path}")
-                            processed_filenames.add(filename)
-                            save_processed_files(processed_filenames)
+                            processed_filenames.add(file_path)
                             return
                         # 只复制/移动当前文件
                         if action == 'copy':
-                            shutil.copy2(file_path, dst_file_path)
+                            copy_file(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件复制到未识别目录: {dst_file_path}")
                         elif action == 'softlink':
                             os.symlink(file_path, dst_file_path)
@@ -1906,10 +2054,9 @@ def process_file(file_path, processed_filenames):
                             os.link(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件创建硬链接到未识别目录: {dst_file_path}")
                         else:  # move
-                            shutil.move(file_path, dst_file_path)
+                            move_file(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件移动到未识别目录: {dst_file_path}")
-                        processed_filenames.add(filename)
-                        save_processed_files(processed_filenames)
+                        processed_filenames.add(file_path)
                     except Exception as e:
                         logging.error(f"转移未识别文件失败: {e}")
                 return
@@ -1993,13 +2140,12 @@ def process_file(file_path, processed_filenames):
                         # 检查目标文件是否已存在
                         if os.path.exists(dst_file_path):
                             logging.info(f"未识别目录中已存在同名文件，跳过处理: {dst_file_path}")
-                            processed_filenames.add(filename)
-                            save_processed_files(processed_filenames)
+                            processed_filenames.add(file_path)
                             # 清零计数
                             unrecognized_count.pop(folder_name, None)
                             return
                         if action == 'copy':
-                            shutil.copy2(file_path, dst_file_path)
+                            copy_file(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件复制到未识别目录: {dst_file_path}")
                         elif action == 'softlink':
                             os.symlink(file_path, dst_file_path)
@@ -2008,10 +2154,9 @@ def process_file(file_path, processed_filenames):
                             os.link(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件创建硬链接到未识别目录: {dst_file_path}")
                         else:  # move
-                            shutil.move(file_path, dst_file_path)
+                            move_file(file_path, dst_file_path)
                             logging.info(f"已将无法识别的文件移动到未识别目录: {dst_file_path}")
-                        processed_filenames.add(filename)
-                        save_processed_files(processed_filenames)
+                        processed_filenames.add(file_path)
                         # 清零计数
                         unrecognized_count.pop(folder_name, None)
                     except Exception as e:
@@ -2097,7 +2242,7 @@ def process_file(file_path, processed_filenames):
                     new_filename = generate_filename(media_info_for_naming, media_type, classification)
                     target_file_path = os.path.join(target_base_dir, new_filename)
 
-                if filename in processed_filenames:
+                if file_path in processed_filenames:
                     logging.debug(f"文件已处理，跳过: {filename}")
                     return
 
@@ -2112,21 +2257,17 @@ def process_file(file_path, processed_filenames):
                         logging.info(f"转移NFO文件: {nfo_file_path} -> {nfo_target_path}")
 
                     send_notification(new_filename)
-                    logging.info(f"文件处理完成，刷新本地数据库")
-                    refresh_media_library()
-
-                    # 通知 tinyMediaManager
-                    notify_tmm(classification)
+                    logging.info(f"文件处理完成，稍后刷新本地数据库")
+                    # 合并短时间内的入库文件，统一刷新媒体库、通知主程序和 tinyMediaManager
+                    library_refresh.schedule(target_file_path, classification, title)
 
                     # 保存已处理的文件列表
-                    processed_filenames.add(filename)
-                    save_processed_files(processed_filenames)
+                    processed_filenames.add(file_path)
                 else:
                     # 文件转移被跳过（因为已存在相同文件），这里不应该再尝试移动到未识别目录
                     logging.info(f"文件转移被跳过，因为已存在相同内容的文件: {filename}")
                     # 但是我们仍然需要将文件标记为已处理，避免重复处理
-                    processed_filenames.add(filename)
-                    save_processed_files(processed_filenames)
+                    processed_filenames.add(file_path)
                     # 清零计数，因为文件实际上已经被正确处理了
                     unrecognized_count.pop(folder_name, None)
             else:
@@ -2165,13 +2306,12 @@ def process_file(file_path, processed_filenames):
                             # 检查目标文件是否已存在
                             if os.path.exists(dst_file_path):
                                 logging.info(f"未识别目录中已存在同名文件，跳过处理: {dst_file_path}")
-                                processed_filenames.add(filename)
-                                save_processed_files(processed_filenames)
+                                processed_filenames.add(file_path)
                                 # 清零计数
                                 unrecognized_count.pop(folder_name, None)
                                 return
                             if action == 'copy':
-                                shutil.copy2(file_path, dst_file_path)
+                                copy_file(file_path, dst_file_path)
                                 logging.info(f"已将无法识别的文件复制到未识别目录: {dst_file_path}")
                             elif action == 'softlink':
                                 os.symlink(file_path, dst_file_path)
@@ -2180,10 +2320,9 @@ def process_file(file_path, processed_filenames):
                                 os.link(file_path, dst_file_path)
                                 logging.info(f"已将无法识别的文件创建硬链接到未识别目录: {dst_file_path}")
                             else:  # move
-                                shutil.move(file_path, dst_file_path)
+                                move_file(file_path, dst_file_path)
                                 logging.info(f"已将无法识别的文件移动到未识别目录: {dst_file_path}")
-                            processed_filenames.add(filename)
-                            save_processed_files(processed_filenames)
+                            processed_filenames.add(file_path)
                             # 清零计数
                             unrecognized_count.pop(folder_name, None)
                         except Exception as e:
@@ -2195,183 +2334,6 @@ def process_file(file_path, processed_filenames):
         with processing_lock:
             processing_files.discard(file_abs_path)
 
-def process_file_multithread(file_path, processed_filenames):
-    """
-    多线程版本的文件处理函数
-    """
-    # 这里复用原有的 process_file 逻辑
-    # 为了简化，直接调用原函数
-    process_file(file_path, processed_filenames)
-
-def process_files_in_batch(file_paths, processed_filenames):
-    """
-    批量处理文件，主要针对同级目录中包含2个及以上相似视频文件的情况
-    
-    Args:
-        file_paths: 文件路径列表
-        processed_filenames: 已处理文件集合
-    """
-    if not file_paths:
-        return
-    
-    # 过滤掉非视频文件
-    video_files = [file_path for file_path in file_paths if is_common_video_file(os.path.basename(file_path))]
-    
-    if not video_files:
-        logging.debug("批量处理中未发现视频文件，跳过处理")
-        return
-        
-    enable_multithread = config.get('enable_multithread_transfer', 'False').lower() == 'true'
-    thread_count = int(config.get('transfer_thread_count', '4'))
-    
-    # 按目录分组文件
-    files_by_directory = defaultdict(list)
-    for file_path in video_files:
-        directory = os.path.dirname(file_path)
-        files_by_directory[directory].append(file_path)
-    
-    logging.info(f"开始处理，共 {len(video_files)} 个视频文件，分布在 {len(files_by_directory)} 个目录中")
-    
-    # 处理每个目录中的文件
-    for directory, files in files_by_directory.items():
-        logging.debug(f"处理目录: {directory}，包含 {len(files)} 个文件")
-        
-        # 检查文件是否都存在
-        existing_files = []
-        missing_files = []
-        for file_path in files:
-            if os.path.exists(file_path):
-                existing_files.append(file_path)
-            else:
-                missing_files.append(file_path)
-                logging.warning(f"文件不存在，跳过处理: {file_path}")
-        
-        if missing_files:
-            logging.info(f"目录 {directory} 中有 {len(missing_files)} 个文件不存在")
-            
-        if not existing_files:
-            logging.info(f"目录 {directory} 中没有可处理的文件，跳过")
-            continue
-            
-        # 更新files为存在的文件列表
-        files = existing_files
-        
-        if len(files) >= 2:
-            # 检查是否为相似文件（电视剧、动漫、综艺等）
-            if are_similar_media_files(files):
-                logging.debug(f"检测到目录 {directory} 中有 {len(files)} 个相似媒体文件，使用批量处理")
-                
-                if enable_multithread:
-                    logging.info(f"使用多线程处理目录 {directory} 中的 {len(files)} 个文件，线程数: {thread_count}")
-                    # 使用线程池处理文件
-                    with ThreadPoolExecutor(max_workers=thread_count) as executor:
-                        # 提交任务
-                        future_to_file = {
-                            executor.submit(process_file_multithread, file_path, processed_filenames): file_path 
-                            for file_path in files
-                        }
-                        
-                        # 等待任务完成并检查结果
-                        for future in as_completed(future_to_file):
-                            file_path = future_to_file[future]
-                            try:
-                                future.result()
-                            except Exception as e:
-                                logging.error(f"处理文件时出错 {file_path}: {e}")
-                else:
-                    # 单线程处理
-                    logging.info(f"使用单线程处理目录 {directory} 中的 {len(files)} 个文件")
-                    for file_path in files:
-                        process_file(file_path, processed_filenames)
-            else:
-                # 不是相似文件，单独处理每个文件
-                logging.info(f"目录 {directory} 中的文件不相似，单独处理")
-                for file_path in files:
-                    process_file(file_path, processed_filenames)
-        else:
-            # 目录中只有一个文件，单独处理
-            logging.info(f"目录 {directory} 中只有 1 个文件，单独处理")
-            for file_path in files:
-                process_file(file_path, processed_filenames)
-
-def are_similar_media_files(file_paths):
-    """
-    判断一组文件是否为相似媒体文件（如同一电视剧的不同集数）
-    
-    Args:
-        file_paths: 文件路径列表
-        
-    Returns:
-        bool: 如果是相似文件返回True，否则返回False
-    """
-    if len(file_paths) < 2:
-        return False
-    
-    # 提取文件名基本信息（去除集数等变化部分）
-    base_names = []
-    original_names = []
-    
-    for file_path in file_paths:
-        filename = os.path.basename(file_path)
-        original_names.append(filename)
-        # 移除扩展名
-        name_without_ext = os.path.splitext(filename)[0]
-        # 提取基础名称（移除SxxExx等集数信息）
-        base_name = re.sub(r'[\. _\-]?S\d+E\d+', '', name_without_ext, flags=re.IGNORECASE)
-        base_name = re.sub(r'[\. _\-]E\d+', '', base_name, flags=re.IGNORECASE)
-        base_name = re.sub(r'[\. _\-]\d{4}[\. _\-]\d{3,4}p', '', base_name, flags=re.IGNORECASE)
-        # 移除集数相关关键词
-        base_name = re.sub(r'[\. _\-](EP)?\d{1,4}[\. _\-]', '', base_name, flags=re.IGNORECASE)
-        base_name = re.sub(r'[\. _\-]第?\d{1,4}[集期]?[\. _\-]?', '', base_name, flags=re.IGNORECASE)
-        base_names.append(base_name.lower().strip())
-    
-    # 检查基础名称是否相同或高度相似
-    first_base = base_names[0]
-    similar_count = 0
-    
-    logging.debug(f"相似文件检测 - 基准名称: {first_base}")
-    for i, base_name in enumerate(base_names):
-        # 如果基础名称相同，或者一个包含另一个，则认为相似
-        if first_base == base_name or first_base in base_name or base_name in first_base:
-            similar_count += 1
-            logging.debug(f"  相似文件: {original_names[i]} (基础名: {base_name})")
-        # 或者使用编辑距离判断相似度
-        elif len(first_base) > 0 and calculate_similarity(first_base, base_name) > 0.7:  # 降低阈值
-            similar_count += 1
-            logging.debug(f"  相似文件(相似度): {original_names[i]} (基础名: {base_name})")
-        else:
-            logging.debug(f"  不相似文件: {original_names[i]} (基础名: {base_name})")
-    
-    similarity_ratio = similar_count / len(file_paths)
-    logging.debug(f"目录中文件相似度: {similarity_ratio:.2%} ({similar_count}/{len(file_paths)})")
-    
-    # 如果超过70%的文件基础名称相似，则认为是相似文件
-    return similarity_ratio > 0.7
-
-def calculate_similarity(str1, str2):
-    """
-    计算两个字符串的相似度（使用简单的字符重合度）
-    
-    Args:
-        str1: 字符串1
-        str2: 字符串2
-        
-    Returns:
-        float: 相似度（0-1之间）
-    """
-    if not str1 or not str2:
-        return 0.0
-    
-    # 转换为集合计算交集和并集
-    set1 = set(str1)
-    set2 = set(str2)
-    
-    intersection = len(set1.intersection(set2))
-    union = len(set1.union(set2))
-    
-    return intersection / union if union > 0 else 0.0
-
-# 新增函数：根据TMDB ID获取媒体的中英文标题
 def get_media_titles_with_language(tmdb_id, media_type):
     """
     根据TMDB ID获取媒体的中英文标题
@@ -2388,7 +2350,7 @@ def get_media_titles_with_language(tmdb_id, media_type):
             'language': 'zh-CN'
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -2414,6 +2376,10 @@ def get_tv_episode_name_with_language(tmdb_id, season_number, episode_number, la
     根据TMDB ID获取剧集的指定语言名称
     """
     try:
+        episode_name = season_episode_names.get(tmdb_id, season_number, episode_number, language)
+        if episode_name is not None:
+            return episode_name
+        # 整季数据中没有该集（如刚更新的集），单独查询
         TMDB_API_KEY = config.get("tmdb_api_key", "")
         TMDB_BASE_URL = config.get("tmdb_base_url", "")
         url = f"{TMDB_BASE_URL}/3/tv/{tmdb_id}/season/{season_number}/episode/{episode_number}"
@@ -2421,7 +2387,7 @@ def get_tv_episode_name_with_language(tmdb_id, season_number, episode_number, la
             'api_key': TMDB_API_KEY,
             'language': language
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10)
         response.raise_for_status()
         episode_info = response.json()
         return episode_info.get('name', '')
@@ -2507,40 +2473,26 @@ class CustomFileHandler(FileSystemEventHandler):
         self.original_filenames = {}
         self.unfinished_files = set()
         self.processed_files = load_processed_files()
-        self.pending_files = []  # 待处理文件队列
-        self.batch_timer = None
-
-    def process_pending_files(self):
-        """处理待处理文件队列"""
-        if self.pending_files:
-            logging.debug(f"待处理文件数量: {len(self.pending_files)}")
-            # 按目录分组显示
-            files_by_dir = defaultdict(list)
-            for file_path in self.pending_files:
-                directory = os.path.dirname(file_path)
-                files_by_dir[directory].append(os.path.basename(file_path))
-            
-            for directory, files in files_by_dir.items():
-                logging.debug(f"  目录 {directory} 包含 {len(files)} 个文件")
-                for file in files:
-                    logging.debug(f"文件名：{file}")
-            
-            process_files_in_batch(self.pending_files.copy(), self.processed_files)
-            self.pending_files.clear()
-            save_processed_files(self.processed_files)
-
-    def schedule_batch_processing(self):
-        """安排批量处理"""
-        if self.batch_timer:
-            self.batch_timer.cancel()
-        
-        # 去重处理
-        unique_files = list(set(self.pending_files))
-        self.pending_files = unique_files
-        
-        # 延长延迟时间到5秒，避免频繁触发
-        self.batch_timer = threading.Timer(5.0, self.process_pending_files)
-        self.batch_timer.start()
+        enable_multithread = config.get('enable_multithread_transfer', 'False').lower() == 'true'
+        workers = int(config.get('transfer_thread_count', '4')) if enable_multithread else 1
+        stable_seconds = float(config.get('file_stable_seconds', '10'))
+        # 待处理文件队列，文件大小和修改时间稳定后才会处理
+        self.pending_files = TransferQueue(self.process_pending_file, workers=workers, settle_delay=stable_seconds)
+
+    def process_pending_file(self, file_path):
+        """处理队列中的单个文件（在常驻线程池中执行）"""
+        if not os.path.exists(file_path):
+            logging.warning(f"文件不存在，跳过处理: {file_path}")
+            return
+        process_file(file_path, self.processed_files)
+
+    def enqueue_file(self, file_path, delay=None, background=False):
+        """加入待处理队列，同一文件只保留一项，重复事件会重新计时"""
+        queued = file_path in self.pending_files
+        if not self.pending_files.submit(file_path, delay, background):
+            logging.debug(f"文件正在处理中，跳过: {file_path}")
+        elif queued:
+            logging.debug(f"文件已在待处理队列中，重新计时: {file_path}")
 
     def on_created(self, event):
         if event.is_directory:
@@ -2576,35 +2528,26 @@ class CustomFileHandler(FileSystemEventHandler):
                 logging.debug(f"发现下载未完成文件: {file_path}，开始监控")
             return
         else:
-            # 检查是否已经在待处理队列中
-            if file_path not in self.pending_files:
-                logging.debug(f"新文件创建: {file_path}")
-                # 添加到待处理队列
-                self.pending_files.append(file_path)
-                self.schedule_batch_processing()
-            else:
-                logging.debug(f"文件已在待处理队列中，跳过: {file_path}")
+            logging.debug(f"新文件创建: {file_path}")
+            self.enqueue_file(file_path)
 
     def on_modified(self, event):
         if event.is_directory:
             return
 
         file_path = event.src_path
+        # 下载中的文件每写入一块都会触发修改事件，已在队列中的文件交由稳定性检查判断是否写入完成
+        if file_path in self.pending_files:
+            return
+
         filename = os.path.basename(file_path)
 
-        # 忽略隐藏文件
-        if filename.startswith('.'):
-            logging.debug(f"忽略隐藏文件: {file_path}")
+        # 忽略隐藏文件和非视频文件（仅按文件名判断，不访问磁盘）
+        if filename.startswith('.') or not is_common_video_file(filename):
             return
 
         # 忽略小于5MB的文件
         if is_small_file(file_path):
-            logging.debug(f"忽略小于5MB的文件: {file_path}")
-            return
-
-        # 跳过非视频文件
-        if not is_common_video_file(filename):
-            logging.debug(f"忽略非视频文件: {file_path}")
             return
 
         # 检查是否为未完成下载的文件
@@ -2619,23 +2562,11 @@ class CustomFileHandler(FileSystemEventHandler):
             if not is_unfinished_download_file(filename):
                 self.unfinished_files.remove(file_path)
                 logging.info(f"下载文件已完成: {file_path}，开始处理")
-                # 检查是否已经在待处理队列中
-                if file_path not in self.pending_files:
-                    # 添加到待处理队列
-                    self.pending_files.append(file_path)
-                    self.schedule_batch_processing()
-                else:
-                    logging.debug(f"文件已在待处理队列中，跳过: {file_path}")
+                self.enqueue_file(file_path)
         else:
             logging.debug(f"文件修改: {file_path}")
-            if filename not in self.processed_files:
-                # 检查是否已经在待处理队列中
-                if file_path not in self.pending_files:
-                    # 添加到待处理队列
-                    self.pending_files.append(file_path)
-                    self.schedule_batch_processing()
-                else:
-                    logging.debug(f"文件已在待处理队列中，跳过: {filename}")
+            if file_path not in self.processed_files:
+                self.enqueue_file(file_path)
             else:
                 logging.debug(f"文件已处理，跳过: {filename}")
 
@@ -2652,17 +2583,99 @@ class CustomFileHandler(FileSystemEventHandler):
             return
         
         logging.debug(f"文件重命名: {old_file_path} -> {new_file_path}")
-        if new_filename not in self.processed_files:
-            # 检查是否已经在待处理队列中
-            if new_file_path not in self.pending_files:
-                # 添加到待处理队列
-                self.pending_files.append(new_file_path)
-                self.schedule_batch_processing()
-            else:
-                logging.debug(f"文件已在待处理队列中，跳过: {new_filename}")
+        if new_file_path not in self.processed_files:
+            self.enqueue_file(new_file_path)
         else:
             logging.debug(f"文件已处理，跳过: {new_filename}")
 
+    def on_closed(self, event):
+        """文件写入后关闭（inotify IN_CLOSE_WRITE），缩短稳定期提前检查（部分下载客户端会在下载途中关闭文件）"""
+        if event.is_directory:
+            return
+
+        file_path = event.src_path
+        filename = os.path.basename(file_path)
+
+        if filename.startswith('.') or not is_common_video_file(filename) or is_unfinished_download_file(filename):
+            return
+        if is_small_file(file_path) or file_path in self.processed_files:
+            return
+
+        logging.debug(f"文件写入后关闭: {file_path}")
+        self.unfinished_files.discard(file_path)
+        self.enqueue_file(file_path, delay=min(DEFAULT_CLOSE_SETTLE_DELAY, self.pending_files.settle_delay))
+
+def backfill_existing_files(directory, event_handler):
+    """
+    扫描下载目录中已存在的文件并加入处理队列（在后台线程中执行，实时事件优先处理）。
+    目录中的文件全部处理过时记录目录指纹（修改时间、条目数及各文件的大小和修改时间），
+    下次启动时跳过指纹未变化目录中的文件检查；原地覆盖的文件会改变文件的大小或修改时间，不会被跳过。
+    """
+    processed_files = event_handler.processed_files
+    queued_count = skipped_count = 0
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            dir_mtime = os.stat(current).st_mtime_ns
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            logging.warning(f"扫描目录失败: {current}, 错误: {e}")
+            continue
+
+        files = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                # 排除特定目录
+                if "云盘缓存文件" not in entry.name and not entry.name.startswith('.'):
+                    stack.append(entry.path)
+            elif entry.is_file():
+                files.append(entry)
+
+        digest = hashlib.md5()
+        for entry in sorted(files, key=lambda e: e.name):
+            try:
+                st = entry.stat()
+                digest.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+            except OSError:
+                digest.update(f"{entry.name}\n".encode('utf-8', 'surrogateescape'))
+        fingerprint = f"{dir_mtime}:{len(entries)}:{digest.hexdigest()}"
+        if processed_files.directory_unchanged(current, fingerprint):
+            skipped_count += 1
+            continue
+
+        unfinished = False
+        for entry in files:
+            filename = entry.name
+            # 忽略隐藏文件
+            if filename.startswith('.'):
+                continue
+
+            # 明确跳过未完成下载的文件
+            if is_unfinished_download_file(filename):
+                logging.debug(f"跳过未完成下载文件: {entry.path}")
+                unfinished = True
+                continue
+
+            # 只处理已完成且不小于5MB的视频文件，交给线程池处理
+            if not is_common_video_file(filename):
+                continue
+            try:
+                if entry.stat().st_size < 5 * 1024 * 1024:
+                    continue
+            except OSError:
+                continue
+            if entry.path not in processed_files:
+                event_handler.enqueue_file(entry.path, background=True)
+                unfinished = True
+                queued_count += 1
+
+        if not unfinished:
+            processed_files.mark_directory(current, fingerprint)
+
+    logging.info(f"已有文件扫描完成，加入处理队列 {queued_count} 个文件，跳过未变化目录 {skipped_count} 个")
+
 def start_monitoring(directory):
     logging.info(f"开始监控目录: {directory}")
     event_handler = CustomFileHandler()
@@ -2670,44 +2683,16 @@ def start_monitoring(directory):
     observer.schedule(event_handler, directory, recursive=True)
     observer.start()
     try:
-        # 处理已存在的文件
-        for root, dirs, files in os.walk(directory):
-            # 排除特定目录
-            dirs[:] = [d for d in dirs if "云盘缓存文件" not in d and not d.startswith('.')]
-
-            # 收集所有视频文件
-            video_files = []
-            for file in files:
-                file_path = os.path.join(root, file)
-                filename = os.path.basename(file_path)
-
-                # 忽略隐藏文件和小于5MB的文件
-                if filename.startswith('.') or is_small_file(file_path):
-                    continue
-
-                # 明确跳过未完成下载的文件
-                if is_unfinished_download_file(filename):
-                    logging.debug(f"跳过未完成下载文件: {file_path}")
-                    continue
+        # 在后台处理已存在的文件，不阻塞实时事件
+        threading.Thread(target=backfill_existing_files, args=(directory, event_handler),
+                         name="backfill", daemon=True).start()
 
-                # 只处理已完成的视频文件
-                if is_common_video_file(filename):
-                    if filename not in event_handler.processed_files:
-                        video_files.append(file_path)
-            
-            # 如果当前目录中有多个视频文件，使用批量处理
-            if len(video_files) >= 2:
-                logging.debug(f"发现目录 {root} 中有 {len(video_files)} 个未处理的视频文件，使用批量处理")
-                process_files_in_batch(video_files, event_handler.processed_files)
-            elif len(video_files) == 1:
-                # 单个文件单独处理
-                process_file(video_files[0], event_handler.processed_files)
-                
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
+    library_refresh.flush()
     logging.info("实时监控已停止")
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+from pipeline import get_db_pool
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 各类接口的缓存有效期（秒），过期后携带 ETag/Last-Modified 重新验证
+ENDPOINT_TTLS = {
+    "search": 24 * 3600,
+    "detail": 3 * 24 * 3600,
+    "season": 24 * 3600,
+    "episode": 3 * 24 * 3600,
+}
+# 缓存条目上限，超出时淘汰最久未访问的条目
+MAX_ENTRIES = 20000
+# 每写入多少次检查一次缓存大小
+PRUNE_EVERY = 200
+
+# 不参与缓存键的参数
+_IGNORED_PARAMS = {"api_key"}
+
+_write_count = 0
+_write_lock = threading.Lock()
+
+
+def endpoint_type(url):
+    """根据请求路径判断接口类型：search / episode / season / detail"""
+    path = urlsplit(url).path
+    if "/search/" in path:
+        return "search"
+    if re.search(r"/tv/\d+/season/\d+/episode/\d+", path):
+        return "episode"
+    if re.search(r"/tv/\d+/season/\d+", path):
+        return "season"
+    return "detail"
+
+
+def cache_key(url, params=None):
+    """缓存键：去掉 API Key 后按参数名排序的完整 URL"""
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items()
+                   if k not in _IGNORED_PARAMS and v is not None)
+    return f"{url}?{urlencode(items)}" if items else url
+
+
+def _cached_response(url, body, headers):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = "utf-8"
+    response.headers.update(headers)
+    response.from_cache = True
+    return response
+
+
+def _lookup(key, db_path):
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT BODY, HEADERS, ETAG, LAST_MODIFIED, FETCHED_AT FROM TMDB_CACHE WHERE CACHE_KEY = ?",
+                (key,)
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                cursor.execute("UPDATE TMDB_CACHE SET ACCESSED_AT = ? WHERE CACHE_KEY = ?", (time.time(), key))
+            return row
+    except sqlite3.Error as e:
+        logging.debug(f"读取 TMDB 缓存失败: {e}")
+        return None
+
+
+def _store(key, endpoint, response, db_path):
+    global _write_count
+    now = time.time()
+    headers = {name: response.headers[name] for name in ("Content-Type",) if name in response.headers}
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO TMDB_CACHE
+                   (CACHE_KEY, ENDPOINT, BODY, HEADERS, ETAG, LAST_MODIFIED, FETCHED_AT, ACCESSED_AT)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (key, endpoint, response.content, json.dumps(headers), response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"), now, now)
+            )
+        with _write_lock:
+            _write_count += 1
+            should_prune = _write_count % PRUNE_EVERY == 0
+        if should_prune:
+            prune(db_path=db_path)
+    except sqlite3.Error as e:
+        logging.debug(f"写入 TMDB 缓存失败: {e}")
+
+
+def _touch(key, db_path):
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            now = time.time()
+            conn.execute("UPDATE TMDB_CACHE SET FETCHED_AT = ?, ACCESSED_AT = ? WHERE CACHE_KEY = ?", (now, now, key))
+    except sqlite3.Error as e:
+        logging.debug(f"更新 TMDB 缓存失败: {e}")
+
+
+def tmdb_get(url, params=None, timeout=10, session=None, db_path=DB_PATH):
+    """
+    带持久化缓存的 TMDB GET 请求，返回 requests.Response。
+    有效期内直接返回缓存（response.from_cache 为 True）；过期后携带 ETag/Last-Modified 重新验证，
+    304 时沿用缓存内容。请求失败但存在过期缓存时返回过期缓存，仅缓存状态码为 200 的响应。
+    """
+    key = cache_key(url, params)
+    endpoint = endpoint_type(url)
+    cached = _lookup(key, db_path)
+    if cached is not None:
+        body, headers, etag, last_modified, fetched_at = cached
+        headers = json.loads(headers or "{}")
+        if time.time() - (fetched_at or 0) < ENDPOINT_TTLS[endpoint]:
+            return _cached_response(url, body, headers)
+
+    request_headers = {}
+    if cached is not None:
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if last_modified:
+            request_headers["If-Modified-Since"] = last_modified
+
+    try:
+        response = (session or requests).get(url, params=params, headers=request_headers or None, timeout=timeout)
+    except requests.RequestException:
+        if cached is not None:
+            logging.warning(f"TMDB 请求失败，使用过期缓存: {endpoint} {urlsplit(url).path}")
+            return _cached_response(url, body, headers)
+        raise
+
+    if response.status_code == 304 and cached is not None:
+        _touch(key, db_path)
+        return _cached_response(url, body, headers)
+    response.from_cache = False
+    if response.status_code == 200:
+        _store(key, endpoint, response, db_path)
+    return response
+
+
+def prune(max_entries=MAX_ENTRIES, db_path=DB_PATH):
+    """按最近访问时间淘汰超出上限的缓存条目"""
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            removed = conn.execute(
+                '''DELETE FROM TMDB_CACHE WHERE CACHE_KEY IN (
+                       SELECT CACHE_KEY FROM TMDB_CACHE ORDER BY ACCESSED_AT DESC LIMIT -1 OFFSET ?
+                   )''',
+                (max_entries,)
+            ).rowcount
+        if removed:
+            logging.info(f"已淘汰 {removed} 条 TMDB 缓存")
+    except sqlite3.Error as e:
+        logging.debug(f"清理 TMDB 缓存失败: {e}")
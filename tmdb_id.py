@@ -1,9 +1,8 @@
-import os
-import re
 import sqlite3
-import xml.etree.ElementTree as ET
 import logging
-import requests
+from tmdb_cache import tmdb_get
+from http_engine import PoliteSession, run_concurrently
+from library_catalog import get_catalog
 
 # 配置日志
 logging.basicConfig(
@@ -15,6 +14,11 @@ logging.basicConfig(
     ]
 )
 
+# 本地 NFO 中找不到时，同时向 TMDB 查询的记录数及请求速率（次/秒）
+TMDB_LOOKUP_WORKERS = 8
+TMDB_RATE_PER_SECOND = 10.0
+TMDB_BURST = 10
+
 def load_config(db_path):
     """从数据库中加载配置"""
     try:
@@ -30,65 +34,44 @@ def load_config(db_path):
         logging.error(f"数据库加载配置错误: {e}")
         exit(0)
 
+def normalize_key(title, year):
+    """标题和年份的比较键：标题去除首尾空白并转为小写，年份转为字符串"""
+    title = title.strip().lower() if title is not None else None
+    year = str(year).strip() if year is not None else None
+    return title, year
+
 def parse_nfo(file_path):
     """解析NFO文件，返回title, year和tmdb id"""
     logging.debug(f"解析NFO文件: {file_path}")
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # 查找<title>元素
-        title_element = root.find('title')
-        title = title_element.text.strip().lower() if title_element is not None and title_element.text is not None else None
-        
-        # 查找<year>元素
-        year_element = root.find('year')
-        year = year_element.text.strip() if year_element is not None and year_element.text is not None else None
-        
-        # 查找<uniqueid type="tmdb">元素
-        tmdb_id_element = root.find(".//uniqueid[@type='tmdb']")
-        tmdb_id = tmdb_id_element.text.strip() if tmdb_id_element is not None and tmdb_id_element.text is not None else None
-        
-        logging.debug(f"解析结果: 标题: {title}, 年份: {year}, tmdb_id: {tmdb_id}")
-        return title, year, tmdb_id
-    except Exception as e:
-        logging.error(f"解析 {file_path} 时出错: {e}")
+    nfo = get_catalog().nfo(file_path)
+    if nfo is None or nfo['error']:
+        logging.error(f"解析 {file_path} 时出错: {nfo['error'] if nfo else '文件无法读取'}")
         return None, None, None
 
-def find_and_parse_nfo_files(directory, title, year):
-    """在给定目录中查找所有NFO文件并解析它们，返回匹配的tmdb_id"""
-    logging.info(f"在目录 {directory} 中查找所有NFO文件，标题: {title}, 年份: {year}")
-    title = title.lower().strip()
-    
-    # 处理年份为None的情况
-    if year is not None:
-        year = str(year).strip()  # 确保 year 是字符串类型
-    else:
-        year = None
-    
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.nfo'):
-                file_path = os.path.join(root, file)
-                parsed_title, parsed_year, tmdb_id = parse_nfo(file_path)
-                
-                # 如果输入年份为None，则只比较标题
-                if year is None:
-                    if parsed_title == title:
-                        logging.info(f"找到匹配的NFO文件(仅标题匹配): {file_path}, tmdb_id: {tmdb_id}")
-                        return tmdb_id
-                else:
-                    # 同时比较标题和年份
-                    if parsed_title == title and parsed_year == year:
-                        logging.info(f"找到匹配的NFO文件: {file_path}, tmdb_id: {tmdb_id}")
-                        return tmdb_id
-                        
-                logging.debug(f"不匹配的NFO文件: {file_path}, 解析标题: {parsed_title}, 解析年份: {parsed_year}")
-    
-    logging.info(f"未找到匹配的NFO文件，标题: {title}, 年份: {year}")
-    return None
+    title, year = normalize_key(nfo['title'], nfo['year'])
+    tmdb_id = nfo['uniqueids'].get('tmdb')
+    tmdb_id = tmdb_id.strip() if tmdb_id is not None else None
+
+    logging.debug(f"解析结果: 标题: {title}, 年份: {year}, tmdb_id: {tmdb_id}")
+    return title, year, tmdb_id
 
-def query_tmdb_api(title, year, media_type, config):
+def build_nfo_index(directory):
+    """
+    遍历一次目录中的所有NFO文件，返回 {(标题, 年份): tmdb_id}。
+    同一标题和年份对应多个NFO文件时取遍历顺序中第一个带有tmdb_id的文件。
+    """
+    logging.info(f"在目录 {directory} 中建立NFO文件索引")
+    index = {}
+    count = 0
+    for file_path in get_catalog().iter_files(directory, suffix='.nfo'):
+        count += 1
+        title, year, tmdb_id = parse_nfo(file_path)
+        if title and tmdb_id and (title, year) not in index:
+            index[(title, year)] = tmdb_id
+    logging.info(f"已解析 {count} 个NFO文件，索引中有 {len(index)} 个标题")
+    return index
+
+def query_tmdb_api(title, year, media_type, config, session=None):
     """通过TMDB API查询获取tmdb_id"""
     TMDB_API_KEY = config['tmdb_api_key']
     TMDB_BASE_URL = config['tmdb_base_url']
@@ -101,7 +84,7 @@ def query_tmdb_api(title, year, media_type, config):
     }
     logging.info(f"通过TMDB API查询 {title} 获取tmdb_id")
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_get(url, params=params, timeout=10, session=session)
         response.raise_for_status()
         search_results = response.json().get('results', [])
         
@@ -132,29 +115,18 @@ def query_tmdb_api(title, year, media_type, config):
     logging.info(f"未找到匹配的tmdb_id, 标题: {title}, 年份: {year}")
     return None
 
-def update_database(db_path, table, title, year, tmdb_id):
-    """更新数据库中的tmdb_id字段"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-        
-    # 查询是否存在相同的title和year
-    cursor.execute(f"SELECT tmdb_id FROM {table} WHERE title = ? AND year = ?", (title, year))
-    row = cursor.fetchone()
-    
-    if row:
-        existing_tmdb_id = row[0]
-        if existing_tmdb_id:
-            logging.debug(f"跳过处理：标题 '{title}'，年份 '{year}' 和 tmdb_id '{existing_tmdb_id}'")
-            return
-        
-        # 更新tmdb_id字段
-        cursor.execute(f"UPDATE {table} SET tmdb_id = ? WHERE title = ? AND year = ?", (tmdb_id, title, year))
-        conn.commit()
+def update_database(db_path, table, updates):
+    """批量更新数据库中的tmdb_id字段，updates 为 [(title, year, tmdb_id)]，已有tmdb_id的记录不覆盖"""
+    if not updates:
+        return
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE {table} SET tmdb_id = ? WHERE title = ? AND year = ? AND (tmdb_id IS NULL OR tmdb_id = '')",
+            [(tmdb_id, title, year) for title, year, tmdb_id in updates]
+        )
+    for title, year, tmdb_id in updates:
         logging.info(f"更新数据库记录：标题: {title}, 年份: {year}, tmdb_id: {tmdb_id}")
-    else:
-        logging.info(f"在表 {table} 中未找到标题 '{title}' 和年份 '{year}'")
-    
-    conn.close()
 
 def fetch_data_without_tmdb_id(db_path, table):
     """从数据库中获取没有tmdb_id的数据"""
@@ -167,54 +139,55 @@ def fetch_data_without_tmdb_id(db_path, table):
     logging.debug(f"获取到 {len(rows)} 条没有tmdb_id的数据")
     return rows
 
-def main():
+def resolve_missing_tmdb_ids(db_path, table, directory, media_type, config, session):
+    """为表中没有tmdb_id的记录补全tmdb_id：先查本地NFO索引，未命中的记录再并发查询TMDB"""
+    label = '电影' if media_type == 'movie' else '电视剧'
+    rows = []
+    for title, year in fetch_data_without_tmdb_id(db_path, table):
+        # 跳过年份为空的记录
+        if not year:
+            logging.info(f"跳过年份为空的{label}记录: {title}")
+            continue
+        rows.append((title, year))
+    if not rows:
+        logging.info(f"没有需要处理的{label}记录")
+        return
+
+    index = build_nfo_index(directory)
+    updates, misses = [], []
+    for title, year in rows:
+        tmdb_id = index.get(normalize_key(title, year))
+        if tmdb_id:
+            logging.info(f"找到匹配的NFO文件, 标题: {title}, 年份: {year}, tmdb_id: {tmdb_id}")
+            updates.append((title, year, tmdb_id))
+        else:
+            misses.append((title, year))
+    logging.info(f"{label}记录 {len(rows)} 条，本地NFO匹配 {len(updates)} 条，需查询TMDB {len(misses)} 条")
+
+    results = run_concurrently(
+        lambda row: query_tmdb_api(row[0], row[1], media_type, config, session=session),
+        misses, max_workers=TMDB_LOOKUP_WORKERS, thread_name_prefix="tmdb"
+    )
+    updates.extend((title, year, tmdb_id) for (title, year), tmdb_id in zip(misses, results) if tmdb_id)
+    update_database(db_path, table, updates)
+
+def main(config=None):
     # 从配置文件中读取路径信息
     db_path = '/config/data.db'
-    config = load_config(db_path)
+    if config is None:
+        config = load_config(db_path)
     movies_path = config['movies_path']
     episodes_path = config['episodes_path']
 
-    # 获取数据库中没有tmdb_id的电影记录
-    movies_without_tmdb_id = fetch_data_without_tmdb_id(db_path, 'LIB_MOVIES')
-
-    # 获取数据库中没有tmdb_id的电视剧记录
-    episodes_without_tmdb_id = fetch_data_without_tmdb_id(db_path, 'LIB_TVS')
-
-    # 检查是否有需要处理的电影记录
-    if movies_without_tmdb_id:
-        for title, year in movies_without_tmdb_id:
-            # 跳过年份为空的记录
-            if not year:
-                logging.info(f"跳过年份为空的电影记录: {title}")
-                continue
-                
-            logging.info(f"处理电影记录, 标题: {title}, 年份: {year}")
-            # 尝试从NFO文件中读取tmdb_id
-            tmdb_id = find_and_parse_nfo_files(movies_path, title, year)
-            if not tmdb_id:
-                # 调用TMDB API获取tmdb_id
-                tmdb_id = query_tmdb_api(title, year, 'movie', config)
-            update_database(db_path, 'LIB_MOVIES', title, year, tmdb_id)
-    else:
-        logging.info("没有需要处理的电影记录")
-
-    # 检查是否有需要处理的电视剧记录
-    if episodes_without_tmdb_id:
-        for title, year in episodes_without_tmdb_id:
-            # 跳过年份为空的记录
-            if not year:
-                logging.info(f"跳过年份为空的电视剧记录: {title}")
-                continue
-                
-            logging.info(f"处理电视剧记录, 标题: {title}, 年份: {year}")
-            # 尝试从NFO文件中读取tmdb_id
-            tmdb_id = find_and_parse_nfo_files(episodes_path, title, year)
-            if not tmdb_id:
-                # 调用TMDB API获取tmdb_id
-                tmdb_id = query_tmdb_api(title, year, 'tv', config)
-            update_database(db_path, 'LIB_TVS', title, year, tmdb_id)
-    else:
-        logging.info("没有需要处理的电视剧记录")
+    # TMDB 请求共享一个会话，按站点限制并发数和请求速率
+    session = PoliteSession(host_concurrency=TMDB_LOOKUP_WORKERS, rate_per_second=TMDB_RATE_PER_SECOND,
+                            burst=TMDB_BURST)
+    try:
+        resolve_missing_tmdb_ids(db_path, 'LIB_MOVIES', movies_path, 'movie', config, session)
+        resolve_missing_tmdb_ids(db_path, 'LIB_TVS', episodes_path, 'tv', config, session)
+    finally:
+        session.close()
+    get_catalog().flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from contextlib import contextmanager, ExitStack
+
+# 文件大小和修改时间保持不变多久后视为写入完成（秒）
+DEFAULT_SETTLE_DELAY = 10.0
+# 收到文件关闭写入事件后的稳定期（秒）：下载客户端可能在下载途中关闭文件（暂停、校验、句柄池淘汰），
+# 关闭事件只用于提前检查，仍需确认大小和修改时间在此期间未变化
+DEFAULT_CLOSE_SETTLE_DELAY = 2.0
+# 待处理文件数上限，超出时后台提交方（如启动扫描）阻塞等待
+DEFAULT_MAX_PENDING = 1000
+# 同一磁盘（设备）上同时进行的复制/跨盘移动数
+DEFAULT_DEVICE_CONCURRENCY = 1
+
+_device_slots = {}
+_device_slots_lock = threading.Lock()
+
+
+def _device_of(path):
+    """路径所在设备号，路径不存在时取最近的已存在上级目录"""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def file_signature(path):
+    """文件的 (大小, 修改时间)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+@contextmanager
+def device_slot(*paths, concurrency=DEFAULT_DEVICE_CONCURRENCY):
+    """占用 paths 所在各设备的 I/O 槽位，按设备号顺序获取以避免死锁"""
+    devices = sorted({dev for dev in map(_device_of, paths) if dev is not None})
+    with ExitStack() as stack:
+        for dev in devices:
+            with _device_slots_lock:
+                slot = _device_slots.get(dev)
+                if slot is None:
+                    slot = threading.BoundedSemaphore(max(1, concurrency))
+                    _device_slots[dev] = slot
+            stack.enter_context(slot)
+        yield
+
+
+class TransferQueue:
+    """
+    常驻的文件处理线程池。
+    按路径去重，到期时检查文件大小和修改时间，在 settle_delay 秒内保持不变才视为写入完成并进入就绪队列，
+    否则重新计时；就绪文件按大小从小到大处理（单集、小文件优先于大体积原盘），
+    实时事件提交的文件优先于后台扫描提交的文件。
+    """
+    def __init__(self, handler, workers=1, settle_delay=DEFAULT_SETTLE_DELAY, max_pending=DEFAULT_MAX_PENDING,
+                 name="transfer"):
+        self.handler = handler
+        self.settle_delay = settle_delay
+        self.max_pending = max(1, max_pending)
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> 序号，序号用于识别过期的队列条目
+        self._signatures = {}  # path -> 上次检查时的 (大小, 修改时间)
+        self._background = set()  # 由后台扫描提交的文件
+        self._active = set()
+        self._delayed = []  # (就绪时间, 序号, 路径)
+        self._ready = []  # (是否后台, 文件大小, 序号, 路径)
+        self._seq = 0
+        self._threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"{name}-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def __contains__(self, path):
+        with self._cond:
+            return path in self._pending
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def submit(self, path, delay=None, background=False):
+        """
+        提交文件；已在队列中的文件重新计时。
+        delay 小于 settle_delay 时（如收到 IN_CLOSE_WRITE）提前检查，期间大小或修改时间变化则按 settle_delay 重新计时。
+        background=True 表示由后台扫描提交，排在实时事件之后，待处理文件过多时阻塞等待。
+        返回 False 表示文件正在处理中，未重复提交。
+        """
+        delay = self.settle_delay if delay is None else delay
+        with self._cond:
+            if path in self._active:
+                return False
+            if background:
+                if path in self._pending:
+                    return True
+                while len(self._pending) >= self.max_pending:
+                    self._cond.wait()
+                self._background.add(path)
+            else:
+                self._background.discard(path)
+            self._seq += 1
+            self._pending[path] = self._seq
+            self._signatures[path] = file_signature(path)
+            heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, path))
+            self._cond.notify_all()
+            return True
+
+    def _promote(self, now):
+        """将到期且已稳定的条目移入就绪队列，返回下一个条目的到期时间"""
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, path = heapq.heappop(self._delayed)
+            if self._pending.get(path) != seq:
+                continue
+            signature = file_signature(path)
+            if signature is None:
+                logging.debug(f"文件已不存在，移出待处理队列: {path}")
+                self._forget(path)
+                continue
+            if signature != self._signatures.get(path):
+                # 文件仍在写入，重新计时
+                self._signatures[path] = signature
+                heapq.heappush(self._delayed, (now + self.settle_delay, seq, path))
+                continue
+            heapq.heappush(self._ready, (path in self._background, signature[0], seq, path))
+        return self._delayed[0][0] if self._delayed else None
+
+    def _forget(self, path):
+        del self._pending[path]
+        self._signatures.pop(path, None)
+        self._background.discard(path)
+        self._cond.notify_all()
+
+    def _take(self):
+        with self._cond:
+            while True:
+                next_due = self._promote(time.monotonic())
+                while self._ready:
+                    _, _, seq, path = heapq.heappop(self._ready)
+                    if self._pending.get(path) != seq:
+                        continue
+                    self._forget(path)
+                    self._active.add(path)
+                    return path
+                self._cond.wait(None if next_due is None else max(0, next_due - time.monotonic()))
+
+    def _worker(self):
+        while True:
+            path = self._take()
+            try:
+                self.handler(path)
+            except Exception as e:
+                logging.error(f"处理文件时出错 {path}: {e}")
+            finally:
+                with self._cond:
+                    self._active.discard(path)
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from pipeline import get_db_pool
+
+# 数据库文件路径（允许通过环境变量覆盖，便于本地运行）
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 事件类型
+EVENT_SUBSCRIPTION_ADDED = "subscription_added"    # WEB 手动添加/推荐订阅，直接写入 MISS_* 表
+EVENT_DOUBAN_UPDATED = "douban_updated"            # 豆瓣想看中出现新条目，写入 RSS_* 表
+EVENT_TRANSFER_COMPLETED = "transfer_completed"    # 下载完成的文件已转移入库
+
+# 索引子进程通过该环境变量接收本次需要处理的标题范围（JSON 数组）
+TITLE_SCOPE_ENV = "MEDIAMASTER_SCOPE_TITLES"
+# 媒体库扫描/刮削子进程通过该环境变量接收本次需要处理的影视目录（JSON 对象 {"movie": [...], "tv": [...]}）
+PATH_SCOPE_ENV = "MEDIAMASTER_SCOPE_PATHS"
+
+
+def publish(event, titles=None, db_path=DB_PATH):
+    """
+    发布触发事件，由主程序在下一次轮询时调度受影响的阶段。
+    事件写入失败不影响调用方，定时全量流程仍会兜底处理。
+    """
+    titles = [t for t in (titles or []) if t] or [None]
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            conn.executemany(
+                "INSERT INTO PIPELINE_EVENTS (EVENT, TITLE, CREATED_AT) VALUES (?, ?, ?)",
+                [(event, title, time.time()) for title in titles]
+            )
+        logging.debug(f"已发布触发事件 {event}: {titles}")
+    except sqlite3.Error as e:
+        logging.warning(f"发布触发事件 {event} 失败: {e}")
+
+
+def consume(db_path=DB_PATH):
+    """
+    取出并删除全部待处理事件，按事件类型合并标题。
+    返回 {事件类型: 标题集合}，集合中的 None 表示该事件不限定标题。
+    """
+    events = {}
+    try:
+        with get_db_pool(db_path).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ID, EVENT, TITLE FROM PIPELINE_EVENTS ORDER BY ID")
+            rows = cursor.fetchall()
+            if rows:
+                cursor.execute("DELETE FROM PIPELINE_EVENTS WHERE ID <= ?", (rows[-1][0],))
+    except sqlite3.Error as e:
+        logging.warning(f"读取触发事件失败: {e}")
+        return events
+    for _, event, title in rows:
+        events.setdefault(event, set()).add(title)
+    return events
+
+
+def title_scope_env(titles):
+    """生成传递给索引子进程的环境变量"""
+    env = dict(os.environ)
+    if titles:
+        env[TITLE_SCOPE_ENV] = json.dumps(sorted(titles), ensure_ascii=False)
+    else:
+        env.pop(TITLE_SCOPE_ENV, None)
+    return env
+
+
+def title_scope_from_env():
+    """读取本进程的标题范围，未设置时返回 None 表示处理全部订阅"""
+    raw = os.environ.get(TITLE_SCOPE_ENV)
+    if not raw:
+        return None
+    try:
+        return set(json.loads(raw))
+    except ValueError:
+        logging.warning(f"无法解析标题范围: {raw}")
+        return None
+
+
+def filter_scoped_rows(rows, titles=None):
+    """按标题范围过滤订阅查询结果（每行第一列为标题）"""
+    if titles is None:
+        titles = title_scope_from_env()
+    if not titles:
+        return rows
+    return [row for row in rows if row[0] in titles]
+
+
+def path_scope_env(scope):
+    """生成传递给媒体库扫描/刮削子进程的环境变量，scope 为空时处理整个媒体库"""
+    env = dict(os.environ)
+    if scope:
+        env[PATH_SCOPE_ENV] = json.dumps({kind: sorted(paths) for kind, paths in scope.items()}, ensure_ascii=False)
+    else:
+        env.pop(PATH_SCOPE_ENV, None)
+    return env
+
+
+def path_scope_from_env():
+    """读取本进程的影视目录范围，未设置时返回 None 表示处理整个媒体库"""
+    raw = os.environ.get(PATH_SCOPE_ENV)
+    if not raw:
+        return None
+    try:
+        scope = json.loads(raw)
+    except ValueError:
+        logging.warning(f"无法解析目录范围: {raw}")
+        return None
+    return {"movie": scope.get("movie", []), "tv": scope.get("tv", [])}
@@ -15,6 +15,9 @@ import os
 import re
 import argparse
 from captcha_handler import CaptchaHandler
+from trigger_bus import filter_scoped_rows
+from result_store import save_results
+from webdriver_pool import lease_driver
 from pathlib import Path
 import shutil
 
@@ -53,6 +56,11 @@ class TvshowIndexer:
         if hasattr(self, 'driver') and self.driver is not None:
             logging.info("WebDriver已经初始化，无需重复初始化")
             return
+        # 优先租用站点常驻浏览器，复用已登录的会话；浏览器池不可用时再独立启动
+        self.driver = lease_driver("hdtv", self.config, download_dir="/Torrent")
+        if self.driver is not None:
+            logging.info("WebDriver初始化完成（常驻浏览器）")
+            return
         options = Options()
         options.add_argument('--headless=new')  # 使用新版无头模式
         options.add_argument('--no-sandbox')
@@ -244,7 +252,7 @@ class TvshowIndexer:
             
             # 读取订阅的电视节目信息和缺失的集数信息
             cursor.execute('SELECT title, year, season, missing_episodes FROM MISS_TVS')
-            tvs = cursor.fetchall()
+            tvs = filter_scoped_rows(cursor.fetchall())
             
             for title, year, season, missing_episodes in tvs:
                 # 确保 year 和 season 是字符串类型
@@ -418,8 +426,8 @@ class TvshowIndexer:
                             "popularity": result['popularity']  # 添加热度数据
                         })
 
-                # 保存结果到 JSON 文件
-                self.save_results_to_json(item['剧集'], item['季'], item['年份'], categorized_results)
+                # 保存结果到索引结果库
+                self.save_index_results(item['剧集'], item['季'], item['年份'], categorized_results)
 
             except TimeoutException:
                 logging.error("搜索结果为空或加载超时")
@@ -442,30 +450,14 @@ class TvshowIndexer:
             logging.warning(f"提取热度数据时出错: {e}")
             return 0
     
-    def save_results_to_json(self, title, season, year, categorized_results):
-        """将结果保存到 JSON 文件"""
-        # 根据是否有季信息来决定文件名格式
-        if season:
-            file_name = f"{title}-S{season}-{year}-HDTV.json"
-        else:
-            file_name = f"{title}-{year}-HDTV.json"
-        
-        file_path = os.path.join("/tmp/index", file_name)
-
+    def save_index_results(self, title, season, year, categorized_results):
+        """将结果保存到索引结果库"""
         try:
-            # 检查并创建目录
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-            # 检查文件是否存在
-            if os.path.exists(file_path):
-                logging.info(f"索引已存在，将覆盖: {file_path}")
-    
-            # 保存文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(categorized_results, f, ensure_ascii=False, indent=4)
-            logging.info(f"结果已保存到 {file_path}")
+            count = save_results(title, year, "HDTV", categorized_results, season=season, db_path=self.db_path)
+            season_text = f" 第{season}季" if season else ""
+            logging.info(f"结果已保存到索引结果库: {title} ({year}){season_text}，共 {count} 条")
         except Exception as e:
-            logging.error(f"保存结果到 JSON 文件时出错: {e}")
+            logging.error(f"保存索引结果时出错: {e}")
 
     def extract_details(self, title_text):
         """
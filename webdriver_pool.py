@@ -0,0 +1,383 @@
+import os
+import json
+import time
+import shutil
+import logging
+import subprocess
+import urllib.request
+
+import psutil
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地运行时不启用常驻浏览器池，各脚本沿用独立启动方式
+    fcntl = None
+
+# 池状态与租约锁目录（容器重启后随浏览器一同失效）
+POOL_DIR = "/tmp/webdriver_pool"
+# 常驻浏览器的用户配置目录，按站点区分并持久保存，登录状态和 Cookie 在重启后仍然有效
+CACHE_BASE_DIR = os.environ.get("CHROME_CACHE_DIR") or "/app/ChromeCache"
+
+MAX_BROWSERS = 6                    # 同时常驻的浏览器数量上限
+MAX_AGE_SECONDS = 2 * 60 * 60       # 浏览器最长存活时间，超过后在下次租用前重启
+IDLE_TIMEOUT_SECONDS = 30 * 60      # 空闲超过该时间的浏览器由监控线程关闭
+LEASE_TIMEOUT_SECONDS = 10 * 60     # 等待同一站点浏览器被归还的最长时间
+STARTUP_TIMEOUT_SECONDS = 30        # 等待浏览器开放调试端口的最长时间
+
+CHROME_ARGS = [
+    '--headless=new',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--window-size=1920,1080',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-blink-features=AutomationControlled',
+    '--ignore-certificate-errors',
+    '--allow-insecure-localhost',
+    '--ignore-ssl-errors',
+    '--lang=zh-CN',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--remote-debugging-address=127.0.0.1',
+    '--remote-debugging-port=0',
+]
+
+# 本进程启动的浏览器进程对象，避免被回收时产生 ResourceWarning
+_processes = {}
+
+
+def find_chrome_binary():
+    """查找 Chromium 可执行文件，找不到时返回 None"""
+    for candidate in (os.environ.get("CHROME_BIN"), "chromium", "chromium-browser", "google-chrome"):
+        if candidate:
+            path = shutil.which(candidate)
+            if path:
+                return path
+    return None
+
+
+def resolve_chromedriver_path(config=None):
+    """与各脚本一致：优先环境变量，其次系统设置，最后使用 Docker 中的默认路径"""
+    configured = ""
+    try:
+        configured = ((config or {}).get("chromedriver_path") or "").strip()
+    except Exception:
+        configured = ""
+    return os.environ.get("CHROMEDRIVER_PATH") or configured or "/usr/lib/chromium/chromedriver"
+
+
+class _SiteLock:
+    """基于 flock 的跨进程租约锁，持有者进程退出时由系统自动释放"""
+    def __init__(self, site):
+        self.path = os.path.join(POOL_DIR, f"{site}.lock")
+        self.handle = None
+
+    def acquire(self, timeout=0):
+        self.handle = open(self.path, 'a+')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self.handle.close()
+                    self.handle = None
+                    return False
+                time.sleep(0.5)
+
+    def release(self):
+        if self.handle is not None:
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+            finally:
+                self.handle.close()
+                self.handle = None
+
+
+def _state_path(site):
+    return os.path.join(POOL_DIR, f"{site}.json")
+
+
+def _read_state(site):
+    try:
+        with open(_state_path(site), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(site, state):
+    tmp_path = f"{_state_path(site)}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(site))
+
+
+def _remove_state(site):
+    try:
+        os.remove(_state_path(site))
+    except FileNotFoundError:
+        pass
+
+
+def _list_states():
+    try:
+        names = os.listdir(POOL_DIR)
+    except FileNotFoundError:
+        return []
+    states = []
+    for name in names:
+        if name.endswith('.json'):
+            site = name[:-len('.json')]
+            state = _read_state(site)
+            if state:
+                states.append((site, state))
+    return states
+
+
+def _is_healthy(state):
+    """浏览器进程存活且调试端口可以响应"""
+    if not psutil.pid_exists(state.get('pid', 0)):
+        return False
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{state['port']}/json/version", timeout=3) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def _terminate(state):
+    """终止浏览器主进程及其全部子进程"""
+    try:
+        proc = psutil.Process(state['pid'])
+        procs = proc.children(recursive=True) + [proc]
+    except (psutil.NoSuchProcess, KeyError):
+        return
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=5)
+    for p in alive:
+        try:
+            p.kill()
+        except psutil.NoSuchProcess:
+            pass
+    _processes.pop(state['pid'], None)
+
+
+def _launch(site, chrome_binary):
+    """启动站点专用的常驻浏览器，返回其状态信息"""
+    user_data_dir = os.path.join(CACHE_BASE_DIR, f"pool-user-data-dir-{site}")
+    disk_cache_dir = os.path.join(CACHE_BASE_DIR, f"pool-disk-cache-dir-{site}")
+    os.makedirs(user_data_dir, exist_ok=True)
+    os.makedirs(disk_cache_dir, exist_ok=True)
+    port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+    try:
+        os.remove(port_file)
+    except FileNotFoundError:
+        pass
+
+    process = subprocess.Popen(
+        [chrome_binary, *CHROME_ARGS, f"--user-data-dir={user_data_dir}",
+         f"--disk-cache-dir={disk_cache_dir}", "about:blank"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True  # 脱离当前进程组，索引脚本退出后浏览器继续常驻
+    )
+    _processes[process.pid] = process
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    port = None
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with open(port_file, 'r') as f:
+                content = f.readline().strip()
+            if content:
+                port = int(content)
+                break
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+
+    if port is None:
+        _terminate({'pid': process.pid})
+        raise RuntimeError(f"常驻浏览器 {site} 启动失败，未获取到调试端口")
+
+    now = time.time()
+    state = {'pid': process.pid, 'port': port, 'started_at': now, 'last_used': now}
+    _write_state(site, state)
+    logging.info(f"已启动常驻浏览器 {site} (PID: {process.pid}, 端口: {port})")
+    return state
+
+
+def _close_if_unleased(site, state, reason):
+    """在未被租用时关闭常驻浏览器，返回是否已关闭"""
+    lock = _SiteLock(site)
+    if not lock.acquire():
+        return False
+    try:
+        # 获取锁期间浏览器可能已被重启，以最新状态为准
+        current = _read_state(site)
+        if current and current.get('pid') != state.get('pid'):
+            return False
+        _terminate(state)
+        _remove_state(site)
+        logging.info(f"已关闭常驻浏览器 {site} (PID: {state.get('pid')})：{reason}")
+        return True
+    finally:
+        lock.release()
+
+
+def _evict_for_launch(site):
+    """常驻浏览器达到上限时，按最近使用时间关闭未被租用的浏览器"""
+    others = sorted(
+        ((other, state) for other, state in _list_states() if other != site),
+        key=lambda item: item[1].get('last_used', 0)
+    )
+    excess = len(others) + 1 - MAX_BROWSERS
+    for other, state in others:
+        if excess <= 0:
+            break
+        if _close_if_unleased(other, state, f"常驻浏览器数量达到上限 {MAX_BROWSERS}"):
+            excess -= 1
+
+
+class PooledChrome(webdriver.Chrome):
+    """
+    连接到常驻浏览器的 WebDriver。
+    quit() 只结束 chromedriver 会话并归还租约，浏览器及其登录状态保持不变。
+    """
+    def __init__(self, site, lock, *args, **kwargs):
+        self.pool_site = site
+        self._pool_lock = lock
+        super().__init__(*args, **kwargs)
+
+    def _reset_tabs(self):
+        """归还前只保留一个空白标签页，释放页面占用的内存"""
+        try:
+            handles = self.window_handles
+            for handle in handles[1:]:
+                self.switch_to.window(handle)
+                self.close()
+            self.switch_to.window(handles[0])
+            self.get("about:blank")
+        except Exception as e:
+            logging.debug(f"重置常驻浏览器 {self.pool_site} 标签页失败: {e}")
+
+    def quit(self):
+        if self._pool_lock is None:
+            return
+        try:
+            self._reset_tabs()
+            super().quit()
+        finally:
+            state = _read_state(self.pool_site)
+            if state:
+                state['last_used'] = time.time()
+                _write_state(self.pool_site, state)
+            self._pool_lock.release()
+            self._pool_lock = None
+            logging.info(f"已归还常驻浏览器 {self.pool_site}")
+
+
+def lease_driver(site, config=None, page_load_strategy='eager', mobile_emulation=None, download_dir=None):
+    """
+    租用站点专用的常驻浏览器，返回已连接的 WebDriver，使用完毕后调用 quit() 归还。
+    同一站点同时只能被一个调用方租用；浏览器池不可用时返回 None，由调用方自行启动浏览器。
+    """
+    if fcntl is None:
+        return None
+    chrome_binary = find_chrome_binary()
+    if not chrome_binary:
+        logging.info("未找到 Chromium 可执行文件，不使用常驻浏览器")
+        return None
+    try:
+        os.makedirs(POOL_DIR, exist_ok=True)
+    except OSError as e:
+        logging.warning(f"无法创建浏览器池目录 {POOL_DIR}: {e}")
+        return None
+
+    lock = _SiteLock(site)
+    if not lock.acquire(LEASE_TIMEOUT_SECONDS):
+        logging.warning(f"等待常驻浏览器 {site} 超时，改为独立启动浏览器")
+        return None
+
+    state = None
+    try:
+        state = _read_state(site)
+        if state and time.time() - state.get('started_at', 0) > MAX_AGE_SECONDS:
+            logging.info(f"常驻浏览器 {site} 已运行超过 {MAX_AGE_SECONDS // 60} 分钟，重新启动")
+            _terminate(state)
+            state = None
+        elif state and not _is_healthy(state):
+            logging.warning(f"常驻浏览器 {site} 无响应，重新启动")
+            _terminate(state)
+            state = None
+        if state is None:
+            _remove_state(site)
+            _evict_for_launch(site)
+            state = _launch(site, chrome_binary)
+
+        options = Options()
+        options.debugger_address = f"127.0.0.1:{state['port']}"
+        options.page_load_strategy = page_load_strategy
+        if mobile_emulation:
+            options.add_experimental_option("mobileEmulation", mobile_emulation)
+        driver_path = resolve_chromedriver_path(config)
+        service = Service(executable_path=driver_path) if os.path.exists(driver_path) else Service()
+        driver = PooledChrome(site, lock, service=service, options=options)
+        if download_dir:
+            try:
+                driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+            except Exception as e:
+                logging.debug(f"设置常驻浏览器 {site} 下载目录失败: {e}")
+        logging.info(f"已租用常驻浏览器 {site} (PID: {state['pid']})")
+        return driver
+    except Exception as e:
+        logging.warning(f"常驻浏览器 {site} 不可用，改为独立启动浏览器: {e}")
+        if state:
+            _terminate(state)
+        _remove_state(site)
+        lock.release()
+        return None
+
+
+def reap_idle(idle_timeout=IDLE_TIMEOUT_SECONDS, max_age=MAX_AGE_SECONDS):
+    """关闭空闲过久、超过最长存活时间或已失去响应且未被租用的常驻浏览器，由主程序定期调用"""
+    if fcntl is None:
+        return
+    now = time.time()
+    for site, state in _list_states():
+        if now - state.get('started_at', now) > max_age:
+            reason = f"已运行超过 {max_age // 60} 分钟"
+        elif now - state.get('last_used', now) > idle_timeout:
+            reason = f"空闲超过 {idle_timeout // 60} 分钟"
+        elif not _is_healthy(state):
+            reason = "浏览器无响应"
+        else:
+            continue
+        _close_if_unleased(site, state, reason)
+
+
+def pooled_pids():
+    """返回所有常驻浏览器的进程号（含子进程），供进程监控跳过"""
+    pids = set()
+    for _, state in _list_states():
+        try:
+            proc = psutil.Process(state['pid'])
+            pids.add(proc.pid)
+            pids.update(child.pid for child in proc.children(recursive=True))
+        except (psutil.NoSuchProcess, KeyError):
+            continue
+    return pids
@@ -16,6 +16,7 @@ import urllib.parse
 import bencodepy
 import base64
 from pathlib import Path
+from webdriver_pool import lease_driver
 import shutil
 
 # 配置日志
@@ -43,6 +44,12 @@ class XunleiDownloader:
         if hasattr(self, 'driver') and self.driver is not None:
             logging.info("WebDriver已经初始化，无需重复初始化")
             return
+        # 优先租用常驻浏览器，复用迅雷的登录状态；浏览器池不可用时再独立启动
+        self.driver = lease_driver("xunlei", self.config, mobile_emulation={"deviceName": "iPhone SE"},
+                                   download_dir=self.TORRENT_DIR)
+        if self.driver is not None:
+            logging.info("WebDriver初始化完成（常驻浏览器）")
+            return
         options = Options()
         # 模拟 iPhone SE
         mobile_emulation = {